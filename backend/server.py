@@ -1,20 +1,41 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne
+from pymongo.errors import ExecutionTimeout
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 import ftplib
 import io
 import tempfile
 from concurrent.futures import ThreadPoolExecutor
 import asyncio
+import time
+import threading
+import posixpath
+import re
+import hmac
+import hashlib
+import json
+import calendar
+import tarfile
+import zipfile
+import struct
+import zlib
+import fnmatch
+import bisect
+import functools
+import base64
+from collections import Counter, OrderedDict, deque
+from cryptography.fernet import Fernet, InvalidToken
+from contextlib import asynccontextmanager, aclosing, nullcontext
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -30,11 +51,133 @@ app = FastAPI()
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+class CountingExecutor(ThreadPoolExecutor):
+    """Thread pool that counts its queued and running tasks for the metrics endpoint.
+
+    Every ``run_in_executor`` call goes through ``submit``, so the counts
+    cover all work without reading the pool's private state.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._counts = threading.Lock()
+        self.queued = 0
+        self.busy = 0
+
+    def submit(self, fn, /, *args, **kwargs):
+        def run():
+            with self._counts:
+                self.queued -= 1
+                self.busy += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._counts:
+                    self.busy -= 1
+
+        def done(future):
+            # Tasks cancelled before they started never ran to take themselves off the queue
+            if future.cancelled():
+                with self._counts:
+                    self.queued -= 1
+
+        with self._counts:
+            self.queued += 1
+        try:
+            future = super().submit(run)
+        except BaseException:
+            with self._counts:
+                self.queued -= 1
+            raise
+        future.add_done_callback(done)
+        return future
+
 # Thread pool for FTP operations
-executor = ThreadPoolExecutor(max_workers=10)
+executor = CountingExecutor(max_workers=10)
+
+# FTP engine used for new sessions: 'ftplib' (thread per connection) or 'asyncio'
+FTP_ENGINE = os.environ.get('FTP_ENGINE', 'ftplib')
+
+# Session lifecycle: idle sessions are reaped, the least recently used ones evicted past the caps
+FTP_SESSION_IDLE_TIMEOUT = float(os.environ.get('FTP_SESSION_IDLE_TIMEOUT', 900))
+FTP_MAX_SESSIONS = int(os.environ.get('FTP_MAX_SESSIONS', 256))
+FTP_MAX_SESSIONS_PER_HOST = int(os.environ.get('FTP_MAX_SESSIONS_PER_HOST', 32))
+FTP_SESSION_REAP_INTERVAL = float(os.environ.get('FTP_SESSION_REAP_INTERVAL', 30))
+
+# Connections per session: one for metadata commands plus dedicated transfer connections
+FTP_POOL_SIZE = int(os.environ.get('FTP_POOL_SIZE', 2))
+FTP_POOL_MAX_SIZE = int(os.environ.get('FTP_POOL_MAX_SIZE', 8))
+FTP_POOL_IDLE_TIMEOUT = float(os.environ.get('FTP_POOL_IDLE_TIMEOUT', 60))
+
+# Logged-in connections kept warm between sessions
+SHARED_POOL_MAX_IDLE = int(os.environ.get('FTP_SHARED_POOL_MAX_IDLE', 32))
+SHARED_POOL_MAX_IDLE_PER_KEY = int(os.environ.get('FTP_SHARED_POOL_MAX_IDLE_PER_KEY', 4))
+SHARED_POOL_IDLE_TIMEOUT = float(os.environ.get('FTP_SHARED_POOL_IDLE_TIMEOUT', 300))
+
+# Directory listing cache
+LISTING_CACHE_TTL = float(os.environ.get('FTP_LISTING_CACHE_TTL', 30))
+LISTING_CACHE_SIZE = int(os.environ.get('FTP_LISTING_CACHE_SIZE', 512))
+LISTING_VIEW_CACHE_SIZE = int(os.environ.get('FTP_LISTING_VIEW_CACHE_SIZE', 64))
+
+# Streaming transfer settings
+TRANSFER_CHUNK_SIZE = int(os.environ.get('FTP_TRANSFER_CHUNK_SIZE', 64 * 1024))
+DOWNLOAD_QUEUE_CHUNKS = int(os.environ.get('FTP_DOWNLOAD_QUEUE_CHUNKS', 16))
+UPLOAD_CHUNK_SIZE = int(os.environ.get('FTP_UPLOAD_CHUNK_SIZE', 256 * 1024))
+UPLOAD_QUEUE_CHUNKS = int(os.environ.get('FTP_UPLOAD_QUEUE_CHUNKS', 8))
+
+# Segmented downloads: ranges of a large file fetched in parallel over extra connections
+FTP_SEGMENT_SIZE = int(os.environ.get('FTP_SEGMENT_SIZE', 8 * 1024 * 1024))
+FTP_SEGMENT_CONNECTIONS = int(os.environ.get('FTP_SEGMENT_CONNECTIONS', 1))
+FTP_SEGMENT_MAX_CONNECTIONS = int(os.environ.get('FTP_SEGMENT_MAX_CONNECTIONS', 8))
+
+# Files fetched ahead of the one being written into a directory archive
+FTP_ARCHIVE_PREFETCH = int(os.environ.get('FTP_ARCHIVE_PREFETCH', 0))
 
-# FTP sessions storage (in production, use Redis or database)
-ftp_sessions = {}
+# Archive extraction: members up to this size are read whole so several can be stored in parallel
+FTP_EXTRACT_BUFFER_SIZE = int(os.environ.get('FTP_EXTRACT_BUFFER_SIZE', 1024 * 1024))
+
+# Upper bounds, in seconds, of the operation latency histogram buckets
+FTP_METRICS_BUCKETS = tuple(float(bound) for bound in os.environ.get(
+    'FTP_METRICS_BUCKETS', '0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60,300').split(','))
+# Distinct host label values; operations on further hosts are reported under host="other"
+FTP_METRICS_MAX_HOSTS = int(os.environ.get('FTP_METRICS_MAX_HOSTS', 50))
+
+# Chunks buffered between the RETR and STOR sides of a server-side copy
+FTP_RELAY_QUEUE_CHUNKS = int(os.environ.get('FTP_RELAY_QUEUE_CHUNKS', 16))
+
+# Digest computed inline on transfers when a request names none: 'sha256', 'md5', 'crc32' or empty for none
+FTP_TRANSFER_CHECKSUM = os.environ.get('FTP_TRANSFER_CHECKSUM', '').lower()
+
+# Transfer progress events: shortest interval (at least 0.01s) between two events of one transfer, and events buffered per subscriber
+FTP_PROGRESS_INTERVAL = float(os.environ.get('FTP_PROGRESS_INTERVAL', 0.25))
+FTP_PROGRESS_QUEUE_SIZE = int(os.environ.get('FTP_PROGRESS_QUEUE_SIZE', 64))
+
+# Largest number of operations accepted in one batch request
+FTP_BATCH_MAX_OPERATIONS = int(os.environ.get('FTP_BATCH_MAX_OPERATIONS', 10000))
+
+# Optional MongoDB index of remote tree metadata, filled by POST /ftp/index
+FTP_INDEX_ENABLED = os.environ.get('FTP_INDEX_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+FTP_INDEX_BATCH_SIZE = int(os.environ.get('FTP_INDEX_BATCH_SIZE', 1000))
+FTP_INDEX_SEARCH_LIMIT = int(os.environ.get('FTP_INDEX_SEARCH_LIMIT', 1000))
+# Longest a search may run on MongoDB, in seconds; bounds costly name patterns
+FTP_INDEX_SEARCH_TIMEOUT = float(os.environ.get('FTP_INDEX_SEARCH_TIMEOUT', 5))
+
+# Directory mirroring: local paths are confined to FTP_MIRROR_ROOT, mirroring is off without it
+FTP_MIRROR_ROOT = os.environ.get('FTP_MIRROR_ROOT')
+FTP_MIRROR_PARALLEL = int(os.environ.get('FTP_MIRROR_PARALLEL', 4))
+
+# Background transfer jobs: overall and per-host concurrency, attempts and the first retry delay (doubled per retry)
+FTP_JOB_WORKERS = int(os.environ.get('FTP_JOB_WORKERS', 4))
+FTP_JOB_MAX_PER_HOST = int(os.environ.get('FTP_JOB_MAX_PER_HOST', 2))
+FTP_JOB_MAX_ATTEMPTS = int(os.environ.get('FTP_JOB_MAX_ATTEMPTS', 3))
+FTP_JOB_RETRY_DELAY = float(os.environ.get('FTP_JOB_RETRY_DELAY', 5))
+FTP_JOB_HISTORY = int(os.environ.get('FTP_JOB_HISTORY', 1000))  # finished jobs kept in memory
+FTP_JOB_PERSIST = os.environ.get('FTP_JOB_PERSIST', 'true').lower() in ('1', 'true', 'yes')
+# Fernet key for storing job passwords, so queued jobs can resume after a restart; without it they are not stored
+FTP_JOB_SECRET = os.environ.get('FTP_JOB_SECRET')
+
+# Resumable uploads untouched for this long are forgotten (their .part file stays on the server)
+FTP_UPLOAD_EXPIRY = float(os.environ.get('FTP_UPLOAD_EXPIRY', 24 * 3600))
 
 # Define Models
 class StatusCheck(BaseModel):
@@ -50,6 +193,8 @@ class FTPConnectionRequest(BaseModel):
     port: int = 21
     username: str
     password: str
+    engine: Optional[str] = None  # defaults to FTP_ENGINE
+    pool_size: Optional[int] = None  # defaults to FTP_POOL_SIZE
 
 class FTPConnectionResponse(BaseModel):
     session_id: str
@@ -66,11 +211,30 @@ class FTPListResponse(BaseModel):
     files: List[FTPFileInfo]
     current_path: str
     status: str
+    cached: bool = False
+    cache_age: Optional[float] = None  # seconds since the listing was fetched
+    total: Optional[int] = None  # entries matching the filters, when paging
+    next_cursor: Optional[str] = None  # pass back as ``cursor`` for the next page
 
 class FTPOperationResponse(BaseModel):
     status: str
     message: str
 
+class FTPUploadResponse(FTPOperationResponse):
+    checksum_algorithm: Optional[str] = None
+    checksum: Optional[str] = None  # digest of the bytes sent
+    server_checksum: Optional[str] = None  # digest reported by the server, if it can compute one
+    verified: Optional[bool] = None  # None when the server could not be asked
+
+class FTPChecksumResponse(BaseModel):
+    status: str
+    message: str
+    filename: str
+    algorithm: str
+    checksum: str
+    source: str  # 'server' or 'download'
+    bytes: Optional[int] = None  # bytes read when the digest was computed locally
+
 class FTPRenameRequest(BaseModel):
     old_name: str
     new_name: str
@@ -78,195 +242,4232 @@ class FTPRenameRequest(BaseModel):
 class FTPCreateDirectoryRequest(BaseModel):
     directory_name: str
 
-# FTP Client Manager
-class FTPClientManager:
-    def __init__(self):
-        self.connections = {}
-    
-    def connect(self, session_id: str, host: str, port: int, username: str, password: str) -> tuple:
+class FTPBatchOperation(BaseModel):
+    op: str  # 'delete', 'rename', 'mkdir' or 'stat'
+    name: str
+    new_name: Optional[str] = None
+
+class FTPBatchRequest(BaseModel):
+    operations: List[FTPBatchOperation]
+    parallel: bool = False  # operations on unrelated paths run concurrently
+
+class FTPCopyRequest(BaseModel):
+    source: str
+    destination: str
+    destination_session_id: Optional[str] = None  # defaults to the source session
+
+class FTPCopyResponse(BaseModel):
+    status: str
+    message: str
+    bytes: int
+    seconds: float
+    bytes_per_second: float
+
+class FTPJobRequest(BaseModel):
+    kind: str  # 'upload', 'download' or 'copy'
+    remote_path: str  # source of downloads and copies, destination of uploads
+    local_path: Optional[str] = None  # below FTP_MIRROR_ROOT, for uploads and downloads
+    destination: Optional[str] = None  # remote destination of copies
+    priority: int = 0  # higher runs first
+    max_attempts: Optional[int] = None  # defaults to FTP_JOB_MAX_ATTEMPTS
+
+class FTPJob(BaseModel):
+    job_id: str
+    kind: str
+    status: str  # 'queued', 'running', 'succeeded', 'failed' or 'cancelled'
+    host: str
+    remote_path: str
+    local_path: Optional[str] = None
+    destination: Optional[str] = None
+    priority: int
+    attempts: int
+    max_attempts: int
+    bytes: int = 0
+    message: Optional[str] = None
+    created: float
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    next_attempt: Optional[float] = None  # when a failed job is retried
+
+class FTPJobListResponse(BaseModel):
+    jobs: List[FTPJob]
+
+class FTPExtractFailure(BaseModel):
+    name: str
+    message: str
+
+class FTPExtractProgress(BaseModel):
+    extract_id: str
+    current_path: str
+    directories: int
+    files: int
+    bytes: int
+    current: Optional[str] = None
+    failures: List[FTPExtractFailure] = []
+
+class FTPExtractResponse(FTPExtractProgress):
+    status: str
+    message: str
+
+class FTPIndexRequest(BaseModel):
+    path: Optional[str] = None
+    max_depth: Optional[int] = None
+    parallel: Optional[int] = None
+
+class FTPIndexResponse(BaseModel):
+    status: str
+    message: str
+    directories: int
+    changed: int
+    unchanged: int
+    entries: int
+    removed: int
+    skipped: int
+
+class FTPIndexEntry(BaseModel):
+    path: str
+    name: str
+    type: str
+    size: Optional[int] = None
+    modified: Optional[str] = None
+    indexed_at: datetime
+    stale_seconds: float  # time since the entry was last confirmed on the server
+
+class FTPIndexListResponse(BaseModel):
+    files: List[FTPIndexEntry]
+    current_path: str
+    status: str
+    indexed: bool
+    stale_seconds: Optional[float] = None  # age of the directory's listing in the index
+
+class FTPIndexSearchResponse(BaseModel):
+    entries: List[FTPIndexEntry]
+    status: str
+    message: str
+
+class FTPMirrorRequest(BaseModel):
+    local_path: str  # relative to FTP_MIRROR_ROOT
+    remote_path: Optional[str] = None
+    direction: str = 'upload'  # 'upload', 'download' or 'both'
+    delete: bool = False
+    dry_run: bool = False
+    rescan: bool = False
+    parallel: Optional[int] = None
+
+class FTPMirrorAction(BaseModel):
+    action: str  # 'upload', 'download', 'delete_remote' or 'delete_local'
+    path: str
+    size: Optional[int] = None
+    reason: str
+    status: Optional[str] = None
+    message: Optional[str] = None
+
+class FTPMirrorResponse(BaseModel):
+    status: str
+    message: str
+    dry_run: bool
+    actions: List[FTPMirrorAction]
+    unchanged: int
+    conflicts: int
+    bytes: int
+    seconds: float
+
+class FTPUploadCreateRequest(BaseModel):
+    filename: str
+    size: Optional[int] = None
+
+class FTPUploadStatus(BaseModel):
+    upload_id: str
+    filename: str
+    current_path: str
+    offset: int
+    size: Optional[int] = None
+    status: str
+    message: str
+
+class FTPSessionStatus(BaseModel):
+    session_id: str
+    host: str
+    username: str
+    engine: str
+    current_path: str
+    queue_depth: int
+    pool_size: int
+    pool_connections: int
+    pool_in_use: int
+    idle_seconds: float
+
+# Strong references to fire-and-forget tasks; the event loop only keeps weak ones
+_background_tasks = set()
+
+def spawn(coro) -> asyncio.Task:
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+class FTPPoolStats(BaseModel):
+    hits: int
+    misses: int
+    hit_ratio: float
+    stale: int
+    returns: int
+    evictions: int
+    idle_connections: int
+    idle_keys: int
+    sessions: int = 0
+    sessions_evicted: int = 0
+    sessions_reaped: int = 0
+
+class FTPTransferError(Exception):
+    """Raised on the consuming side of a ChunkPipe when the FTP transfer failed."""
+
+# Bounded hand-off of data chunks between FTP transfers and their consumers
+class ChunkPipe:
+    """Bounded queue of byte chunks owned by the event loop.
+
+    Whichever side produces blocks once ``maxsize`` chunks are waiting, so a
+    slow consumer throttles the producer instead of filling memory. The
+    ``*_threadsafe`` methods let an ``ftplib`` worker thread be either side.
+    """
+    _EOF = object()
+
+    def __init__(self, loop, maxsize: int):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.closed = False
+
+    def put_threadsafe(self, item) -> bool:
+        """Hand a chunk to the event loop; returns False once the consumer went away."""
+        if self.closed:
+            return False
+        asyncio.run_coroutine_threadsafe(self.queue.put(item), self.loop).result()
+        return not self.closed
+
+    def finish_threadsafe(self, error: Exception = None):
+        self.put_threadsafe(error if error is not None else self._EOF)
+
+    def get_threadsafe(self):
+        """Blocking counterpart of ``get`` for the worker thread."""
+        return asyncio.run_coroutine_threadsafe(self.get(), self.loop).result()
+
+    def close_threadsafe(self):
+        self.loop.call_soon_threadsafe(self.close)
+
+    async def put(self, item) -> bool:
+        """Queue a chunk from the event loop; returns False once the consumer went away."""
+        if self.closed:
+            return False
+        await self.queue.put(item)
+        return not self.closed
+
+    async def finish(self, error: Exception = None):
+        await self.put(error if error is not None else self._EOF)
+
+    async def get(self):
+        """Next chunk, or None at end of stream. Re-raises producer errors."""
+        item = await self.queue.get()
+        if item is self._EOF:
+            return None
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def close(self):
+        """Stop consuming; unblocks a producer waiting on a full queue."""
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+async def pipe_chunks(pipe: ChunkPipe):
+    """Async iterator over the chunks of ``pipe`` until its end of stream."""
+    while True:
+        chunk = await pipe.get()
+        if chunk is None:
+            break
+        yield chunk
+
+# Prometheus-style metrics
+def _label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class FTPMetrics:
+    """Latency histograms, outcome counts and transferred bytes of FTP operations, per host.
+
+    Everything is updated from the event loop thread, so plain dicts need no
+    locking and recording an operation costs one bisect and a few dict
+    updates. Only the first ``max_hosts`` hosts get series of their own, so
+    clients connecting to arbitrary servers cannot grow the exposition
+    without bound. ``render`` writes the Prometheus text exposition format.
+    """
+
+    def __init__(self, buckets: tuple, max_hosts: int):
+        self.buckets = tuple(sorted(buckets))
+        self.max_hosts = max_hosts
+        self.hosts = set()
+        self.latency = {}  # (operation, host) -> [bucket counts with +Inf last, sum of seconds]
+        self.outcomes = {}  # (operation, host, outcome) -> count
+        self.transferred = {}  # (direction, host) -> bytes
+
+    def _host(self, host: str) -> str:
+        if host not in self.hosts:
+            if len(self.hosts) >= self.max_hosts:
+                return 'other'
+            self.hosts.add(host)
+        return host
+
+    def observe(self, operation: str, host: str, seconds: float, success: bool):
+        host = self._host(host)
+        series = self.latency.get((operation, host))
+        if series is None:
+            series = self.latency[(operation, host)] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, seconds)] += 1
+        series[1] += seconds
+        key = (operation, host, 'success' if success else 'error')
+        self.outcomes[key] = self.outcomes.get(key, 0) + 1
+
+    def count_bytes(self, direction: str, host: str, size: int):
+        key = (direction, self._host(host))
+        self.transferred[key] = self.transferred.get(key, 0) + size
+
+    def render(self, gauges: list, counters: list) -> str:
+        """Text exposition of the collected series plus ``(name, help, value)`` gauges and counters."""
+        lines = [
+            '# HELP ftp_operation_duration_seconds Duration of FTP operations, including data transfer',
+            '# TYPE ftp_operation_duration_seconds histogram'
+        ]
+        for (operation, host), (counts, total) in self.latency.items():
+            labels = f'operation="{_label(operation)}",host="{_label(host)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'ftp_operation_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'ftp_operation_duration_seconds_sum{{{labels}}} {total}')
+            lines.append(f'ftp_operation_duration_seconds_count{{{labels}}} {cumulative}')
+        lines.append('# HELP ftp_operations_total FTP operations by outcome')
+        lines.append('# TYPE ftp_operations_total counter')
+        for (operation, host, outcome), count in self.outcomes.items():
+            lines.append(f'ftp_operations_total{{operation="{_label(operation)}",host="{_label(host)}",'
+                         f'outcome="{outcome}"}} {count}')
+        lines.append('# HELP ftp_transferred_bytes_total Bytes moved over FTP data connections')
+        lines.append('# TYPE ftp_transferred_bytes_total counter')
+        for (direction, host), size in self.transferred.items():
+            lines.append(f'ftp_transferred_bytes_total{{direction="{direction}",host="{_label(host)}"}} {size}')
+        for kind, series in (('gauge', gauges), ('counter', counters)):
+            for name, help_text, value in series:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+metrics = FTPMetrics(FTP_METRICS_BUCKETS, FTP_METRICS_MAX_HOSTS)
+
+# Transfer progress events
+class TransferProgress:
+    """Byte counter of one transfer that publishes coalesced progress events.
+
+    ``advance`` only counts unless the session has subscribers and
+    ``interval`` seconds have passed since the last event, so a transfer
+    pays at most a clock read per chunk. The rate is smoothed across
+    events; the ETA is only known with a ``total``.
+    """
+    def __init__(self, hub: 'ProgressHub', session_id: str, operation: str, name: str, total: int = None):
+        self.hub = hub
+        self.session_id = session_id
+        self.transfer_id = uuid.uuid4().hex
+        self.operation = operation
+        self.name = name
+        self.total = total
+        self.bytes = 0
+        self.rate = None
+        self.started = self.last_time = time.monotonic()
+        self.last_bytes = 0
+
+    def advance(self, size: int):
+        self.bytes += size
+        if self.session_id in self.hub.subscribers:
+            now = time.monotonic()
+            if now - self.last_time >= self.hub.interval:
+                self._publish(now, 'running')
+
+    async def count(self, chunks):
+        """Pass ``chunks`` through, counting them."""
+        async for chunk in chunks:
+            self.advance(len(chunk))
+            yield chunk
+
+    def finish(self, success: bool):
+        if self.session_id in self.hub.subscribers:
+            self._publish(time.monotonic(), 'success' if success else 'error')
+
+    def _publish(self, now: float, status: str):
+        if status == 'running':
+            if now > self.last_time:
+                window = (self.bytes - self.last_bytes) / (now - self.last_time)
+                self.rate = window if self.rate is None else 0.5 * self.rate + 0.5 * window
+        else:
+            elapsed = now - self.started
+            self.rate = self.bytes / elapsed if elapsed > 0 else None
+        self.last_time, self.last_bytes = now, self.bytes
+        eta = None
+        if status == 'running' and self.total is not None and self.rate:
+            eta = round(max(self.total - self.bytes, 0) / self.rate, 1)
+        self.hub.publish(self.session_id, {
+            'transfer_id': self.transfer_id,
+            'operation': self.operation,
+            'name': self.name,
+            'status': status,
+            'bytes': self.bytes,
+            'total': self.total,
+            'bytes_per_second': round(self.rate or 0.0, 1),
+            'eta': eta,
+            'elapsed': round(now - self.started, 3)
+        })
+
+class ProgressHub:
+    """Per-session fan-out of transfer progress events to subscriber queues.
+
+    Publishing never waits: a subscriber that falls ``queue_size`` events
+    behind loses the oldest ones, which later events supersede anyway.
+    """
+    def __init__(self, interval: float, queue_size: int):
+        self.interval = max(interval, 0.01)
+        self.queue_size = max(queue_size, 1)
+        self.subscribers = {}  # session id -> queues
+
+    def watching(self, session_id: str) -> bool:
+        return session_id in self.subscribers
+
+    def track(self, session_id: str, operation: str, name: str, total: int = None) -> TransferProgress:
+        return TransferProgress(self, session_id, operation, name, total)
+
+    def subscribe(self, session_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.setdefault(session_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, session_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(session_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[session_id]
+
+    def publish(self, session_id: str, event: dict):
+        for queue in self.subscribers.get(session_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+progress_hub = ProgressHub(FTP_PROGRESS_INTERVAL, FTP_PROGRESS_QUEUE_SIZE)
+
+# Seconds between comment lines on an idle progress stream
+PROGRESS_KEEPALIVE = 15
+
+def instrumented(operation: str):
+    """Record latency and outcome of a session method returning ``(success, message, ...)``."""
+    def decorate(method):
+        @functools.wraps(method)
+        async def wrapper(self, session_id: str, *args, **kwargs):
+            connection = self.connections.get(session_id)
+            started = time.perf_counter()
+            result = await method(self, session_id, *args, **kwargs)
+            if connection is not None:
+                metrics.observe(operation, connection['host'], time.perf_counter() - started, result[0])
+            return result
+        return wrapper
+    return decorate
+
+def _discard_transfer_reply(ftp: ftplib.FTP):
+    """Read the reply to a data transfer we closed early (usually 426 or 226)."""
+    try:
+        ftp.voidresp()
+    except ftplib.Error:
+        pass
+
+# FTP connection engines
+class FTPConnectionBase:
+    """Async interface shared by the FTP engines.
+
+    Commands on one control connection must never interleave, so callers
+    hold ``exclusive()`` for every sequence of commands. Waiters are served
+    in FIFO order, which gives each connection an ordered command queue.
+    """
+    engine = None
+
+    def __init__(self, host: str, port: int, username: str):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.queue_depth = 0  # queued plus running operations
+        self.working_directory = None  # last directory changed into by a pool checkout
+        self.home_directory = '/'
+        self.features = set()
+        self.pool_key = None  # set by the shared connection pool
+        self._lock = asyncio.Lock()
+
+    async def fetch_features(self) -> set:
+        """Names of the extensions advertised in the FEAT reply, upper-cased."""
+        try:
+            resp = await self.sendcmd('FEAT')
+        except ftplib.error_perm:
+            return set()
+        return {line.split()[0].upper() for line in resp.splitlines()[1:-1] if line.strip()}
+
+    @asynccontextmanager
+    async def exclusive(self):
+        self.queue_depth += 1
         try:
+            async with self._lock:
+                yield self
+        finally:
+            self.queue_depth -= 1
+
+class ThreadedFTPConnection(FTPConnectionBase):
+    """``ftplib`` engine: a blocking ``ftplib.FTP`` driven from its own worker thread."""
+    engine = 'ftplib'
+
+    def __init__(self, ftp: ftplib.FTP, host: str, port: int, username: str):
+        super().__init__(host, port, username)
+        self.ftp = ftp
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"ftp-{host}")
+
+    @classmethod
+    async def open(cls, host: str, port: int, username: str, password: str):
+        def login():
             ftp = ftplib.FTP()
             ftp.connect(host, port)
             ftp.login(username, password)
             ftp.set_pasv(True)  # Use passive mode
-            
-            self.connections[session_id] = {
-                'ftp': ftp,
-                'current_path': '/',
-                'host': host,
-                'username': username
-            }
-            
-            return True, f"Successfully connected to {host}"
-        except Exception as e:
-            return False, f"Connection failed: {str(e)}"
-    
-    def disconnect(self, session_id: str) -> tuple:
+            return ftp
+        
+        loop = asyncio.get_event_loop()
+        ftp = await loop.run_in_executor(executor, login)
+        return cls(ftp, host, port, username)
+
+    async def _call(self, func, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._worker, func, *args)
+
+    async def sendcmd(self, cmd: str) -> str:
+        return await self._call(self.ftp.sendcmd, cmd)
+
+    async def voidcmd(self, cmd: str) -> str:
+        return await self._call(self.ftp.voidcmd, cmd)
+
+    async def pwd(self) -> str:
+        return await self._call(self.ftp.pwd)
+
+    async def cwd(self, path: str) -> str:
+        return await self._call(self.ftp.cwd, path)
+
+    async def lines(self, cmd: str) -> list:
+        lines = []
+        await self._call(self.ftp.retrlines, cmd, lines.append)
+        return lines
+
+    async def delete(self, name: str) -> str:
+        return await self._call(self.ftp.delete, name)
+
+    async def rmd(self, name: str) -> str:
+        return await self._call(self.ftp.rmd, name)
+
+    async def rename(self, old_name: str, new_name: str) -> str:
+        return await self._call(self.ftp.rename, old_name, new_name)
+
+    async def mkd(self, name: str) -> str:
+        return await self._call(self.ftp.mkd, name)
+
+    def _size(self, name: str):
+        # Many servers refuse SIZE in ASCII mode
+        self.ftp.voidcmd('TYPE I')
+        return self.ftp.size(name)
+
+    async def size(self, name: str):
+        return await self._call(self._size, name)
+
+    def _retrieve(self, cmd: str, rest, pipe: ChunkPipe):
+        ftp = self.ftp
         try:
-            if session_id in self.connections:
-                self.connections[session_id]['ftp'].quit()
-                del self.connections[session_id]
-                return True, "Disconnected successfully"
-            else:
-                return False, "No active connection found"
+            ftp.voidcmd('TYPE I')
+            with ftp.transfercmd(cmd, rest) as conn:
+                while True:
+                    chunk = conn.recv(TRANSFER_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if not pipe.put_threadsafe(chunk):
+                        break
+            if pipe.closed:
+                _discard_transfer_reply(ftp)
+                return
+            ftp.voidresp()
         except Exception as e:
-            return True, f"Disconnected (with error): {str(e)}"
-    
-    def list_files(self, session_id: str, path: str = None) -> tuple:
+            pipe.finish_threadsafe(e)
+            return
+        pipe.finish_threadsafe()
+
+    async def retrieve(self, cmd: str, rest: int = None):
+        """Yield the data of a RETR-like command; closing early aborts the transfer."""
+        pipe = ChunkPipe(asyncio.get_event_loop(), DOWNLOAD_QUEUE_CHUNKS)
+        transfer = spawn(self._call(self._retrieve, cmd, rest, pipe))
         try:
-            if session_id not in self.connections:
-                return False, "No active FTP connection", []
-            
-            ftp = self.connections[session_id]['ftp']
-            
-            if path:
-                try:
-                    ftp.cwd(path)
-                    self.connections[session_id]['current_path'] = ftp.pwd()
-                except:
-                    pass  # If path change fails, stay in current directory
-            
-            current_path = ftp.pwd()
-            self.connections[session_id]['current_path'] = current_path
-            
-            # Get detailed file listing
-            files = []
-            file_list = []
-            ftp.retrlines('LIST', file_list.append)
-            
-            for line in file_list:
-                parts = line.split()
-                if len(parts) >= 9:
-                    permissions = parts[0]
-                    size = parts[4] if parts[4].isdigit() else 0
-                    name = ' '.join(parts[8:])
-                    
-                    # Skip . and .. entries
-                    if name in ['.', '..']:
-                        continue
-                    
-                    file_type = 'directory' if permissions.startswith('d') else 'file'
-                    
-                    files.append(FTPFileInfo(
-                        name=name,
-                        type=file_type,
-                        size=int(size) if file_type == 'file' else None,
-                        modified=' '.join(parts[5:8])
-                    ))
-            
-            return True, "Files listed successfully", files, current_path
-        except Exception as e:
-            return False, f"Failed to list files: {str(e)}", [], "/"
-    
-    def download_file(self, session_id: str, filename: str) -> tuple:
+            while True:
+                chunk = await pipe.get()
+                if chunk is None:
+                    break
+                metrics.count_bytes('received', self.host, len(chunk))
+                yield chunk
+        finally:
+            pipe.close()
+            await transfer
+
+    def _store(self, cmd: str, rest, pipe: ChunkPipe):
+        ftp = self.ftp
         try:
-            if session_id not in self.connections:
-                return False, "No active FTP connection", None
-            
-            ftp = self.connections[session_id]['ftp']
-            
-            # Create a BytesIO buffer to store file data
-            file_buffer = io.BytesIO()
-            
-            # Download file to buffer
-            ftp.retrbinary(f'RETR {filename}', file_buffer.write)
-            file_buffer.seek(0)
-            
-            return True, "File downloaded successfully", file_buffer
-        except Exception as e:
-            return False, f"Failed to download file: {str(e)}", None
-    
-    def upload_file(self, session_id: str, filename: str, file_data: bytes) -> tuple:
+            ftp.voidcmd('TYPE I')
+            with ftp.transfercmd(cmd, rest) as conn:
+                while True:
+                    chunk = pipe.get_threadsafe()
+                    if not chunk:
+                        break
+                    conn.sendall(chunk)
+        except FTPTransferError:
+            _discard_transfer_reply(ftp)
+            raise
+        finally:
+            # Release the producer if the FTP side stopped before the end
+            pipe.close_threadsafe()
+        ftp.voidresp()
+
+    async def store(self, cmd: str, chunks, rest: int = None):
+        """Send an async iterable of chunks with a STOR-like command.
+
+        Raises FTPTransferError when ``chunks`` fails part way; the partial
+        transfer is closed and its reply consumed.
+        """
+        pipe = ChunkPipe(asyncio.get_event_loop(), UPLOAD_QUEUE_CHUNKS)
+        transfer = spawn(self._call(self._store, cmd, rest, pipe))
         try:
-            if session_id not in self.connections:
-                return False, "No active FTP connection"
-            
-            ftp = self.connections[session_id]['ftp']
-            
-            # Create BytesIO from file data
-            file_buffer = io.BytesIO(file_data)
-            
-            # Upload file
-            ftp.storbinary(f'STOR {filename}', file_buffer)
-            
-            return True, f"File '{filename}' uploaded successfully"
+            async for chunk in chunks:
+                if not await pipe.put(chunk):
+                    break
+                metrics.count_bytes('sent', self.host, len(chunk))
         except Exception as e:
-            return False, f"Failed to upload file: {str(e)}"
-    
-    def change_directory(self, session_id: str, path: str) -> tuple:
+            await pipe.finish(FTPTransferError(str(e)))
+            await asyncio.gather(transfer, return_exceptions=True)
+            raise FTPTransferError(str(e))
+        
+        await pipe.finish()
+        await transfer
+
+    async def quit(self):
         try:
-            if session_id not in self.connections:
-                return False, "No active FTP connection"
-            
-            ftp = self.connections[session_id]['ftp']
-            
-            if path == "..":
-                # Go up one directory
-                current = ftp.pwd()
-                if current != "/":
-                    parts = current.rstrip('/').split('/')
-                    if len(parts) > 1:
-                        new_path = '/'.join(parts[:-1]) or '/'
-                        ftp.cwd(new_path)
+            await self._call(self.ftp.quit)
+        finally:
+            self.close()
+
+    def close(self):
+        # Operations already queued still run and fail on the closed socket
+        self.ftp.close()
+        self._worker.shutdown(wait=False)
+
+class AsyncioFTPConnection(FTPConnectionBase):
+    """Native asyncio engine: speaks FTP over asyncio streams, no threads involved.
+
+    Replies and errors mirror ``ftplib`` (``error_perm`` for 5xx and so on),
+    so callers handle both engines the same way.
+    """
+    engine = 'asyncio'
+    encoding = 'utf-8'
+
+    def __init__(self, reader, writer, host: str, port: int, username: str):
+        super().__init__(host, port, username)
+        self._reader = reader
+        self._writer = writer
+        self._type = None
+
+    @classmethod
+    async def open(cls, host: str, port: int, username: str, password: str):
+        reader, writer = await asyncio.open_connection(host, port)
+        connection = cls(reader, writer, host, port, username)
+        try:
+            await connection._getresp()
+            resp = await connection.sendcmd(f'USER {username}')
+            if resp[0] == '3':
+                resp = await connection.sendcmd(f'PASS {password}')
+            if resp[0] == '3':
+                resp = await connection.sendcmd('ACCT ')
+            if resp[0] != '2':
+                raise ftplib.error_reply(resp)
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    async def _getline(self) -> str:
+        line = await self._reader.readline()
+        if not line:
+            raise EOFError
+        return line.decode(self.encoding, 'replace').rstrip('\r\n')
+
+    async def _getresp(self) -> str:
+        resp = await self._getline()
+        if resp[3:4] == '-':
+            code = resp[:3]
+            while True:
+                line = await self._getline()
+                resp = resp + '\n' + line
+                if line[:3] == code and line[3:4] != '-':
+                    break
+        c = resp[:1]
+        if c in {'1', '2', '3'}:
+            return resp
+        if c == '4':
+            raise ftplib.error_temp(resp)
+        if c == '5':
+            raise ftplib.error_perm(resp)
+        raise ftplib.error_proto(resp)
+
+    async def _voidresp(self) -> str:
+        resp = await self._getresp()
+        if resp[:1] != '2':
+            raise ftplib.error_reply(resp)
+        return resp
+
+    async def _discard_reply(self):
+        try:
+            await self._getresp()
+        except ftplib.Error:
+            pass
+
+    async def sendcmd(self, cmd: str) -> str:
+        self._writer.write((cmd + '\r\n').encode(self.encoding))
+        await self._writer.drain()
+        return await self._getresp()
+
+    async def voidcmd(self, cmd: str) -> str:
+        resp = await self.sendcmd(cmd)
+        if resp[:1] != '2':
+            raise ftplib.error_reply(resp)
+        return resp
+
+    async def _set_type(self, type_code: str):
+        if self._type != type_code:
+            await self.voidcmd(f'TYPE {type_code}')
+            self._type = type_code
+
+    async def _open_data(self, cmd: str, rest: int = None):
+        peer = self._writer.get_extra_info('peername')
+        if len(peer) == 4:  # IPv6
+            _, port = ftplib.parse229(await self.sendcmd('EPSV'), peer)
+        else:
+            # Like ftplib, trust the control connection address over the PASV reply
+            _, port = ftplib.parse227(await self.sendcmd('PASV'))
+        reader, writer = await asyncio.open_connection(peer[0], port)
+        try:
+            if rest is not None:
+                resp = await self.sendcmd(f'REST {rest}')
+                if resp[0] != '3':
+                    raise ftplib.error_reply(resp)
+            resp = await self.sendcmd(cmd)
+            # Some servers send a 2xx reply before the 150 preliminary reply
+            if resp[0] == '2':
+                resp = await self._getresp()
+            if resp[0] != '1':
+                raise ftplib.error_reply(resp)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def pwd(self) -> str:
+        resp = await self.voidcmd('PWD')
+        if not resp.startswith('257'):
+            return ''
+        return ftplib.parse257(resp)
+
+    async def cwd(self, path: str) -> str:
+        if path == '..':
+            try:
+                return await self.voidcmd('CDUP')
+            except ftplib.error_perm as msg:
+                if msg.args[0][:3] != '500':
+                    raise
+        elif path == '':
+            path = '.'
+        return await self.voidcmd(f'CWD {path}')
+
+    async def lines(self, cmd: str) -> list:
+        await self._set_type('A')
+        reader, writer = await self._open_data(cmd)
+        try:
+            data = await reader.read()
+        finally:
+            writer.close()
+        await self._voidresp()
+        return data.decode(self.encoding, 'replace').splitlines()
+
+    async def delete(self, name: str) -> str:
+        resp = await self.sendcmd(f'DELE {name}')
+        if resp[:3] in {'250', '200'}:
+            return resp
+        raise ftplib.error_reply(resp)
+
+    async def rmd(self, name: str) -> str:
+        return await self.voidcmd(f'RMD {name}')
+
+    async def rename(self, old_name: str, new_name: str) -> str:
+        resp = await self.sendcmd(f'RNFR {old_name}')
+        if resp[0] != '3':
+            raise ftplib.error_reply(resp)
+        return await self.voidcmd(f'RNTO {new_name}')
+
+    async def mkd(self, name: str) -> str:
+        resp = await self.voidcmd(f'MKD {name}')
+        if not resp.startswith('257'):
+            return ''
+        return ftplib.parse257(resp)
+
+    async def size(self, name: str):
+        await self._set_type('I')
+        resp = await self.sendcmd(f'SIZE {name}')
+        if resp[:3] == '213':
+            return int(resp[3:].strip())
+
+    async def retrieve(self, cmd: str, rest: int = None):
+        """Yield the data of a RETR-like command; closing early aborts the transfer."""
+        await self._set_type('I')
+        reader, writer = await self._open_data(cmd, rest)
+        completed = False
+        try:
+            while True:
+                chunk = await reader.read(TRANSFER_CHUNK_SIZE)
+                if not chunk:
+                    break
+                metrics.count_bytes('received', self.host, len(chunk))
+                yield chunk
+            completed = True
+        finally:
+            writer.close()
+            if completed:
+                await self._voidresp()
             else:
-                ftp.cwd(path)
-            
-            new_path = ftp.pwd()
-            self.connections[session_id]['current_path'] = new_path
-            
-            return True, f"Changed directory to {new_path}"
+                await self._discard_reply()
+
+    async def store(self, cmd: str, chunks, rest: int = None):
+        """Send an async iterable of chunks with a STOR-like command.
+
+        Raises FTPTransferError when ``chunks`` fails part way; the partial
+        transfer is closed and its reply consumed.
+        """
+        await self._set_type('I')
+        reader, writer = await self._open_data(cmd, rest)
+        try:
+            async for chunk in chunks:
+                writer.write(chunk)
+                await writer.drain()
+                metrics.count_bytes('sent', self.host, len(chunk))
         except Exception as e:
-            return False, f"Failed to change directory: {str(e)}"
-    
-    def delete_file(self, session_id: str, filename: str) -> tuple:
+            writer.close()
+            await self._discard_reply()
+            raise FTPTransferError(str(e))
+        
+        writer.close()
+        await writer.wait_closed()
+        await self._voidresp()
+
+    async def quit(self):
         try:
-            if session_id not in self.connections:
-                return False, "No active FTP connection"
-            
-            ftp = self.connections[session_id]['ftp']
-            
-            # Try to delete as file first, then as directory
+            await self.voidcmd('QUIT')
+        finally:
+            self.close()
+
+    def close(self):
+        self._writer.close()
+
+FTP_ENGINES = {
+    ThreadedFTPConnection.engine: ThreadedFTPConnection,
+    AsyncioFTPConnection.engine: AsyncioFTPConnection,
+}
+
+# Cross-session pool of authenticated connections
+class ConnectionPool:
+    """Warm, logged-in connections shared between sessions.
+
+    Connections are keyed by engine, host, port, username and a keyed hash
+    of the password, so a session only ever borrows a connection that was
+    authenticated with the same credentials. Borrowed connections are
+    checked with NOOP and changed back to their login directory; returned
+    ones stay open for ``FTP_SHARED_POOL_IDLE_TIMEOUT`` seconds.
+    """
+    def __init__(self, max_idle: int, max_idle_per_key: int, idle_timeout: float):
+        self.max_idle = max_idle
+        self.max_idle_per_key = max_idle_per_key
+        self.idle_timeout = idle_timeout
+        self.idle = OrderedDict()  # key -> [(connection, released_at)], least recently used key first
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.returns = 0
+        self.evictions = 0
+        self._secret = os.urandom(32)
+
+    def _key(self, engine: str, host: str, port: int, username: str, password: str) -> tuple:
+        credential = hmac.new(self._secret, password.encode('utf-8'), hashlib.sha256).hexdigest()
+        return engine, host, port, username, credential
+
+    @property
+    def idle_count(self) -> int:
+        return sum(len(members) for members in self.idle.values())
+
+    async def acquire(self, engine: str, host: str, port: int, username: str, password: str) -> FTPConnectionBase:
+        key = self._key(engine, host, port, username, password)
+        self.reap_idle()
+        members = self.idle.get(key)
+        while members:
+            ftp, _ = members.pop()
+            if not members:
+                del self.idle[key]
+            try:
+                async with ftp.exclusive():
+                    await ftp.voidcmd('NOOP')
+                    await _change_into(ftp, ftp.home_directory)
+            except Exception:
+                self.stale += 1
+                ftp.close()
+                continue
+            self.hits += 1
+            return ftp
+        
+        self.misses += 1
+        ftp = await FTP_ENGINES[engine].open(host, port, username, password)
+        try:
+            ftp.home_directory = ftp.working_directory = await ftp.pwd() or '/'
+            ftp.features = await ftp.fetch_features()
+        except BaseException:
+            ftp.close()
+            raise
+        ftp.pool_key = key
+        return ftp
+
+    def release(self, ftp: FTPConnectionBase):
+        """Keep a healthy, idle connection for the next session with the same login."""
+        if self.max_idle <= 0 or ftp.pool_key is None:
+            spawn(_quit_quietly(ftp))
+            return
+        members = self.idle.setdefault(ftp.pool_key, [])
+        members.append((ftp, time.monotonic()))
+        self.idle.move_to_end(ftp.pool_key)
+        self.returns += 1
+        if len(members) > self.max_idle_per_key:
+            self._evict(ftp.pool_key)
+        while self.idle_count > self.max_idle:
+            self._evict(next(iter(self.idle)))
+
+    def _evict(self, key: tuple):
+        members = self.idle[key]
+        ftp, _ = members.pop(0)
+        if not members:
+            del self.idle[key]
+        self.evictions += 1
+        spawn(_quit_quietly(ftp))
+
+    def reap_idle(self):
+        deadline = time.monotonic() - self.idle_timeout
+        for key in list(self.idle):
+            while key in self.idle and self.idle[key][0][1] < deadline:
+                self._evict(key)
+
+    async def close(self):
+        idle, self.idle = self.idle, OrderedDict()
+        for members in idle.values():
+            for ftp, _ in members:
+                await _quit_quietly(ftp)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'stale': self.stale,
+            'returns': self.returns,
+            'evictions': self.evictions,
+            'idle_connections': self.idle_count,
+            'idle_keys': len(self.idle),
+        }
+
+# Create shared connection pool instance
+connection_pool = ConnectionPool(SHARED_POOL_MAX_IDLE, SHARED_POOL_MAX_IDLE_PER_KEY, SHARED_POOL_IDLE_TIMEOUT)
+
+# Per-session connection pool
+class SessionPool:
+    """Bounded set of authenticated connections sharing one session's login.
+
+    The primary connection carries metadata commands. Transfers check out a
+    member of their own, so a long download never blocks listings or renames
+    on the same session. Members are borrowed lazily from the shared
+    connection pool, changed into the session's working directory on
+    checkout, and handed back after sitting idle for ``FTP_POOL_IDLE_TIMEOUT``
+    seconds or when the session ends.
+    """
+    def __init__(self, primary: FTPConnectionBase, password: str, max_size: int):
+        self.primary = primary
+        self.max_size = max(1, max_size)
+        self.idle = []  # (connection, released_at) for members not in use
+        self.in_use = 0
+        self.closed = False
+        self._password = password
+        self._available = asyncio.Condition()
+
+    @property
+    def size(self) -> int:
+        return 1 + len(self.idle) + self.in_use
+
+    @property
+    def password(self) -> str:
+        return self._password
+
+    async def _acquire(self):
+        async with self._available:
+            while True:
+                self.reap_idle()
+                if self.idle:
+                    member, _ = self.idle.pop()
+                    self.in_use += 1
+                    return member
+                if self.size < self.max_size:
+                    self.in_use += 1  # reserve the slot while connecting
+                    break
+                await self._available.wait()
+        
+        primary = self.primary
+        try:
+            return await connection_pool.acquire(primary.engine, primary.host, primary.port, primary.username, self._password)
+        except Exception as e:
+            # Most likely a per-user connection limit: stop growing and share the primary
+            logger.warning(f"Could not open pooled connection to {primary.host}: {str(e)}")
+            async with self._available:
+                self.in_use -= 1
+                self.max_size = self.size
+                self._available.notify()
+            return None
+
+    async def _release(self, member: FTPConnectionBase, broken: bool):
+        async with self._available:
+            self.in_use -= 1
+            if broken:
+                member.close()
+            elif self.closed:
+                connection_pool.release(member)
+            else:
+                self.idle.append((member, time.monotonic()))
+            self._available.notify()
+
+    @property
+    def busy(self) -> bool:
+        return self.in_use > 0 or self.primary.queue_depth > 0
+
+    def reap_idle(self):
+        deadline = time.monotonic() - FTP_POOL_IDLE_TIMEOUT
+        while self.idle and self.idle[0][1] < deadline:
+            member, _ = self.idle.pop(0)
+            connection_pool.release(member)
+
+    @asynccontextmanager
+    async def metadata(self, path: str):
+        """Hold the primary connection, with ``path`` as its working directory."""
+        async with self.primary.exclusive():
+            # The connection may have been handed back while this call was queued
+            if self.closed:
+                raise ftplib.error_temp("421 Session closed")
+            await _change_into(self.primary, path)
+            yield self.primary
+
+    @asynccontextmanager
+    async def checkout(self, path: str):
+        """Hold a connection for a transfer, with ``path`` as its working directory."""
+        if self.closed:
+            raise ftplib.error_temp("421 Session closed")
+        member = await self._acquire() if self.max_size > 1 else None
+        if member is None:
+            async with self.metadata(path) as ftp:
+                yield ftp
+            return
+        
+        broken = True
+        try:
+            async with member.exclusive():
+                await _change_into(member, path)
+                yield member
+            broken = False
+        except ftplib.error_perm:
+            # The server refused a command; the connection itself is fine
+            broken = False
+            raise
+        finally:
+            await self._release(member, broken)
+
+    @asynccontextmanager
+    async def borrow(self, path: str):
+        """Hold an extra connection from the shared pool, outside this session's size limit."""
+        if self.closed:
+            raise ftplib.error_temp("421 Session closed")
+        primary = self.primary
+        member = await connection_pool.acquire(primary.engine, primary.host, primary.port, primary.username, self._password)
+        broken = True
+        try:
+            async with member.exclusive():
+                await _change_into(member, path)
+                yield member
+            broken = False
+        except ftplib.error_perm:
+            broken = False
+            raise
+        finally:
+            if broken:
+                member.close()
+            else:
+                connection_pool.release(member)
+
+    async def close(self):
+        """Hand every connection back to the shared pool once it is no longer in use."""
+        self.closed = True
+        async with self._available:
+            idle, self.idle = self.idle, []
+        for member, _ in idle:
+            connection_pool.release(member)
+        async with self.primary.exclusive():
+            pass
+        connection_pool.release(self.primary)
+
+async def _change_into(ftp: FTPConnectionBase, path: str):
+    if ftp.working_directory != path:
+        await ftp.cwd(path)
+        ftp.working_directory = path
+
+async def _quit_quietly(ftp: FTPConnectionBase):
+    try:
+        async with ftp.exclusive():
+            await ftp.quit()
+    except Exception:
+        ftp.close()
+
+# Directory listing parsers
+_UNIX_LIST_RE = re.compile(
+    r'^([-dlbcps])\S{9}\S?\s+\d+\s+\S+\s+(?:\S+\s+)?(\d+)\s+'
+    r'(\w{3}\s+\d{1,2}\s+(?:\d{1,2}:\d{2}|\d{4})|\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}) (.*)$'
+)
+# IIS pads <DIR> with ten spaces and puts one space after a size; only those
+# separators are dropped, so names keep their leading spaces
+_DOS_LIST_RE = re.compile(
+    r'^(\d{2}-\d{2}-\d{2,4}\s+\d{1,2}:\d{2}(?:\s?[AaPp][Mm])?)\s+(?:<DIR>(?: {10}|\s+)|(\d+) )(.*)$'
+)
+
+def _parse_unix_line(line: str):
+    match = _UNIX_LIST_RE.match(line)
+    if match is None:
+        return None
+    kind, size, modified, name = match.groups()
+    if kind == 'd':
+        return name, 'directory', None, ' '.join(modified.split())
+    if kind == 'l':
+        name = name.split(' -> ', 1)[0]
+    return name, 'file', int(size), ' '.join(modified.split())
+
+def _parse_dos_line(line: str):
+    match = _DOS_LIST_RE.match(line)
+    if match is None:
+        return None
+    modified, size, name = match.groups()
+    if size is None:
+        return name, 'directory', None, ' '.join(modified.split())
+    return name, 'file', int(size), ' '.join(modified.split())
+
+def _parse_eplf_line(line: str):
+    # +i8388621.29609,m824255902,/,\tdev
+    if not line.startswith('+') or '\t' not in line:
+        return None
+    facts, name = line[1:].split('\t', 1)
+    file_type, size, modified = 'file', None, None
+    for fact in facts.split(','):
+        if fact == '/':
+            file_type = 'directory'
+        elif fact[:1] == 's' and fact[1:].isdigit():
+            size = int(fact[1:])
+        elif fact[:1] == 'm' and fact[1:].isdigit():
+            modified = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(int(fact[1:])))
+    return name, file_type, size if file_type == 'file' else None, modified
+
+_LIST_PARSERS = (_parse_unix_line, _parse_dos_line, _parse_eplf_line)
+
+def parse_list_lines(lines) -> list:
+    """Parse LIST output in Unix, DOS/IIS or EPLF format into FTPFileInfo objects.
+
+    Listings are homogeneous, so the parser that matched the previous line
+    is tried first and the others only when it fails. Unparseable lines
+    (such as the ``total`` header) are skipped.
+    """
+    files = []
+    parser = _parse_unix_line
+    for line in lines:
+        entry = parser(line)
+        if entry is None:
+            for candidate in _LIST_PARSERS:
+                if candidate is not parser:
+                    entry = candidate(line)
+                    if entry is not None:
+                        parser = candidate
+                        break
+            else:
+                continue
+        name, file_type, size, modified = entry
+        # Skip . and .. entries
+        if name in ('.', '..'):
+            continue
+        files.append(FTPFileInfo(name=name, type=file_type, size=size, modified=modified))
+    return files
+
+def parse_mlsd_lines(lines) -> list:
+    """Parse MLSD output (RFC 3659 facts) into FTPFileInfo objects with UTC timestamps."""
+    files = []
+    for line in lines:
+        facts_part, sep, name = line.partition(' ')
+        if not sep:
+            continue
+        facts = {}
+        for fact in facts_part.split(';'):
+            key, _, value = fact.partition('=')
+            if key:
+                facts[key.lower()] = value
+        kind = facts.get('type', '').lower()
+        if kind in ('cdir', 'pdir') or name in ('.', '..'):
+            continue
+        file_type = 'directory' if kind == 'dir' else 'file'
+        size = facts.get('size') or facts.get('sizd')
+        files.append(FTPFileInfo(
+            name=name,
+            type=file_type,
+            size=int(size) if file_type == 'file' and size and size.isdigit() else None,
+            modified=format_ftp_timestamp(facts.get('modify'))
+        ))
+    return files
+
+def format_ftp_timestamp(value: str):
+    """Turn an RFC 3659 ``YYYYMMDDHHMMSS[.sss]`` UTC time into ISO 8601."""
+    if value and len(value) >= 14 and value[:14].isdigit():
+        return f"{value[:4]}-{value[4:6]}-{value[6:8]}T{value[8:10]}:{value[10:12]}:{value[12:14]}Z"
+    return value
+
+def build_file_filter(pattern: str = None, regex: str = None, file_type: str = None, min_size: int = None,
+                      max_size: int = None, modified_after: float = None, modified_before: float = None,
+                      ignore_case: bool = False):
+    """Build a predicate over FTPFileInfo from find criteria; all given criteria must hold.
+
+    ``pattern`` is a shell glob and ``regex`` a regular expression searched
+    in the name. Size bounds only match files; time bounds only match
+    entries whose listing carries a full UTC timestamp (MLSD or EPLF).
+    Raises ``re.error`` for an invalid pattern.
+    """
+    flags = re.IGNORECASE if ignore_case else 0
+    checks = []
+    if pattern:
+        checks.append(re.compile(fnmatch.translate(pattern), flags).match)
+    if regex:
+        checks.append(re.compile(regex, flags).search)
+
+    def matches(info: FTPFileInfo) -> bool:
+        if file_type and info.type != file_type:
+            return False
+        for check in checks:
+            if not check(info.name):
+                return False
+        if min_size is not None or max_size is not None:
+            if info.size is None:
+                return False
+            if min_size is not None and info.size < min_size:
+                return False
+            if max_size is not None and info.size > max_size:
+                return False
+        if modified_after is not None or modified_before is not None:
+            timestamp = _entry_timestamp(info)
+            if timestamp is None:
+                return False
+            if modified_after is not None and timestamp < modified_after:
+                return False
+            if modified_before is not None and timestamp > modified_before:
+                return False
+        return True
+
+    return matches
+
+def remote_path(current_path: str, name: str) -> str:
+    """Absolute, normalized remote path of ``name`` relative to ``current_path``."""
+    path = posixpath.normpath(posixpath.join(current_path or '/', name))
+    return '/' + path.lstrip('/')
+
+# Transfer checksums
+class CRC32Digest:
+    """hashlib-style wrapper around ``zlib.crc32``."""
+    def __init__(self):
+        self.value = 0
+    
+    def update(self, data: bytes):
+        self.value = zlib.crc32(data, self.value)
+    
+    def hexdigest(self) -> str:
+        return f"{self.value:08x}"
+
+CHECKSUM_ALGORITHMS = {
+    'sha256': hashlib.sha256,
+    'md5': hashlib.md5,
+    'crc32': CRC32Digest,
+}
+# Per algorithm: its name for OPTS HASH, the legacy command and the length of its hex digest
+SERVER_CHECKSUM_COMMANDS = {
+    'sha256': ('SHA-256', 'XSHA256', 64),
+    'md5': ('MD5', 'XMD5', 32),
+    'crc32': ('CRC32', 'XCRC', 8),
+}
+
+def checksum_algorithm(name: str):
+    """Validated algorithm for a request, FTP_TRANSFER_CHECKSUM when ``name`` is empty; None for no checksum."""
+    name = (name or FTP_TRANSFER_CHECKSUM).lower()
+    if name in ('', 'none'):
+        return None
+    if name not in CHECKSUM_ALGORITHMS:
+        raise ValueError(f"Unsupported checksum algorithm '{name}', use one of {', '.join(CHECKSUM_ALGORITHMS)}")
+    return name
+
+def parse_checksum_reply(resp: str, algorithm: str):
+    """Hex digest in a HASH, XSHA256, XMD5 or XCRC reply, lower-cased; None if there is none.
+
+    HASH replies ``213 <algorithm> <range> <digest> <name>`` while the legacy
+    commands reply with the bare digest, so the first hex token is taken.
+    Some servers drop leading zeros from CRC32 values.
+    """
+    length = SERVER_CHECKSUM_COMMANDS[algorithm][2]
+    for token in resp[4:].split():
+        token = token.strip('"')
+        if re.fullmatch(r'[0-9a-fA-F]+', token) and (len(token) == length or
+                                                    algorithm == 'crc32' and len(token) < length):
+            return token.lower().zfill(length)
+    return None
+
+async def digest_chunks(chunks, digest):
+    """Pass ``chunks`` through, feeding each into ``digest`` on the way."""
+    async for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+# Directory listing cache
+class ListingCache:
+    """LRU cache of directory listings shared by all sessions on a server.
+
+    Entries are keyed by ``(host, port, username)`` plus the absolute
+    directory path, expire after ``ttl`` seconds and are evicted least
+    recently used first once ``max_entries`` directories are cached.
+    Write operations patch or drop the entries they affect.
+    """
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (server_key, path) -> (files, fetched_at)
+
+    def get(self, server_key: tuple, path: str):
+        """Return ``(files, age_seconds)`` for a fresh entry, else None."""
+        key = (server_key, path)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        age = time.monotonic() - entry[1]
+        if age > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[0], age
+
+    def put(self, server_key: tuple, path: str, files: list):
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        key = (server_key, path)
+        self.entries[key] = (files, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, server_key: tuple, path: str):
+        self.entries.pop((server_key, path), None)
+
+    def invalidate_tree(self, server_key: tuple, path: str):
+        """Drop the listing of ``path`` and of every directory below it."""
+        prefix = path.rstrip('/') + '/'
+        for key in [k for k in self.entries if k[0] == server_key and (k[1] == path or k[1].startswith(prefix))]:
+            del self.entries[key]
+
+    def remove_entry(self, server_key: tuple, path: str):
+        """Remove ``path`` from its parent's cached listing; returns the removed entry."""
+        parent, name = posixpath.split(path)
+        entry = self.entries.get((server_key, parent))
+        if entry is None:
+            return None
+        files, fetched_at = entry
+        removed = next((f for f in files if f.name == name), None)
+        if removed is not None:
+            self.entries[(server_key, parent)] = ([f for f in files if f.name != name], fetched_at)
+        return removed
+
+    def add_entry(self, server_key: tuple, path: str, file_info: FTPFileInfo):
+        """Insert or replace ``path`` in its parent's cached listing, if cached."""
+        parent, name = posixpath.split(path)
+        entry = self.entries.get((server_key, parent))
+        if entry is None:
+            return
+        files, fetched_at = entry
+        files = [f for f in files if f.name != name]
+        files.append(file_info.model_copy(update={'name': name}))
+        self.entries[(server_key, parent)] = (files, fetched_at)
+
+# Create listing cache instance
+listing_cache = ListingCache(LISTING_CACHE_TTL, LISTING_CACHE_SIZE)
+
+def _size_key(info: FTPFileInfo) -> tuple:
+    return (-1 if info.size is None else info.size, info.name)
+
+def _modified_key(info: FTPFileInfo) -> tuple:
+    timestamp = _entry_timestamp(info)
+    return (-1 if timestamp is None else timestamp, info.name)
+
+class ListingViews:
+    """Sorted and filtered views of directory listings, for paging through large directories.
+
+    A view is rebuilt only when the listing it was made from is replaced or
+    patched in the listing cache, so every further page costs a bisect and
+    a slice instead of a sort over the whole directory. Views are kept in
+    LRU order up to ``max_views``.
+    """
+    SORT_KEYS = {
+        'name': lambda info: (info.name,),
+        'size': _size_key,
+        'modified': _modified_key,
+    }
+
+    def __init__(self, max_views: int):
+        self.max_views = max_views
+        self.views = OrderedDict()  # (server_key, path, sort, filter_key) -> (files, entries, keys)
+
+    def get(self, server_key: tuple, path: str, files: list, sort: str, filter_key: tuple, matches) -> tuple:
+        """Entries of ``files`` accepted by ``matches`` in ascending ``sort`` order, with their sort keys."""
+        key = (server_key, path, sort, filter_key)
+        view = self.views.get(key)
+        # Cache patches replace the files list, so identity tells whether the view is current
+        if view is None or view[0] is not files:
+            sort_key = self.SORT_KEYS[sort]
+            entries = sorted((info for info in files if matches(info)), key=sort_key)
+            view = (files, entries, [sort_key(info) for info in entries])
+            self.views[key] = view
+        self.views.move_to_end(key)
+        while len(self.views) > self.max_views:
+            self.views.popitem(last=False)
+        return view[1], view[2]
+
+    def page(self, server_key: tuple, path: str, files: list, sort: str, descending: bool, filter_key: tuple,
+             matches, limit: int = None, after: tuple = None) -> tuple:
+        """One page of a view as ``(entries, total, last_key)``.
+
+        ``after`` is the sort key of the last entry of the previous page;
+        ``last_key`` is None once the view is exhausted. Paging by key rather
+        than by offset keeps pages consistent while entries are added or
+        removed between requests.
+        """
+        entries, keys = self.get(server_key, path, files, sort, filter_key, matches)
+        if descending:
+            end = len(keys) if after is None else bisect.bisect_left(keys, after)
+            start = 0 if limit is None else max(end - limit, 0)
+            page = entries[start:end][::-1]
+            more = start > 0
+        else:
+            start = 0 if after is None else bisect.bisect_right(keys, after)
+            end = len(keys) if limit is None else start + limit
+            page = entries[start:end]
+            more = end < len(keys)
+        last_key = self.SORT_KEYS[sort](page[-1]) if page and more else None
+        return page, len(entries), last_key
+
+listing_views = ListingViews(LISTING_VIEW_CACHE_SIZE)
+
+def encode_listing_cursor(sort: str, descending: bool, key: tuple) -> str:
+    data = json.dumps([sort, descending, list(key)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+def glob_to_regex(pattern: str) -> str:
+    """Anchored regular expression for a shell glob, in syntax MongoDB's ``$regex`` accepts."""
+    parts = []
+    for token in re.split(r'(\*|\?|\[[^\]]+\])', pattern):
+        if token == '*':
+            parts.append('.*')
+        elif token == '?':
+            parts.append('.')
+        elif token.startswith('[') and token.endswith(']') and len(token) > 2:
+            body = token[1:-1].replace('\\', '\\\\')
+            parts.append('[^' + body[1:] + ']' if body.startswith('!') else '[' + body + ']')
+        else:
+            parts.append(re.escape(token))
+    return '^' + ''.join(parts) + '$'
+
+def decode_listing_cursor(cursor: str, sort: str, descending: bool) -> tuple:
+    """Sort key encoded in ``cursor``; raises ValueError when it is malformed or from another ordering."""
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, cursor_descending, key = json.loads(data)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+    if cursor_sort != sort or cursor_descending != descending:
+        raise ValueError("Cursor was issued for a different sort order")
+    # Keys are compared with the view's keys, so they must have the same shape
+    if (not isinstance(key, list) or len(key) != (1 if sort == 'name' else 2) or not isinstance(key[-1], str)
+            or not all(isinstance(part, (int, float)) for part in key[:-1])):
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
+# Metadata index
+class MetadataIndex:
+    """Remote tree metadata mirrored into MongoDB for listing and search without the FTP server.
+
+    ``ftp_index`` holds one document per entry, keyed by server and absolute
+    path, with its parent directory, name, type, size, timestamp and the
+    time it was last confirmed. ``ftp_index_directories`` keeps a
+    fingerprint of every indexed listing, so a refresh only rewrites the
+    directories whose listing changed and merely touches the others.
+    Servers are identified as ``username@host:port``.
+    """
+    def __init__(self, database, batch_size: int, search_timeout: float):
+        self.entries = database.ftp_index
+        self.directories = database.ftp_index_directories
+        self.batch_size = batch_size
+        self.search_timeout = search_timeout
+
+    @staticmethod
+    def server_name(server_key: tuple) -> str:
+        host, port, username = server_key
+        return f"{username}@{host}:{port}"
+
+    async def ensure_indexes(self):
+        await self.entries.create_index([('server', 1), ('path', 1)], unique=True)
+        await self.entries.create_index([('server', 1), ('parent', 1), ('name', 1)])
+        await self.entries.create_index([('server', 1), ('name', 1)])
+        await self.entries.create_index([('server', 1), ('size', 1)])
+        await self.entries.create_index([('server', 1), ('mtime', 1)])
+        await self.directories.create_index([('server', 1), ('path', 1)], unique=True)
+
+    @staticmethod
+    def _fingerprint(files: list) -> str:
+        digest = hashlib.sha1()
+        for info in sorted(files, key=lambda info: info.name):
+            digest.update(f"{info.name}\0{info.type}\0{info.size}\0{info.modified}\n".encode())
+        return digest.hexdigest()
+
+    async def _remove(self, server: str, paths: list, directories: list):
+        for start in range(0, len(paths), self.batch_size):
+            await self.entries.delete_many({'server': server, 'path': {'$in': paths[start:start + self.batch_size]}})
+        for path in directories:
+            below = {'$regex': '^' + re.escape(path.rstrip('/')) + '/'}
+            await self.entries.delete_many({'server': server, 'path': below})
+            await self.directories.delete_many({'server': server, 'path': path})
+            await self.directories.delete_many({'server': server, 'path': below})
+
+    async def update_directory(self, server: str, path: str, files: list, summary: dict):
+        """Bring the index of one directory in line with its listing, counting the work in ``summary``."""
+        now = datetime.utcnow()
+        fingerprint = self._fingerprint(files)
+        previous = await self.directories.find_one({'server': server, 'path': path})
+        if previous is not None and previous['fingerprint'] == fingerprint:
+            await self.entries.update_many({'server': server, 'parent': path}, {'$set': {'indexed_at': now}})
+            await self.directories.update_one({'_id': previous['_id']}, {'$set': {'indexed_at': now}})
+            summary['unchanged'] += 1
+            return
+        
+        listed = {info.name: info for info in files}
+        vanished, vanished_directories = [], []
+        async for document in self.entries.find({'server': server, 'parent': path}, {'name': 1, 'type': 1}):
+            info = listed.get(document['name'])
+            if info is None or info.type != document['type']:
+                vanished.append(remote_path(path, document['name']))
+                if document['type'] == 'directory':
+                    vanished_directories.append(vanished[-1])
+        await self._remove(server, vanished, vanished_directories)
+        
+        operations = []
+        for info in files:
+            entry_path = remote_path(path, info.name)
+            document = {
+                'server': server,
+                'path': entry_path,
+                'parent': path,
+                'name': info.name,
+                'type': info.type,
+                'size': info.size,
+                'modified': info.modified,
+                'mtime': _entry_timestamp(info),
+                'indexed_at': now
+            }
+            operations.append(ReplaceOne({'server': server, 'path': entry_path}, document, upsert=True))
+            if len(operations) >= self.batch_size:
+                await self.entries.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            await self.entries.bulk_write(operations, ordered=False)
+        await self.directories.replace_one(
+            {'server': server, 'path': path},
+            {'server': server, 'path': path, 'fingerprint': fingerprint, 'entries': len(files), 'indexed_at': now},
+            upsert=True
+        )
+        summary['changed'] += 1
+        summary['entries'] += len(files)
+        summary['removed'] += len(vanished)
+
+    async def listing(self, server: str, path: str) -> tuple:
+        """Indexed entries of ``path`` by name, and when its listing was last indexed (None if never)."""
+        directory = await self.directories.find_one({'server': server, 'path': path})
+        if directory is None:
+            return [], None
+        documents = await self.entries.find({'server': server, 'parent': path}).sort('name', 1).to_list(None)
+        return documents, directory['indexed_at']
+
+    async def search(self, server: str, root: str, query: dict, limit: int) -> list:
+        """Entries below ``root`` matching the extra MongoDB ``query`` conditions, by path.
+
+        Raises ``ExecutionTimeout`` once the search runs past ``search_timeout``.
+        """
+        conditions = {'server': server, **query}
+        if root != '/':
+            conditions['path'] = {'$regex': '^' + re.escape(root.rstrip('/')) + '/'}
+        cursor = self.entries.find(conditions).sort('path', 1).limit(limit)
+        return await cursor.max_time_ms(int(self.search_timeout * 1000)).to_list(None)
+
+    async def drop(self, server: str) -> int:
+        result = await self.entries.delete_many({'server': server})
+        await self.directories.delete_many({'server': server})
+        return result.deleted_count
+
+metadata_index = MetadataIndex(db, FTP_INDEX_BATCH_SIZE, FTP_INDEX_SEARCH_TIMEOUT) if FTP_INDEX_ENABLED else None
+
+def index_entry(document: dict) -> FTPIndexEntry:
+    return FTPIndexEntry(
+        **{field: document.get(field) for field in ('path', 'name', 'type', 'size', 'modified', 'indexed_at')},
+        stale_seconds=round((datetime.utcnow() - document['indexed_at']).total_seconds(), 3)
+    )
+
+# Directory mirroring
+MIRROR_STATE_PREFIX = '.ftp-mirror-'
+MIRROR_TIME_TOLERANCE = 2  # seconds; FTP timestamps have at best one second resolution
+
+def resolve_mirror_path(local_path: str) -> str:
+    """Absolute local directory for ``local_path``; raises ValueError outside FTP_MIRROR_ROOT."""
+    if not FTP_MIRROR_ROOT:
+        raise ValueError("Mirroring is disabled; set FTP_MIRROR_ROOT")
+    root = os.path.realpath(FTP_MIRROR_ROOT)
+    path = os.path.realpath(os.path.join(root, local_path.lstrip('/')))
+    if path != root and not path.startswith(root + os.sep):
+        raise ValueError(f"Local path '{local_path}' is outside the mirror root")
+    return path
+
+def scan_local_tree(root: str) -> dict:
+    """``relative path -> (size, mtime)`` of the regular files below ``root``; symlinks are not followed."""
+    files = {}
+    for directory, subdirectories, names in os.walk(root):
+        subdirectories[:] = [name for name in subdirectories if not os.path.islink(os.path.join(directory, name))]
+        for name in names:
+            # State files, and partial downloads left behind by an interrupted sync
+            if name.startswith(MIRROR_STATE_PREFIX) or name.endswith(f".{MIRROR_STATE_PREFIX}part"):
+                continue
+            path = os.path.join(directory, name)
+            stat = os.lstat(path)
+            if not os.path.isfile(path) or os.path.islink(path):
+                continue
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            files[relative] = (stat.st_size, int(stat.st_mtime))
+    return files
+
+def _mirror_state_file(local_root: str, server: str, remote_root: str) -> str:
+    digest = hashlib.sha1(f"{server}:{remote_root}".encode()).hexdigest()[:16]
+    return os.path.join(local_root, f"{MIRROR_STATE_PREFIX}{digest}.json")
+
+def load_mirror_state(path: str) -> dict:
+    """Signatures recorded by the last sync: ``relative path -> {'local': [...], 'remote': [...]}``."""
+    try:
+        with open(path) as f:
+            return json.load(f)['files']
+    except (OSError, ValueError, KeyError):
+        return {}
+
+def save_mirror_state(path: str, files: dict):
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump({'synced_at': datetime.utcnow().isoformat(), 'files': files}, f)
+    os.replace(temporary, path)
+
+def _same_file(local, remote) -> bool:
+    """Whether a local and a remote signature describe the same content, judged by size and time."""
+    if local is None or remote is None or local[0] != remote[0]:
+        return False
+    return remote[1] is None or abs(local[1] - remote[1]) <= MIRROR_TIME_TOLERANCE
+
+def _signature(value):
+    return tuple(value) if value is not None else None
+
+def plan_mirror(direction: str, local: dict, remote: dict, state: dict, delete: bool,
+                remote_times: dict = None) -> tuple:
+    """Work needed to bring the two trees in line, as ``(actions, unchanged, conflicts)``.
+
+    ``local`` and ``remote`` map relative paths to ``(size, mtime)``
+    signatures, the remote mtime being None when the listing has none;
+    ``remote`` is None when the remote tree was not scanned and the last
+    sync's signatures stand in for it. ``remote_times`` holds MDTM times
+    that refine the listing's. Actions are ``(action, path, reason)``;
+    ``unchanged`` maps the paths left alone to their ``(local, remote)``
+    signatures, either of which may be None for a one-way mirror that
+    does not delete. One-way mirrors make the target match the source.
+    In two-way mode a file changed on one side since the last sync is
+    copied to the other, and when both changed the newer one wins.
+    """
+    remote_times = remote_times or {}
+    actions, unchanged, conflicts = [], {}, 0
+    if remote is None:
+        scanned = {path: _signature(entry['remote']) for path, entry in state.items() if entry['remote'] is not None}
+    else:
+        scanned = remote
+    for path in sorted(set(local) | set(scanned) | set(state)):
+        here, there = local.get(path), scanned.get(path)
+        previous = state.get(path)
+        local_changed = previous is None or here != _signature(previous['local'])
+        remote_changed = previous is None or there != _signature(previous['remote'])
+        precise = there if there is None or path not in remote_times else (there[0], remote_times[path])
+        if here is not None and there is not None and not local_changed and not remote_changed:
+            unchanged[path] = (here, there)
+            continue
+        if direction == 'upload':
+            if here is None:
+                if there is not None and delete:
+                    actions.append(('delete_remote', path, "deleted locally"))
+                elif there is not None:
+                    unchanged[path] = (None, there)
+            elif there is None:
+                actions.append(('upload', path, "missing on the server"))
+            elif previous is None and _same_file(here, precise):
+                unchanged[path] = (here, there)
+            else:
+                actions.append(('upload', path, "changed locally" if local_changed else "changed on the server"))
+        elif direction == 'download':
+            if there is None:
+                if here is not None and delete:
+                    actions.append(('delete_local', path, "deleted on the server"))
+                elif here is not None:
+                    unchanged[path] = (here, None)
+            elif here is None:
+                actions.append(('download', path, "missing locally"))
+            elif previous is None and _same_file(here, precise):
+                unchanged[path] = (here, there)
+            else:
+                actions.append(('download', path, "changed on the server" if remote_changed else "changed locally"))
+        elif here is not None and there is not None and _same_file(here, precise):
+            unchanged[path] = (here, there)
+        elif previous is not None and local_changed and not remote_changed:
+            if here is None:
+                actions.append(('delete_remote', path, "deleted locally") if delete
+                               else ('download', path, "deleted locally, restored"))
+            else:
+                actions.append(('upload', path, "changed locally"))
+        elif previous is not None and remote_changed and not local_changed:
+            if there is None:
+                actions.append(('delete_local', path, "deleted on the server") if delete
+                               else ('upload', path, "deleted on the server, restored"))
+            else:
+                actions.append(('download', path, "changed on the server"))
+        elif here is None and there is not None:
+            actions.append(('download', path, "missing locally"))
+        elif there is None and here is not None:
+            actions.append(('upload', path, "missing on the server"))
+        elif here is not None and there is not None:
+            conflicts += 1
+            if here[1] >= (precise[1] or 0):
+                actions.append(('upload', path, "changed on both sides, local copy is newer"))
+            else:
+                actions.append(('download', path, "changed on both sides, server copy is newer"))
+    return actions, unchanged, conflicts
+
+async def _read_local_file(path: str):
+    loop = asyncio.get_event_loop()
+    f = await loop.run_in_executor(executor, open, path, 'rb')
+    try:
+        while True:
+            chunk = await loop.run_in_executor(executor, f.read, UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
+
+# Streaming archive writers
+def _entry_timestamp(info: FTPFileInfo):
+    """UTC timestamp of a listing entry, or None when its format carries no full date."""
+    if info.modified and len(info.modified) == 20 and info.modified.endswith('Z'):
+        try:
+            return calendar.timegm(time.strptime(info.modified, '%Y-%m-%dT%H:%M:%SZ'))
+        except ValueError:
+            pass
+    return None
+
+def _entry_mtime(info: FTPFileInfo) -> float:
+    """Timestamp of a listing entry; ``time.time()`` when the listing format has no usable one."""
+    timestamp = _entry_timestamp(info)
+    return time.time() if timestamp is None else timestamp
+
+class _ArchiveBuffer(io.RawIOBase):
+    """Unseekable sink that collects whatever the archive library writes."""
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.data += data
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = bytes(self.data)
+        self.data.clear()
+        return data
+
+class ZipStreamWriter:
+    """Encode a ZIP archive incrementally, one chunk at a time.
+
+    Every method returns the bytes to send next. Entries are stored
+    uncompressed with data descriptors, so sizes never have to be known in
+    advance and nothing is buffered beyond the chunk being written. Entries
+    of unknown size always get ZIP64 records, since they may exceed 4 GiB.
+    """
+    media_type = 'application/zip'
+    extension = 'zip'
+    needs_size = False
+
+    def __init__(self):
+        self.buffer = _ArchiveBuffer()
+        self.zip = zipfile.ZipFile(self.buffer, 'w', zipfile.ZIP_STORED, allowZip64=True)
+        self.file = None
+
+    def _info(self, name: str, mtime: float) -> zipfile.ZipInfo:
+        date_time = time.localtime(max(mtime, 315532800))[:6]  # ZIP cannot store times before 1980
+        return zipfile.ZipInfo(name, date_time)
+
+    def add_directory(self, name: str, mtime: float) -> bytes:
+        info = self._info(name.rstrip('/') + '/', mtime)
+        info.external_attr = (0o40755 << 16) | 0x10
+        self.zip.writestr(info, b'')
+        return self.buffer.drain()
+
+    def begin_file(self, name: str, size: Optional[int], mtime: float) -> bytes:
+        info = self._info(name, mtime)
+        info.external_attr = 0o644 << 16
+        info.file_size = size or 0  # only used to decide on ZIP64 records
+        self.file = self.zip.open(info, 'w', force_zip64=size is None)
+        return self.buffer.drain()
+
+    def write(self, data: bytes) -> bytes:
+        self.file.write(data)
+        return self.buffer.drain()
+
+    def end_file(self) -> bytes:
+        self.file.close()
+        self.file = None
+        return self.buffer.drain()
+
+    def close(self) -> bytes:
+        self.zip.close()
+        return self.buffer.drain()
+
+class TarStreamWriter:
+    """Encode a POSIX (pax) tar archive incrementally, one chunk at a time.
+
+    Tar headers carry the file size, so ``begin_file`` needs it up front.
+    Data past that size is cut off and a file that turns out shorter is
+    padded with zeros, keeping the archive readable either way.
+    """
+    media_type = 'application/x-tar'
+    extension = 'tar'
+    needs_size = True
+
+    def __init__(self):
+        self.remaining = 0
+        self.offset = 0
+
+    def _header(self, info: tarfile.TarInfo) -> bytes:
+        header = info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+        self.offset += len(header)
+        return header
+
+    def add_directory(self, name: str, mtime: float) -> bytes:
+        info = tarfile.TarInfo(name.rstrip('/') + '/')
+        info.type = tarfile.DIRTYPE
+        info.mode = 0o755
+        info.mtime = int(mtime)
+        return self._header(info)
+
+    def begin_file(self, name: str, size: int, mtime: float) -> bytes:
+        info = tarfile.TarInfo(name)
+        info.size = self.remaining = size
+        info.mode = 0o644
+        info.mtime = int(mtime)
+        return self._header(info)
+
+    def write(self, data: bytes) -> bytes:
+        data = data[:self.remaining]
+        self.remaining -= len(data)
+        self.offset += len(data)
+        return data
+
+    def end_file(self) -> bytes:
+        if self.remaining:
+            logger.warning(f"File ended {self.remaining} bytes short of its listed size; padding the tar entry")
+        padding = self.remaining + (-(self.offset + self.remaining) % tarfile.BLOCKSIZE)
+        self.offset += padding
+        self.remaining = 0
+        return bytes(padding)
+
+    def close(self) -> bytes:
+        # Two empty blocks, then pad to a full record like tarfile does
+        end = 2 * tarfile.BLOCKSIZE
+        end += -(self.offset + end) % tarfile.RECORDSIZE
+        return bytes(end)
+
+ARCHIVE_WRITERS = {
+    'zip': ZipStreamWriter,
+    'tar': TarStreamWriter,
+}
+
+# Streaming archive readers, run on a worker thread
+class _PipeReader(io.RawIOBase):
+    """Blocking, forward-only file object over a ChunkPipe filled by the event loop."""
+    def __init__(self, pipe: ChunkPipe):
+        self.pipe = pipe
+        self.buffer = bytearray()
+        self.eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def peek(self, size: int) -> bytes:
+        while not self.eof and len(self.buffer) < size:
+            chunk = self.pipe.get_threadsafe()
+            if chunk is None:
+                self.eof = True
+            else:
+                self.buffer += chunk
+        return bytes(self.buffer[:size])
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            self.peek(float('inf'))
+            size = len(self.buffer)
+        elif not self.buffer:
+            self.peek(1)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def read_exact(self, size: int) -> bytes:
+        data = self.peek(size)
+        if len(data) < size:
+            raise ValueError("archive stream ended unexpectedly")
+        del self.buffer[:size]
+        return data
+
+    def unread(self, data: bytes):
+        self.buffer[:0] = data
+
+_ZIP_LOCAL_HEADER = b'PK\x03\x04'
+_ZIP_DATA_DESCRIPTOR = b'PK\x07\x08'
+
+def _zip_members(stream: _PipeReader):
+    """Yield ``(name, kind, size, chunks)`` for ZIP members read front to back.
+
+    Only local file headers are used, so the central directory at the end
+    of the archive is never needed. Members whose sizes follow the data in a
+    descriptor are delimited by the end of their deflate stream or, when
+    stored, by a descriptor whose recorded size matches the bytes read.
+    """
+    while True:
+        signature = stream.peek(4)
+        if signature != _ZIP_LOCAL_HEADER:
+            if not signature or signature[:2] == b'PK':
+                return  # end of archive or start of the central directory
+            raise ValueError("not a ZIP archive")
+        stream.read_exact(4)
+        _, flags, method, _, _, crc, compressed_size, size, name_length, extra_length = struct.unpack(
+            '<HHHHHIIIHH', stream.read_exact(26))
+        name = stream.read_exact(name_length).decode('utf-8' if flags & 0x800 else 'cp437')
+        extra = stream.read_exact(extra_length)
+        zip64 = False
+        position = 0
+        while position + 4 <= len(extra):
+            tag, length = struct.unpack('<HH', extra[position:position + 4])
+            if tag == 0x0001:
+                zip64 = True
+                values = extra[position + 4:position + 4 + length]
+                if size == 0xFFFFFFFF and len(values) >= 8:
+                    size, values = struct.unpack('<Q', values[:8])[0], values[8:]
+                if compressed_size == 0xFFFFFFFF and len(values) >= 8:
+                    compressed_size = struct.unpack('<Q', values[:8])[0]
+            position += 4 + length
+        if flags & 0x1:
+            raise ValueError(f"{name}: encrypted ZIP members are not supported")
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise ValueError(f"{name}: unsupported ZIP compression method {method}")
+
+        descriptor = bool(flags & 0x8)
+        chunks = _zip_member_chunks(stream, name, method, compressed_size, crc, descriptor, zip64)
+        kind = 'directory' if name.endswith('/') else 'file'
+        yield name, kind, None if descriptor else size, chunks
+        for _ in chunks:
+            pass  # skip whatever the consumer left unread
+
+def _zip_member_chunks(stream: _PipeReader, name: str, method: int, compressed_size: int, crc: int,
+                       descriptor: bool, zip64: bool):
+    decompressor = zlib.decompressobj(-15) if method == zipfile.ZIP_DEFLATED else None
+    size_format, size_length = ('<QQ', 16) if zip64 else ('<II', 8)
+    actual_crc = 0
+
+    if not descriptor:
+        remaining = compressed_size
+        while remaining:
+            data = stream.read_exact(min(remaining, TRANSFER_CHUNK_SIZE))
+            remaining -= len(data)
+            if decompressor is not None:
+                data = decompressor.decompress(data)
+            actual_crc = zlib.crc32(data, actual_crc)
+            if data:
+                yield data
+        if decompressor is not None:
+            data = decompressor.flush()
+            actual_crc = zlib.crc32(data, actual_crc)
+            if data:
+                yield data
+    elif decompressor is not None:
+        while not decompressor.eof:
+            data = stream.read(TRANSFER_CHUNK_SIZE)
+            if not data:
+                raise ValueError(f"{name}: archive stream ended unexpectedly")
+            data = decompressor.decompress(data)
+            actual_crc = zlib.crc32(data, actual_crc)
+            if data:
+                yield data
+        stream.unread(decompressor.unused_data)
+        if stream.peek(4) == _ZIP_DATA_DESCRIPTOR:
+            stream.read_exact(4)
+        crc = struct.unpack('<I', stream.read_exact(4))[0]
+        stream.read_exact(size_length)
+    else:
+        # Stored with a trailing descriptor: find the descriptor that records the length read so far
+        pending = bytearray()
+        count = 0
+        lookahead = 4 + 4 + size_length
+        while True:
+            index = pending.find(_ZIP_DATA_DESCRIPTOR)
+            while index != -1 and len(pending) - index >= lookahead:
+                recorded = struct.unpack(size_format, pending[index + 8:index + lookahead])[0]
+                if recorded == count + index:
+                    data = bytes(pending[:index])
+                    crc = struct.unpack('<I', pending[index + 4:index + 8])[0]
+                    actual_crc = zlib.crc32(data, actual_crc)
+                    stream.unread(pending[index + lookahead:])
+                    if data:
+                        yield data
+                    if actual_crc != crc:
+                        raise ValueError(f"{name}: CRC mismatch")
+                    return
+                index = pending.find(_ZIP_DATA_DESCRIPTOR, index + 1)
+            if index == -1 and len(pending) > lookahead:
+                # Everything but a possible partial descriptor at the end is member data
+                data = bytes(pending[:-lookahead])
+                del pending[:-lookahead]
+                count += len(data)
+                actual_crc = zlib.crc32(data, actual_crc)
+                yield data
+            chunk = stream.read(TRANSFER_CHUNK_SIZE)
+            if not chunk:
+                raise ValueError(f"{name}: archive stream ended unexpectedly")
+            pending += chunk
+
+    if actual_crc != crc:
+        raise ValueError(f"{name}: CRC mismatch")
+
+def _tar_members(stream: _PipeReader):
+    """Yield ``(name, kind, size, chunks)`` for the members of a (possibly compressed) tar stream."""
+    with tarfile.open(fileobj=stream, mode='r|*') as archive:
+        for member in archive:
+            if member.isdir():
+                yield member.name, 'directory', None, iter(())
+            elif member.isfile():
+                source = archive.extractfile(member)
+                yield member.name, 'file', member.size, iter(lambda: source.read(TRANSFER_CHUNK_SIZE), b'')
+            elif member.issym() or member.islnk():
+                # Some writers put the target's size in a hard link header, but no data follows it
+                yield member.name, 'link', 0, iter(())
+            else:
+                yield member.name, 'other', None, iter(())
+
+def _read_archive(stream: _PipeReader, archive_format: str, events: ChunkPipe, buffer_limit: int):
+    """Worker-thread half of an extraction: hand each archive member to the event loop.
+
+    Small files are read whole so the loop can store several at once;
+    larger ones are streamed through a pipe of their own, which the thread
+    fills before moving on to the next member.
+    """
+    pipe = None
+    try:
+        if archive_format == 'auto':
+            archive_format = 'zip' if stream.peek(4) == _ZIP_LOCAL_HEADER else 'tar'
+        members = _zip_members(stream) if archive_format == 'zip' else _tar_members(stream)
+        for name, kind, size, chunks in members:
+            item = {'name': name, 'type': kind, 'size': size}
+            if kind == 'file' and size is not None and size <= buffer_limit:
+                item['data'] = b''.join(chunks)
+            elif kind == 'file':
+                pipe = item['pipe'] = ChunkPipe(events.loop, DOWNLOAD_QUEUE_CHUNKS)
+            if not events.put_threadsafe(item):
+                return
+            if pipe is not None:
+                for chunk in chunks:
+                    if not pipe.put_threadsafe(chunk):
+                        break
+                else:
+                    pipe.finish_threadsafe()
+                pipe = None
+        events.finish_threadsafe()
+    except Exception as e:
+        if pipe is not None:
+            pipe.finish_threadsafe(e)
+        events.finish_threadsafe(e)
+
+# FTP Client Manager
+class FTPClientManager:
+    """Open FTP sessions, keyed by session id.
+
+    Sessions are kept in least recently used order. Past ``FTP_MAX_SESSIONS``
+    overall or ``FTP_MAX_SESSIONS_PER_HOST`` for one host, the least recently
+    used idle sessions are closed; a background reaper closes sessions left
+    idle for ``FTP_SESSION_IDLE_TIMEOUT`` seconds. Sessions with a command or
+    transfer in flight are never evicted. Background sessions, opened for
+    transfer jobs, neither count against the caps nor get evicted; the job
+    queue's worker limits bound them instead.
+    """
+    def __init__(self, idle_timeout: float, max_sessions: int, max_sessions_per_host: int):
+        self.connections = OrderedDict()  # least recently used first
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.max_sessions_per_host = max_sessions_per_host
+        self.uploads = {}  # upload id -> resumable upload state
+        self.extractions = {}  # extract id -> progress of a running archive extraction
+        self.evicted = 0
+        self.reaped = 0
+        self._reaper = None
+    
+    def _session(self, session_id: str):
+        """Look up a session and mark it as just used."""
+        connection = self.connections.get(session_id)
+        if connection is not None:
+            self.connections.move_to_end(session_id)
+            connection['last_used'] = time.monotonic()
+        return connection
+    
+    def _enforce_limits(self, session_id: str, host: str):
+        """Evict least recently used idle sessions until the new one fits under the caps."""
+        sessions = [(other_id, c) for other_id, c in self.connections.items() if not c['background']]
+        count = len(sessions)
+        host_count = sum(1 for _, c in sessions if c['host'] == host)
+        for other_id, connection in sessions:
+            if count <= self.max_sessions and host_count <= self.max_sessions_per_host:
+                return True
+            if other_id == session_id or connection['pool'].busy:
+                continue
+            if count > self.max_sessions or connection['host'] == host:
+                if connection['host'] == host:
+                    host_count -= 1
+                count -= 1
+                logger.info(f"Evicting least recently used FTP session {other_id} ({connection['host']})")
+                self.evicted += 1
+                spawn(self.connections.pop(other_id)['pool'].close())
+        return count <= self.max_sessions and host_count <= self.max_sessions_per_host
+    
+    async def reap_idle(self):
+        """Close sessions idle for longer than the timeout and expire idle pooled connections."""
+        now = time.monotonic()
+        for session_id, connection in list(self.connections.items()):
+            pool = connection['pool']
+            if pool.busy:
+                connection['last_used'] = now
+            elif now - connection['last_used'] > self.idle_timeout and self.connections.get(session_id) is connection:
+                logger.info(f"Closing FTP session {session_id} after {int(now - connection['last_used'])}s idle")
+                self.reaped += 1
+                del self.connections[session_id]
+                await pool.close()
+            else:
+                pool.reap_idle()
+        connection_pool.reap_idle()
+        
+        for upload_id, upload in list(self.uploads.items()):
+            if not upload['lock'].locked() and now - upload['last_used'] > FTP_UPLOAD_EXPIRY:
+                logger.info(f"Forgetting resumable upload {upload_id} of '{upload['filename']}'")
+                del self.uploads[upload_id]
+    
+    async def _run_reaper(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reap_idle()
+            except Exception as e:
+                logger.warning(f"FTP session reaper failed: {str(e)}")
+    
+    def start_reaper(self, interval: float):
+        if self._reaper is None:
+            self._reaper = spawn(self._run_reaper(interval))
+    
+    def stop_reaper(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+    
+    async def connect(self, session_id: str, host: str, port: int, username: str, password: str,
+                      engine: str = None, pool_size: int = None, background: bool = False) -> tuple:
+        started = time.perf_counter()
+        success, message = await self._open_session(session_id, host, port, username, password, engine, pool_size,
+                                                     background)
+        metrics.observe('connect', host, time.perf_counter() - started, success)
+        return success, message
+    
+    async def _open_session(self, session_id: str, host: str, port: int, username: str, password: str,
+                            engine: str, pool_size: int, background: bool) -> tuple:
+        try:
+            engine = engine or FTP_ENGINE
+            if engine not in FTP_ENGINES:
+                return False, f"Connection failed: unknown FTP engine '{engine}'"
+            
+            ftp = await connection_pool.acquire(engine, host, port, username, password)
+            current_path = ftp.home_directory
+            features = ftp.features
+            pool_size = min(max(pool_size or FTP_POOL_SIZE, 1), FTP_POOL_MAX_SIZE)
+            
+            self.connections[session_id] = {
+                'ftp': ftp,
+                'pool': SessionPool(ftp, password, pool_size),
+                'current_path': current_path,
+                'host': host,
+                'port': port,
+                'username': username,
+                'server_key': (host, port, username),
+                'features': features,
+                'background': background,
+                'last_used': time.monotonic()
+            }
+            
+            if not background and not self._enforce_limits(session_id, host):
+                # Every other session is busy: refuse rather than exceed the caps
+                await self.disconnect(session_id)
+                return False, f"Connection failed: too many active sessions for {host}"
+            
+            return True, f"Successfully connected to {host}"
+        except Exception as e:
+            return False, f"Connection failed: {str(e)}"
+    
+    async def disconnect(self, session_id: str) -> tuple:
+        try:
+            if session_id in self.connections:
+                await self.connections.pop(session_id)['pool'].close()
+                return True, "Disconnected successfully"
+            else:
+                return False, "No active connection found"
+        except Exception as e:
+            return True, f"Disconnected (with error): {str(e)}"
+    
+    @instrumented('list')
+    async def list_files(self, session_id: str, path: str = None, refresh: bool = False) -> tuple:
+        """List a directory, answering from the listing cache when possible.
+
+        Returns ``(success, message, files, current_path, cache_age)`` where
+        ``cache_age`` is None for a listing fetched from the server.
+        """
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection", [], "/", None
+            
+            if not refresh:
+                target = remote_path(connection['current_path'], path) if path else connection['current_path']
+                cached = listing_cache.get(connection['server_key'], target)
+                if cached is not None:
+                    connection['current_path'] = target
+                    return True, "Files listed successfully", cached[0], target, cached[1]
+            
+            async with connection['pool'].metadata(connection['current_path']) as ftp:
+                if path:
+                    try:
+                        await ftp.cwd(path)
+                        ftp.working_directory = connection['current_path'] = await ftp.pwd()
+                    except:
+                        pass  # If path change fails, stay in current directory
+                
+                current_path = await ftp.pwd()
+                ftp.working_directory = connection['current_path'] = current_path
+                files = await self._read_listing(connection, ftp)
+            
+            listing_cache.put(connection['server_key'], current_path, files)
+            return True, "Files listed successfully", files, current_path, None
+        except Exception as e:
+            return False, f"Failed to list files: {str(e)}", [], "/", None
+    
+    async def _read_listing(self, connection: dict, ftp: FTPConnectionBase) -> list:
+        """Fetch and parse the listing of the connection's working directory."""
+        # MLSD gives exact sizes, types and UTC timestamps; MLST in FEAT implies it
+        if 'MLST' in connection['features']:
+            try:
+                return parse_mlsd_lines(await ftp.lines('MLSD'))
+            except ftplib.error_perm:
+                connection['features'].discard('MLST')
+        return parse_list_lines(await ftp.lines('LIST'))
+    
+    async def _list_directory(self, connection: dict, path: str, use_member: bool = False) -> list:
+        """Listing of an absolute ``path``, from the cache when fresh, without changing the session's directory.
+
+        With ``use_member`` the listing is fetched over a transfer connection
+        of the session's pool rather than the primary one.
+        """
+        cached = listing_cache.get(connection['server_key'], path)
+        if cached is not None:
+            return cached[0]
+        
+        pool = connection['pool']
+        async with (pool.checkout(path) if use_member else pool.metadata(path)) as ftp:
+            files = await self._read_listing(connection, ftp)
+        listing_cache.put(connection['server_key'], path, files)
+        return files
+    
+    async def _crawl(self, connection: dict, root: str, visit, max_depth: int = None, parallel: int = 1,
+                     on_listing=None) -> dict:
+        """Walk the tree below ``root`` breadth first with ``parallel`` workers.
+
+        ``visit(path, file_info, depth)`` is awaited for every entry, with
+        ``depth`` 1 for the contents of ``root``; it returns False to stop the
+        crawl. ``on_listing(directory, files)``, when given, is awaited with
+        every listing before its entries are visited. Directories deeper
+        than ``max_depth`` are not listed. Listings go through the listing
+        cache, so a crawl reuses what browsing fetched and leaves its own
+        listings for later requests. Worker 0 lists on the primary
+        connection, the others on pool members. Subdirectories that cannot
+        be listed, for whatever reason, are counted and skipped; a failure to
+        list ``root`` and the first error raised by ``visit`` or
+        ``on_listing`` stop the crawl and are raised.
+        """
+        state = {'directories': 1, 'skipped': 0, 'stopped': False, 'error': None}
+        queue = asyncio.Queue()
+        
+        async def expand(directory: str, files: list, depth: int):
+            for info in files:
+                if state['stopped']:
+                    return
+                path = remote_path(directory, info.name)
+                if not await visit(path, info, depth):
+                    state['stopped'] = True
+                    return
+                if info.type == 'directory' and (max_depth is None or depth < max_depth):
+                    queue.put_nowait((path, depth + 1))
+        
+        async def worker(number: int):
+            while True:
+                directory, depth = await queue.get()
+                try:
+                    if state['stopped']:
+                        continue
+                    try:
+                        files = await self._list_directory(connection, directory, use_member=number > 0)
+                    except Exception as e:
+                        logger.warning(f"Skipping unreadable directory {directory}: {str(e)}")
+                        state['skipped'] += 1
+                        continue
+                    state['directories'] += 1
+                    try:
+                        if on_listing is not None:
+                            await on_listing(directory, files)
+                        await expand(directory, files, depth)
+                    except Exception as e:
+                        # The remaining queue is drained without listing, so join() still returns
+                        state['error'] = state['error'] or e
+                        state['stopped'] = True
+                finally:
+                    queue.task_done()
+        
+        files = await self._list_directory(connection, root)
+        if on_listing is not None:
+            await on_listing(root, files)
+        await expand(root, files, 1)
+        # Workers only ever wait on the queue once it is drained, so cancelling them then is safe
+        workers = [spawn(worker(number)) for number in range(max(parallel, 1))]
+        drained = spawn(queue.join())
+        try:
+            # A worker only returns by failing; that must end the crawl rather than stall join()
+            await asyncio.wait([drained, *workers], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (drained, *workers):
+                task.cancel()
+            results = await asyncio.gather(*workers, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        if state['error'] is not None:
+            raise state['error']
+        return state
+    
+    async def find_files(self, session_id: str, path: str, matches, emit, max_depth: int = None,
+                         limit: int = None, parallel: int = 1) -> tuple:
+        """Search the tree below ``path`` for entries accepted by ``matches``.
+
+        ``emit(path, file_info, depth)`` is awaited for each match as the
+        crawl runs and returns False to stop it. Returns ``(success, message)``.
+        """
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection"
+            
+            root = remote_path(connection['current_path'], path) if path else connection['current_path']
+            found = 0
+            
+            async def visit(entry_path: str, info: FTPFileInfo, depth: int) -> bool:
+                nonlocal found
+                if matches(info):
+                    found += 1
+                    if not await emit(entry_path, info, depth):
+                        return False
+                return limit is None or found < limit
+            
+            state = await self._crawl(connection, root, visit, max_depth, parallel)
+            message = f"Found {found} matches in {state['directories']} directories"
+            if state['skipped']:
+                message += f", {state['skipped']} unreadable"
+            return True, message
+        except Exception as e:
+            return False, f"Failed to search: {str(e)}"
+    
+    async def index_tree(self, session_id: str, path: str = None, max_depth: int = None, parallel: int = 1) -> tuple:
+        """Mirror the metadata of the tree below ``path`` into the MongoDB index.
+
+        The tree is crawled like a search, through the listing cache, and
+        every listing is written as it arrives. Directories whose listing is
+        unchanged since the last run only have their timestamps refreshed.
+        Entries that vanished are removed, with everything indexed below
+        them. A failed write stops the crawl and fails the run, as the
+        index would otherwise be left partly updated without notice.
+        Returns ``(success, message, summary)``.
+        """
+        try:
+            if metadata_index is None:
+                return False, "Metadata index is disabled", None
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection", None
+            
+            server = MetadataIndex.server_name(connection['server_key'])
+            root = remote_path(connection['current_path'], path) if path else connection['current_path']
+            summary = {'changed': 0, 'unchanged': 0, 'entries': 0, 'removed': 0}
+            
+            async def visit(entry_path: str, info: FTPFileInfo, depth: int) -> bool:
+                return True
+            
+            async def on_listing(directory: str, files: list):
+                await metadata_index.update_directory(server, directory, files, summary)
+            
+            state = await self._crawl(connection, root, visit, max_depth, parallel, on_listing)
+            summary['directories'] = state['directories']
+            summary['skipped'] = state['skipped']
+            message = (f"Indexed {state['directories']} directories below {root}: "
+                       f"{summary['changed']} changed, {summary['unchanged']} unchanged")
+            return True, message, summary
+        except Exception as e:
+            return False, f"Failed to index: {str(e)}", None
+    
+    async def indexed_listing(self, session_id: str, path: str = None) -> tuple:
+        """Listing of ``path`` from the index, as ``(success, message, documents, path, indexed_at)``."""
+        try:
+            if metadata_index is None:
+                return False, "Metadata index is disabled", [], "/", None
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection", [], "/", None
+            
+            target = remote_path(connection['current_path'], path) if path else connection['current_path']
+            server = MetadataIndex.server_name(connection['server_key'])
+            documents, indexed_at = await metadata_index.listing(server, target)
+            message = "Listed from index" if indexed_at is not None else f"{target} is not indexed"
+            return True, message, documents, target, indexed_at
+        except Exception as e:
+            return False, f"Failed to list from index: {str(e)}", [], "/", None
+    
+    async def search_index(self, session_id: str, path: str, query: dict, limit: int) -> tuple:
+        """Entries below ``path`` matching ``query``, as ``(success, message, documents)``."""
+        try:
+            if metadata_index is None:
+                return False, "Metadata index is disabled", []
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection", []
+            
+            root = remote_path(connection['current_path'], path) if path else connection['current_path']
+            server = MetadataIndex.server_name(connection['server_key'])
+            documents = await metadata_index.search(server, root, query, limit)
+            return True, f"Found {len(documents)} indexed entries", documents
+        except ExecutionTimeout:
+            return False, f"Search took longer than {FTP_INDEX_SEARCH_TIMEOUT:g}s; use a narrower pattern or path", []
+        except Exception as e:
+            return False, f"Failed to search index: {str(e)}", []
+    
+    async def drop_index(self, session_id: str) -> tuple:
+        try:
+            if metadata_index is None:
+                return False, "Metadata index is disabled"
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection"
+            
+            removed = await metadata_index.drop(MetadataIndex.server_name(connection['server_key']))
+            return True, f"Removed {removed} indexed entries"
+        except Exception as e:
+            return False, f"Failed to drop index: {str(e)}"
+    
+    async def _walk(self, connection: dict, root: str):
+        """Yield ``(relative_path, file_info)`` for everything below ``root``, depth first.
+
+        Directories are yielded before their contents. Subdirectories that
+        cannot be listed are skipped with a warning; only a failure to list
+        ``root`` itself is raised.
+        """
+        stack = [('', await self._list_directory(connection, root))]
+        while stack:
+            prefix, files = stack.pop()
+            subdirectories = []
+            for info in files:
+                relative = f"{prefix}{info.name}"
+                yield relative, info
+                if info.type == 'directory':
+                    subdirectories.append(relative)
+            for relative in reversed(subdirectories):
+                try:
+                    files = await self._list_directory(connection, remote_path(root, relative))
+                except ftplib.error_perm as e:
+                    logger.warning(f"Skipping unreadable directory {remote_path(root, relative)}: {str(e)}")
+                    continue
+                stack.append((relative + '/', files))
+    
+    async def _server_checksum(self, connection: dict, ftp: FTPConnectionBase, filename: str, algorithm: str):
+        """Digest of ``filename`` computed by the server, or None when it offers no command for ``algorithm``.
+
+        HASH (draft-bryan-ftpext-hash) is preferred, then the legacy X
+        commands; both are only tried when advertised in FEAT and are
+        forgotten for the session once the server rejects them.
+        """
+        hash_name, command, _ = SERVER_CHECKSUM_COMMANDS[algorithm]
+        features = connection['features']
+        if 'HASH' in features:
+            try:
+                await ftp.sendcmd(f'OPTS HASH {hash_name}')
+            except ftplib.error_perm as e:
+                # 501 means only this algorithm is not offered
+                if str(e)[:3] in {'500', '502'}:
+                    features.discard('HASH')
+            else:
+                try:
+                    return parse_checksum_reply(await ftp.sendcmd(f'HASH {filename}'), algorithm)
+                except ftplib.error_perm as e:
+                    if str(e)[:3] in {'500', '502'}:
+                        features.discard('HASH')
+                    else:
+                        raise
+        if command in features:
+            try:
+                return parse_checksum_reply(await ftp.sendcmd(f'{command} {filename}'), algorithm)
+            except ftplib.error_perm as e:
+                if str(e)[:3] in {'500', '502'}:
+                    features.discard(command)
+                else:
+                    raise
+        return None
+    
+    async def file_checksum(self, session_id: str, filename: str, algorithm: str,
+                            allow_download: bool = True) -> tuple:
+        """Checksum of a file, computed by the server when it can and by streaming it otherwise.
+
+        Returns ``(success, message, checksum, source, bytes)`` where
+        ``source`` is 'server' or 'download'. Without ``allow_download`` the
+        checksum is None when the server cannot compute it. Downloaded bytes
+        only pass through the digest and are never stored.
+        """
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection", None, None, None
+            
+            async with connection['pool'].metadata(connection['current_path']) as ftp:
+                checksum = await self._server_checksum(connection, ftp, filename, algorithm)
+            if checksum is not None:
+                return True, "Checksum computed by the server", checksum, 'server', None
+            if not allow_download:
+                return True, "The server cannot compute this checksum", None, None, None
+            
+            digest = CHECKSUM_ALGORITHMS[algorithm]()
+            size = 0
+            async with connection['pool'].checkout(connection['current_path']) as ftp:
+                async with aclosing(ftp.retrieve(f'RETR {filename}')) as chunks:
+                    async for chunk in chunks:
+                        digest.update(chunk)
+                        size += len(chunk)
+            
+            return True, "Checksum computed from a download", digest.hexdigest(), 'download', size
+        except Exception as e:
+            return False, f"Failed to compute checksum: {str(e)}", None, None, None
+    
+    async def file_size(self, session_id: str, filename: str) -> tuple:
+        """Ask the server for a file's size; the size is None when SIZE is unsupported."""
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection", None
+            
+            async with connection['pool'].metadata(connection['current_path']) as ftp:
+                size = await ftp.size(filename)
+            
+            return True, "File size retrieved successfully", size
+        except ftplib.error_perm as e:
+            if str(e)[:3] in {'500', '502'}:
+                return True, "SIZE is not supported", None
+            return False, f"Failed to get file size: {str(e)}", None
+        except Exception as e:
+            return False, f"Failed to get file size: {str(e)}", None
+    
+    @instrumented('download')
+    async def download_file(self, session_id: str, filename: str, write_chunk,
+                            offset: int = 0, length: int = None,
+                            connections: int = 1, segment_size: int = None,
+                            digest=None, expected_checksum: str = None) -> tuple:
+        """Stream RETR output to ``write_chunk`` as it arrives.
+
+        ``write_chunk`` is awaited for every chunk, so a slow consumer
+        throttles the transfer; it returns False to abort the transfer, e.g.
+        when the HTTP client has disconnected. A non-zero ``offset`` is sent
+        as REST, and the data connection is closed once ``length`` bytes have
+        been delivered. With ``connections`` above one and a known ``length``
+        longer than one segment, the range is fetched in segments in parallel.
+        Chunks reach ``write_chunk`` in file order either way, so a ``digest``
+        is updated inline as they are delivered. When ``expected_checksum``
+        is given, the last chunk is held back until the digest has been
+        compared, so a mismatching download fails before it is complete.
+        Progress is reported to the session's progress subscribers.
+        """
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection"
+            
+            total = length
+            if total is None and progress_hub.watching(session_id):
+                total = self._cached_size(connection, filename)
+            progress = progress_hub.track(session_id, 'download', filename, total)
+            deliver = write_chunk
+            held = []  # chunk not yet delivered while the checksum is pending
+            
+            async def write_chunk(chunk: bytes) -> bool:
+                if digest is not None:
+                    digest.update(chunk)
+                progress.advance(len(chunk))
+                if expected_checksum is None:
+                    return await deliver(chunk)
+                held.append(chunk)
+                return len(held) == 1 or await deliver(held.pop(0))
+            
+            success = False
+            try:
+                segment_size = segment_size or FTP_SEGMENT_SIZE
+                if connections > 1 and length is not None and length > segment_size:
+                    success, message = await self._download_segments(connection, filename, write_chunk, offset,
+                                                                     length, connections, segment_size)
+                else:
+                    success, message = await self._download_stream(connection, filename, write_chunk, offset,
+                                                                   length)
+                if success and expected_checksum is not None and digest.hexdigest() != expected_checksum:
+                    success, message = False, (f"Checksum mismatch for '{filename}': server reports "
+                                               f"{expected_checksum}, received {digest.hexdigest()}")
+                elif success and held and not await deliver(held.pop()):
+                    success, message = False, "Download cancelled"
+            finally:
+                progress.finish(success)
+            return success, message
+        except Exception as e:
+            return False, f"Failed to download file: {str(e)}"
+    
+    def _cached_size(self, connection: dict, name: str):
+        """Size of a file from the cached listing of its directory, or None."""
+        path = remote_path(connection['current_path'], name)
+        cached = listing_cache.get(connection['server_key'], posixpath.dirname(path))
+        if cached is not None:
+            basename = posixpath.basename(path)
+            for info in cached[0]:
+                if info.name == basename and info.type == 'file':
+                    return info.size
+        return None
+    
+    async def _download_stream(self, connection: dict, filename: str, write_chunk, offset: int,
+                               length: int) -> tuple:
+        """Fetch ``length`` bytes from ``offset``, or the rest of the file, over one connection."""
+        remaining = length
+        async with connection['pool'].checkout(connection['current_path']) as ftp:
+            async with aclosing(ftp.retrieve(f'RETR {filename}', offset or None)) as chunks:
+                async for chunk in chunks:
+                    if remaining is not None:
+                        chunk = chunk[:remaining]
+                        remaining -= len(chunk)
+                    if not await write_chunk(chunk):
+                        return False, "Download cancelled"
+                    if remaining == 0:
+                        break
+        return True, "File downloaded successfully"
+    
+    async def _download_segments(self, connection: dict, filename: str, write_chunk, offset: int,
+                                 length: int, connections: int, segment_size: int) -> tuple:
+        """Fetch ``length`` bytes from ``offset`` as segments over parallel connections.
+
+        Each worker holds one connection and takes the next segment with a
+        REST offset. Segments are handed to ``write_chunk`` strictly in order;
+        the head segment streams as it arrives while later ones are buffered.
+        Each segment's pipe holds at most ``DOWNLOAD_QUEUE_CHUNKS`` chunks, so
+        a worker ahead of the consumer waits on its full pipe rather than
+        buffering its whole segment; segments are taken in order, so the
+        head segment is always being fetched and the download cannot stall.
+        At most ``connections`` segments are in flight at once. The first
+        worker uses the session's own transfer connection, the others borrow
+        from the shared pool and are skipped if the server refuses them.
+        """
+        loop = asyncio.get_event_loop()
+        segments = [(start, min(segment_size, offset + length - start))
+                    for start in range(offset, offset + length, segment_size)]
+        pipes = [ChunkPipe(loop, DOWNLOAD_QUEUE_CHUNKS) for _ in segments]
+        window = asyncio.Semaphore(connections)
+        pool = connection['pool']
+        directory = connection['current_path']
+        state = {'next': 0, 'workers': min(connections, len(segments))}
+        
+        async def fetch(ftp):
+            while True:
+                await window.acquire()
+                index = state['next']
+                if index >= len(segments):
+                    window.release()
+                    return
+                state['next'] += 1
+                pipe = pipes[index]
+                start, remaining = segments[index]
+                try:
+                    async with aclosing(ftp.retrieve(f'RETR {filename}', start or None)) as chunks:
+                        async for chunk in chunks:
+                            chunk = chunk[:remaining]
+                            remaining -= len(chunk)
+                            if not await pipe.put(chunk):
+                                return
+                            if remaining == 0:
+                                break
+                    if remaining:
+                        raise FTPTransferError(f"segment at offset {start} ended {remaining} bytes early")
+                except Exception as e:
+                    await pipe.finish(e)
+                    raise
+                await pipe.finish()
+        
+        async def worker(number: int):
+            try:
+                if number == 0:
+                    async with pool.checkout(directory) as ftp:
+                        await fetch(ftp)
+                else:
+                    async with pool.borrow(directory) as ftp:
+                        await fetch(ftp)
+            except Exception as e:
+                if number != 0:
+                    logger.warning(f"Segment connection to {connection['host']} failed: {str(e)}")
+                error = e
+            else:
+                error = None
+            finally:
+                state['workers'] -= 1
+            if state['workers'] == 0:
+                # Nobody is left to fetch the remaining segments; fail them
+                for pipe in pipes[state['next']:]:
+                    await pipe.finish(FTPTransferError(f"no connection left to fetch segments: {str(error)}"))
+        
+        tasks = [spawn(worker(number)) for number in range(state['workers'])]
+        try:
+            for pipe in pipes:
+                while True:
+                    chunk = await pipe.get()
+                    if chunk is None:
+                        break
+                    if not await write_chunk(chunk):
+                        return False, "Download cancelled"
+                window.release()
+        finally:
+            # Stop the workers: closed pipes end their transfers, idle ones find no segment left
+            state['next'] = len(segments)
+            for pipe in pipes:
+                pipe.close()
+            for _ in tasks:
+                window.release()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        return True, "File downloaded successfully"
+    
+    async def _fetch_into(self, connection: dict, path: str, item: dict, pipe: ChunkPipe):
+        """Download the file at absolute ``path`` into ``pipe``, setting ``item['size']`` first."""
+        try:
+            async with connection['pool'].checkout(posixpath.dirname(path)) as ftp:
+                name = posixpath.basename(path)
+                if item['size'] is None:
+                    try:
+                        item['size'] = await ftp.size(name)
+                    except ftplib.error_perm as e:
+                        # SIZE is optional; the size then stays unknown
+                        if str(e)[:3] not in {'500', '502'}:
+                            raise
+                async with aclosing(ftp.retrieve(f'RETR {name}')) as chunks:
+                    async for chunk in chunks:
+                        if not await pipe.put(chunk):
+                            return
+        except Exception as e:
+            await pipe.finish(e)
+            return
+        await pipe.finish()
+    
+    async def download_directory(self, session_id: str, path: str, archive_format: str, write_chunk,
+                                 prefetch: int = 0) -> tuple:
+        """Stream a directory tree to ``write_chunk`` as a ZIP or tar archive.
+
+        The tree is walked while the archive is written and every file's RETR
+        output goes straight into the archive encoder, so memory use does not
+        depend on file sizes. Up to ``prefetch`` following files are fetched
+        in parallel over the session's pool, each behind a bounded queue.
+        Files that cannot be read, and tar members whose size the server
+        does not report, are left out with a warning.
+        """
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection"
+            if archive_format not in ARCHIVE_WRITERS:
+                return False, f"Unknown archive format '{archive_format}'"
+            
+            root = remote_path(connection['current_path'], path) if path else connection['current_path']
+            writer = ARCHIVE_WRITERS[archive_format]()
+            loop = asyncio.get_event_loop()
+            entries = self._walk(connection, root)
+            pending = deque()  # walked entries, files with their download already started
+            started = 0  # files in pending
+            exhausted = False
+            
+            try:
+                while True:
+                    # Without transfer members, files would be fetched on the connection the
+                    # walk lists directories with; a stalled prefetch would then deadlock it
+                    ahead = prefetch if connection['pool'].max_size > 1 else 0
+                    while not exhausted and started <= ahead:
+                        try:
+                            relative, info = await entries.__anext__()
+                        except StopAsyncIteration:
+                            exhausted = True
+                            break
+                        item = {'name': relative, 'info': info, 'size': info.size}
+                        if info.type == 'file':
+                            item['pipe'] = ChunkPipe(loop, DOWNLOAD_QUEUE_CHUNKS)
+                            item['task'] = spawn(self._fetch_into(connection, remote_path(root, relative), item, item['pipe']))
+                            started += 1
+                        pending.append(item)
+                    if not pending:
+                        break
+                    
+                    item = pending.popleft()
+                    mtime = _entry_mtime(item['info'])
+                    if 'pipe' not in item:
+                        if not await write_chunk(writer.add_directory(item['name'], mtime)):
+                            return False, "Download cancelled"
+                        continue
+                    
+                    started -= 1
+                    pipe = item['pipe']
+                    try:
+                        try:
+                            chunk = await pipe.get()
+                        except ftplib.error_perm as e:
+                            logger.warning(f"Leaving {item['name']} out of the archive: {str(e)}")
+                            continue
+                        if item['size'] is None and writer.needs_size:
+                            logger.warning(f"Leaving {item['name']} out of the archive: "
+                                           f"the server did not report its size")
+                            continue
+                        if not await write_chunk(writer.begin_file(item['name'], item['size'], mtime)):
+                            return False, "Download cancelled"
+                        while chunk is not None:
+                            if not await write_chunk(writer.write(chunk)):
+                                return False, "Download cancelled"
+                            chunk = await pipe.get()
+                        if not await write_chunk(writer.end_file()):
+                            return False, "Download cancelled"
+                    finally:
+                        # A skipped file's transfer stops at its closed pipe; its connection is back before the next
+                        pipe.close()
+                        await asyncio.gather(item['task'], return_exceptions=True)
+                
+                await write_chunk(writer.close())
+            finally:
+                for item in pending:
+                    if 'pipe' in item:
+                        item['pipe'].close()
+                await asyncio.gather(*(item['task'] for item in pending if 'task' in item), return_exceptions=True)
+                await entries.aclose()
+            
+            return True, "Directory downloaded successfully"
+        except Exception as e:
+            return False, f"Failed to download directory: {str(e)}"
+    
+    async def extract_archive(self, session_id: str, path: str, archive_format: str, chunks,
+                              parallel: int = 1) -> tuple:
+        """Expand a tar or ZIP stream into the remote directory ``path`` as it arrives.
+
+        The archive is decoded on a worker thread while ``chunks`` is still
+        being received; directories are created with MKD and every file is
+        piped into STOR, so nothing is written to local disk. ``parallel``
+        workers store members over the session's pool. Members that fail, or
+        whose names would escape ``path``, are reported and skipped.
+        Returns ``(success, message, progress)``.
+        """
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection", None
+            if archive_format not in ('auto', 'zip', 'tar'):
+                return False, f"Unknown archive format '{archive_format}'", None
+            
+            pool = connection['pool']
+            base = connection['current_path']
+            root = remote_path(base, path) if path else base
+            loop = asyncio.get_event_loop()
+            body = ChunkPipe(loop, UPLOAD_QUEUE_CHUNKS)
+            events = ChunkPipe(loop, max(parallel, 1))
+            made = set()
+            progress = {
+                'extract_id': str(uuid.uuid4()),
+                'session_id': session_id,
+                'current_path': root,
+                'directories': 0,
+                'files': 0,
+                'bytes': 0,
+                'current': None,
+                'failures': []
+            }
+            
+            async def feed():
+                try:
+                    async for chunk in chunks:
+                        if not await body.put(chunk):
+                            return
+                except Exception as e:
+                    await body.finish(e)
+                    return
+                await body.finish()
+            
+            def target_of(name: str):
+                relative = posixpath.normpath(name.lstrip('/'))
+                if relative == '..' or relative.startswith('../'):
+                    return None
+                return root if relative == '.' else posixpath.join(root, relative)
+            
+            async def ensure_directory(ftp, directory: str):
+                todo = []
+                while directory not in made and directory != posixpath.dirname(root):
+                    todo.append(directory)
+                    directory = posixpath.dirname(directory)
+                for directory in reversed(todo):
+                    try:
+                        await ftp.mkd(directory)
+                    except ftplib.error_perm:
+                        pass  # Usually because it exists; a real failure shows up on STOR
+                    made.add(directory)
+            
+            async def member_data(item):
+                if 'data' in item:
+                    if item['data']:
+                        progress['bytes'] += len(item['data'])
+                        yield item['data']
+                    return
+                while True:
+                    chunk = await item['pipe'].get()
+                    if chunk is None:
+                        return
+                    progress['bytes'] += len(chunk)
+                    yield chunk
+            
+            async def worker():
+                while True:
+                    try:
+                        item = await events.get()
+                    except Exception as e:
+                        await events.finish(e)  # Stop the other workers too
+                        raise
+                    if item is None:
+                        await events.finish()
+                        return
+                    
+                    target = target_of(item['name'])
+                    if target is None or item['type'] in ('link', 'other'):
+                        if target is None:
+                            reason = "path leaves the target directory"
+                        elif item['type'] == 'link':
+                            reason = "links are not supported"
+                        else:
+                            reason = "unsupported member type"
+                        progress['failures'].append({'name': item['name'], 'message': f"Skipped: {reason}"})
+                        if 'pipe' in item:
+                            item['pipe'].close()
+                        continue
+                    
+                    progress['current'] = item['name']
+                    try:
+                        async with pool.checkout(base) as ftp:
+                            if item['type'] == 'directory':
+                                await ensure_directory(ftp, target)
+                                progress['directories'] += 1
+                            else:
+                                await ensure_directory(ftp, posixpath.dirname(target))
+                                await ftp.store(f'STOR {target}', member_data(item))
+                                progress['files'] += 1
+                    except Exception as e:
+                        progress['failures'].append({'name': item['name'], 'message': str(e)})
+                    finally:
+                        if 'pipe' in item:
+                            item['pipe'].close()
+            
+            self.extractions[progress['extract_id']] = progress
+            feeder = spawn(feed())
+            reader = loop.run_in_executor(executor, _read_archive, _PipeReader(body), archive_format,
+                                          events, FTP_EXTRACT_BUFFER_SIZE)
+            try:
+                await asyncio.gather(*(worker() for _ in range(max(parallel, 1))))
+            finally:
+                # Stop the reader at its next member, then release the request body
+                events.close()
+                await asyncio.gather(reader, return_exceptions=True)
+                body.close()
+                await asyncio.gather(feeder, return_exceptions=True)
+                del self.extractions[progress['extract_id']]
+                listing_cache.invalidate_tree(connection['server_key'], root)
+                listing_cache.invalidate(connection['server_key'], posixpath.dirname(root))
+            
+            progress['current'] = None
+            failed = len(progress['failures'])
+            message = f"Extracted {progress['files']} files and {progress['directories']} directories"
+            return True, message + (f", {failed} failed" if failed else ""), progress
+        except Exception as e:
+            return False, f"Failed to extract archive: {str(e)}", None
+
+    @instrumented('upload')
+    async def upload_file(self, session_id: str, filename: str, chunks, checksum: str = None,
+                          size: int = None) -> tuple:
+        """Send an async iterable of chunks over a STOR data connection.
+
+        Chunks are forwarded as they are produced, so only in-flight chunks
+        are ever held in memory. With a ``checksum`` algorithm they are
+        digested on the way and the result is compared with the server's
+        own checksum of the stored file when it can compute one. Progress is
+        reported to the session's progress subscribers, with an ETA when the
+        ``size`` is known. Returns ``(success, message, checksums)``;
+        ``checksums`` is None without a ``checksum`` and otherwise holds the
+        FTPUploadResponse checksum fields.
+        """
+        report = None
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection", report
+            
+            progress = progress_hub.track(session_id, 'upload', filename, size)
+            chunks = progress.count(chunks)
+            digest = None
+            if checksum is not None:
+                digest = CHECKSUM_ALGORITHMS[checksum]()
+                chunks = digest_chunks(chunks, digest)
+            success = False
+            try:
+                async with connection['pool'].checkout(connection['current_path']) as ftp:
+                    try:
+                        await ftp.store(f'STOR {filename}', chunks)
+                    except FTPTransferError as e:
+                        return False, f"Upload of '{filename}' aborted: {str(e)}", report
+                    finally:
+                        # Size and timestamp come from the server, so refetch the directory
+                        target = remote_path(connection['current_path'], filename)
+                        listing_cache.invalidate(connection['server_key'], posixpath.dirname(target))
+                    if digest is not None:
+                        server_checksum = await self._server_checksum(connection, ftp, filename, checksum)
+                        report = {
+                            'checksum_algorithm': checksum,
+                            'checksum': digest.hexdigest(),
+                            'server_checksum': server_checksum,
+                            'verified': None if server_checksum is None else server_checksum == digest.hexdigest()
+                        }
+                
+                if report is not None and report['verified'] is False:
+                    return False, (f"Checksum mismatch for '{filename}': sent {report['checksum']}, "
+                                   f"server reports {report['server_checksum']}"), report
+                success = True
+                return True, f"File '{filename}' uploaded successfully", report
+            finally:
+                progress.finish(success)
+        except Exception as e:
+            return False, f"Failed to upload file: {str(e)}", report
+    
+    @instrumented('copy')
+    async def copy_file(self, session_id: str, source: str, destination: str,
+                        destination_session_id: str = None) -> tuple:
+        """Copy a file server-side by piping RETR on one session into STOR on another.
+
+        The destination may be on the same session or on any other one. Data
+        passes through a bounded in-process queue, so the RETR side only
+        runs ahead of the STOR side by ``FTP_RELAY_QUEUE_CHUNKS`` chunks.
+        The destination connection is borrowed from the shared pool, so a
+        copy never holds the transfer connections of two sessions at once
+        and works on sessions limited to a single connection. A partial
+        destination file is deleted when the copy fails.
+        Returns ``(success, message, bytes, seconds)``.
+        """
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection", 0, 0.0
+            target_connection = self._session(destination_session_id) if destination_session_id else connection
+            if target_connection is None:
+                return False, "No active FTP connection for the destination", 0, 0.0
+            
+            source_path = remote_path(connection['current_path'], source)
+            target_path = remote_path(target_connection['current_path'], destination)
+            if target_connection['server_key'] == connection['server_key'] and target_path == source_path:
+                return False, "Source and destination are the same file", 0, 0.0
+            
+            loop = asyncio.get_event_loop()
+            pipe = ChunkPipe(loop, FTP_RELAY_QUEUE_CHUNKS)
+            state = {'bytes': 0}
+            total = self._cached_size(connection, source_path) if progress_hub.watching(session_id) else None
+            progress = progress_hub.track(session_id, 'copy', source, total)
+            
+            async def relay():
+                async for chunk in pipe_chunks(pipe):
+                    state['bytes'] += len(chunk)
+                    progress.advance(len(chunk))
+                    yield chunk
+            
+            success = False
+            started = time.monotonic()
+            try:
+                async with target_connection['pool'].borrow(posixpath.dirname(target_path)) as target:
+                    target_name = posixpath.basename(target_path)
+                    # A known size skips the SIZE probe in _fetch_into; bytes are counted as they pass instead
+                    pump = spawn(self._fetch_into(connection, source_path, {'size': 0}, pipe))
+                    try:
+                        await target.store(f'STOR {target_name}', relay())
+                    except FTPTransferError as e:
+                        try:
+                            await target.delete(target_name)
+                        except ftplib.Error:
+                            pass
+                        return (False, f"Copy of '{source}' aborted: {str(e)}", state['bytes'],
+                                time.monotonic() - started)
+                    finally:
+                        pipe.close()
+                        await asyncio.gather(pump, return_exceptions=True)
+                        listing_cache.invalidate(target_connection['server_key'], posixpath.dirname(target_path))
+                success = True
+            finally:
+                progress.finish(success)
+            
+            seconds = time.monotonic() - started
+            return True, f"Copied '{source}' to '{target_path}'", state['bytes'], seconds
+        except Exception as e:
+            return False, f"Failed to copy file: {str(e)}", 0, 0.0
+    
+    async def _scan_remote_tree(self, connection: dict, root: str, parallel: int) -> tuple:
+        """``(files, directories)`` below ``root``: relative path -> ``(size, mtime)`` and the set of directories.
+
+        The listing cache is bypassed so the comparison sees the server's
+        current state. A missing ``root`` counts as an empty tree, but a
+        subdirectory that cannot be listed fails the scan: taking it for an
+        empty one would make the plan delete or re-transfer its contents.
+        """
+        listing_cache.invalidate_tree(connection['server_key'], root)
+        files, directories = {}, set()
+        prefix = root.rstrip('/') + '/'
+        
+        async def visit(path: str, info: FTPFileInfo, depth: int) -> bool:
+            relative = path[len(prefix):]
+            if info.type == 'directory':
+                directories.add(relative)
+            elif info.type == 'file':
+                files[relative] = (info.size, _entry_timestamp(info))
+            return True
+        
+        try:
+            state = await self._crawl(connection, root, visit, parallel=parallel)
+        except ftplib.error_perm as e:
+            if str(e)[:3] != '550':
+                raise
+            return files, directories
+        if state['skipped']:
+            raise ValueError(f"{state['skipped']} remote directories could not be listed")
+        return files, directories
+    
+    async def _remote_times(self, connection: dict, root: str, paths: list) -> dict:
+        """MDTM times of ``paths`` relative to ``root``, for listings that carry none."""
+        times = {}
+        async with connection['pool'].metadata(root) as ftp:
+            for path in paths:
+                try:
+                    resp = await ftp.sendcmd(f'MDTM {posixpath.join(root, path)}')
+                    times[path] = calendar.timegm(time.strptime(resp[4:].strip()[:14], '%Y%m%d%H%M%S'))
+                except (ftplib.error_perm, ValueError):
+                    pass
+        return times
+    
+    async def _mirror_action(self, connection: dict, local_root: str, remote_root: str, action: str,
+                             path: str, remote: dict) -> int:
+        """Carry out one planned action; returns the bytes transferred."""
+        local_path = os.path.join(local_root, *path.split('/'))
+        remote_file = posixpath.join(remote_root, path)
+        directory, name = posixpath.split(remote_file)
+        loop = asyncio.get_event_loop()
+        if action == 'delete_local':
+            await loop.run_in_executor(executor, os.remove, local_path)
+            return 0
+        async with connection['pool'].checkout(directory) as ftp:
+            if action == 'delete_remote':
+                await ftp.delete(name)
+                return 0
+            if action == 'upload':
+                stat = await loop.run_in_executor(executor, os.stat, local_path)
+                size, mtime = stat.st_size, int(stat.st_mtime)
+                await ftp.store(f'STOR {name}', _read_local_file(local_path))
+                if 'MFMT' in connection['features']:
+                    # Keep the local timestamp so later comparisons see the files as equal
+                    try:
+                        await ftp.sendcmd(f"MFMT {time.strftime('%Y%m%d%H%M%S', time.gmtime(mtime))} {name}")
+                    except ftplib.error_perm:
+                        pass
+                return size
+            temporary = f"{local_path}.{MIRROR_STATE_PREFIX}part"
+            make_parent = functools.partial(os.makedirs, os.path.dirname(local_path), exist_ok=True)
+            await loop.run_in_executor(executor, make_parent)
+            size = 0
+            mtime = remote[path][1] if remote.get(path) is not None else None
+            f = await loop.run_in_executor(executor, open, temporary, 'wb')
+            
+            def discard():
+                f.close()
+                os.remove(temporary)
+            
+            def move_into_place():
+                f.close()
+                os.replace(temporary, local_path)
+                if mtime is not None:
+                    os.utime(local_path, (mtime, mtime))
+            
+            try:
+                async with aclosing(ftp.retrieve(f'RETR {name}')) as chunks:
+                    async for chunk in chunks:
+                        await loop.run_in_executor(executor, f.write, chunk)
+                        size += len(chunk)
+            except BaseException:
+                await loop.run_in_executor(executor, discard)
+                raise
+            await loop.run_in_executor(executor, move_into_place)
+            return size
+    
+    async def mirror(self, session_id: str, local_path: str, remote_directory: str = None,
+                     direction: str = 'upload', delete: bool = False, dry_run: bool = False,
+                     rescan: bool = False, parallel: int = 1) -> tuple:
+        """Bring a local directory and a remote one in line, transferring only new or changed files.
+
+        Files are compared by size and modification time, from MLSD facts
+        or MDTM when the listing has no exact time. The signatures of both
+        sides are saved after each run next to the local files; an upload
+        mirror then trusts them for the remote side and only rescans the
+        local tree, unless ``rescan`` is set. Transfers run over ``parallel``
+        pooled connections. Returns ``(success, message, report)``.
+        """
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection", None
+            if direction not in ('upload', 'download', 'both'):
+                return False, "direction must be 'upload', 'download' or 'both'", None
+            
+            local_root = resolve_mirror_path(local_path)
+            remote_root = (remote_path(connection['current_path'], remote_directory) if remote_directory
+                           else connection['current_path'])
+            loop = asyncio.get_event_loop()
+            if direction == 'upload' and not os.path.isdir(local_root):
+                return False, f"Local directory '{local_path}' does not exist", None
+            await loop.run_in_executor(executor, functools.partial(os.makedirs, local_root, exist_ok=True))
+            
+            started = time.monotonic()
+            server = MetadataIndex.server_name(connection['server_key'])
+            state_file = _mirror_state_file(local_root, server, remote_root)
+            state = await loop.run_in_executor(executor, load_mirror_state, state_file)
+            local = await loop.run_in_executor(executor, scan_local_tree, local_root)
+            remote, remote_directories = None, set()
+            if direction != 'upload' or rescan or not state:
+                remote, remote_directories = await self._scan_remote_tree(connection, remote_root, parallel)
+            else:
+                for path in state:
+                    parent = posixpath.dirname(path)
+                    while parent and parent not in remote_directories:
+                        remote_directories.add(parent)
+                        parent = posixpath.dirname(parent)
+            
+            # MDTM only where a first comparison hinges on a time the listing lacks
+            undated = [path for path in set(local) & set(remote or {})
+                       if path not in state and remote[path][1] is None and local[path][0] == remote[path][0]]
+            remote_times = await self._remote_times(connection, remote_root, undated) if undated else {}
+            actions, unchanged, conflicts = plan_mirror(direction, local, remote, state, delete, remote_times)
+            report = {
+                'actions': [],
+                'unchanged': len(unchanged),
+                'conflicts': conflicts,
+                'bytes': 0,
+                'seconds': 0.0
+            }
+            for action, path, reason in actions:
+                source = local if action == 'upload' else remote if action == 'download' else None
+                size = source[path][0] if source else None
+                report['actions'].append({'action': action, 'path': path, 'size': size, 'reason': reason})
+            if dry_run:
+                report['seconds'] = time.monotonic() - started
+                return True, f"{len(actions)} changes planned, {len(unchanged)} files unchanged", report
+            
+            # Remote directories first, parents before children; an empty scan may mean no root yet
+            needed = set()
+            for action, path, _ in actions:
+                parent = posixpath.dirname(path)
+                while action == 'upload' and parent and parent not in remote_directories:
+                    needed.add(parent)
+                    parent = posixpath.dirname(parent)
+            uploads = any(action == 'upload' for action, _, _ in actions)
+            create = [remote_root] if uploads and remote == {} and not remote_directories else []
+            create += [posixpath.join(remote_root, path) for path in sorted(needed, key=lambda path: path.count('/'))]
+            if create:
+                async with connection['pool'].metadata(connection['current_path']) as ftp:
+                    for directory in create:
+                        try:
+                            await ftp.mkd(directory)
+                        except ftplib.error_perm:
+                            pass  # already there
+            
+            pending = iter(report['actions'])
+            
+            async def worker():
+                for entry in pending:
+                    try:
+                        transferred = await self._mirror_action(
+                            connection, local_root, remote_root, entry['action'], entry['path'], remote or {}
+                        )
+                        report['bytes'] += transferred
+                        entry['status'], entry['message'] = "success", None
+                    except Exception as e:
+                        entry['status'], entry['message'] = "error", str(e)
+            
+            await asyncio.gather(*(worker() for _ in range(max(min(parallel, len(actions)), 1))))
+            
+            # Record what both sides look like now; failed actions keep their old state and are retried next run
+            local = await loop.run_in_executor(executor, scan_local_tree, local_root)
+            listings = {}
+            files = {path: {'local': here and list(here), 'remote': there and list(there)}
+                     for path, (here, there) in unchanged.items()}
+            for entry in report['actions']:
+                path = entry['path']
+                if entry['status'] != "success":
+                    if path in state:
+                        files[path] = state[path]
+                    continue
+                if entry['action'] in ('delete_local', 'delete_remote'):
+                    continue
+                directory = posixpath.join(remote_root, posixpath.dirname(path)).rstrip('/') or '/'
+                if directory not in listings:
+                    listing_cache.invalidate(connection['server_key'], directory)
+                    files_listed = await self._list_directory(connection, directory)
+                    listings[directory] = {info.name: info for info in files_listed}
+                info = listings[directory].get(posixpath.basename(path))
+                if info is not None and path in local:
+                    files[path] = {'local': list(local[path]), 'remote': [info.size, _entry_timestamp(info)]}
+            await loop.run_in_executor(executor, save_mirror_state, state_file, files)
+            
+            report['seconds'] = time.monotonic() - started
+            failed = sum(entry['status'] == "error" for entry in report['actions'])
+            message = f"Mirrored {len(actions) - failed} changes, {len(unchanged)} files unchanged"
+            return True, message + (f", {failed} failed" if failed else ""), report
+        except Exception as e:
+            return False, f"Failed to mirror: {str(e)}", None
+    
+    def _upload(self, connection: dict, upload_id: str):
+        """Look up a resumable upload; any session logged in as the same user may continue it."""
+        upload = self.uploads.get(upload_id)
+        if upload is None or upload['server_key'] != connection['server_key']:
+            return None
+        upload['last_used'] = time.monotonic()
+        return upload
+    
+    async def _committed_size(self, connection: dict, upload: dict):
+        """Bytes of the .part file held by the server, or None when it cannot tell."""
+        async with connection['pool'].metadata(upload['directory']) as ftp:
             try:
-                ftp.delete(filename)
-                return True, f"File '{filename}' deleted successfully"
-            except:
+                return await ftp.size(upload['part_name'])
+            except ftplib.error_perm as e:
+                # No .part file yet means nothing was committed
+                return 0 if str(e)[:3] == '550' else None
+    
+    async def create_upload(self, session_id: str, filename: str, size: int = None) -> tuple:
+        """Start a resumable upload of ``filename`` into the current directory.
+
+        Chunks are written to ``<filename>.<id>.part`` and the file is renamed
+        into place by ``complete_upload``.
+        """
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection", None
+            
+            upload_id = str(uuid.uuid4())
+            upload = {
+                'upload_id': upload_id,
+                'server_key': connection['server_key'],
+                'directory': connection['current_path'],
+                'filename': filename,
+                'part_name': f"{filename}.{upload_id[:8]}.part",
+                'size': size,
+                'offset': 0,
+                'rewrite': False,  # resend from offset with REST + STOR instead of APPE
+                'lock': asyncio.Lock(),
+                'last_used': time.monotonic()
+            }
+            self.uploads[upload_id] = upload
+            return True, f"Upload of '{filename}' started", upload
+        except Exception as e:
+            return False, f"Failed to start upload: {str(e)}", None
+    
+    async def upload_status(self, session_id: str, upload_id: str) -> tuple:
+        """Report the committed offset, re-read from the server unless a chunk is in flight."""
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection", None
+            upload = self._upload(connection, upload_id)
+            if upload is None:
+                return False, "Upload not found", None
+            
+            if not upload['lock'].locked():
+                async with upload['lock']:
+                    size = await self._committed_size(connection, upload)
+                    if size is not None and size != upload['offset']:
+                        upload['offset'] = size
+                        upload['rewrite'] = False
+            
+            return True, f"{upload['offset']} bytes committed", upload
+        except Exception as e:
+            return False, f"Failed to get upload status: {str(e)}", None
+    
+    @instrumented('upload_chunk')
+    async def upload_chunk(self, session_id: str, upload_id: str, offset: int, chunks) -> tuple:
+        """Append a chunk that starts at ``offset``, which must equal the committed size.
+
+        The upload is returned on failure only when the chunk conflicts with
+        the upload's state (wrong offset or another chunk in flight).
+
+        The chunk is sent with APPE, or with STOR for the first one. After a
+        failed chunk the committed size is re-read with SIZE; when the server
+        cannot report it, the next chunk rewrites from the last known offset
+        with REST + STOR.
+        """
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection", None
+            upload = self._upload(connection, upload_id)
+            if upload is None:
+                return False, "Upload not found", None
+            if upload['lock'].locked():
+                return False, "Another chunk of this upload is in progress", upload
+            
+            async with upload['lock']:
+                if offset != upload['offset']:
+                    return False, f"Chunk offset {offset} does not match committed offset {upload['offset']}", upload
+                
+                sent = 0
+                async def counted():
+                    nonlocal sent
+                    async for chunk in chunks:
+                        if upload['size'] is not None and offset + sent + len(chunk) > upload['size']:
+                            raise ValueError(f"chunk runs past the declared size of {upload['size']} bytes")
+                        sent += len(chunk)
+                        yield chunk
+                
+                part_name = upload['part_name']
                 try:
-                    ftp.rmd(filename)
-                    return True, f"Directory '{filename}' deleted successfully"
+                    async with connection['pool'].checkout(upload['directory']) as ftp:
+                        if offset == 0:
+                            await ftp.store(f'STOR {part_name}', counted())
+                        elif upload['rewrite']:
+                            await ftp.store(f'STOR {part_name}', counted(), offset)
+                        else:
+                            await ftp.store(f'APPE {part_name}', counted())
                 except Exception as e:
-                    return False, f"Failed to delete '{filename}': {str(e)}"
+                    # Some of the chunk may have landed: ask the server how much it holds
+                    try:
+                        size = await self._committed_size(connection, upload)
+                    except Exception:
+                        size = None
+                    if size is not None:
+                        upload['offset'], upload['rewrite'] = size, False
+                    else:
+                        upload['rewrite'] = True
+                    return False, f"Chunk upload failed: {str(e)}", None
+                finally:
+                    listing_cache.invalidate(connection['server_key'], upload['directory'])
+                
+                upload['offset'] = offset + sent
+                upload['rewrite'] = False
+            
+            return True, f"{sent} bytes committed", upload
+        except Exception as e:
+            return False, f"Failed to upload chunk: {str(e)}", None
+    
+    async def complete_upload(self, session_id: str, upload_id: str) -> tuple:
+        """Check the committed size and rename the .part file to its final name."""
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection"
+            upload = self._upload(connection, upload_id)
+            if upload is None:
+                return False, "Upload not found"
+            if upload['lock'].locked():
+                return False, "A chunk of this upload is still in progress"
+            
+            async with upload['lock']:
+                size = await self._committed_size(connection, upload)
+                if size is not None:
+                    upload['offset'] = size
+                if upload['size'] is not None and upload['offset'] != upload['size']:
+                    return False, f"Upload incomplete: {upload['offset']} of {upload['size']} bytes committed"
+                
+                filename = upload['filename']
+                async with connection['pool'].metadata(upload['directory']) as ftp:
+                    try:
+                        await ftp.rename(upload['part_name'], filename)
+                    except ftplib.error_perm:
+                        # Some servers refuse to rename over an existing file
+                        await ftp.delete(filename)
+                        await ftp.rename(upload['part_name'], filename)
+                del self.uploads[upload_id]
+            
+            listing_cache.invalidate(connection['server_key'], upload['directory'])
+            return True, f"File '{filename}' uploaded successfully"
+        except Exception as e:
+            return False, f"Failed to complete upload: {str(e)}"
+    
+    async def abort_upload(self, session_id: str, upload_id: str) -> tuple:
+        """Forget a resumable upload and delete its .part file."""
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection"
+            upload = self._upload(connection, upload_id)
+            if upload is None:
+                return False, "Upload not found"
+            
+            async with upload['lock']:
+                self.uploads.pop(upload_id, None)
+                async with connection['pool'].metadata(upload['directory']) as ftp:
+                    try:
+                        await ftp.delete(upload['part_name'])
+                    except ftplib.error_perm:
+                        pass  # Nothing was committed yet
+            
+            listing_cache.invalidate(connection['server_key'], upload['directory'])
+            return True, f"Upload of '{upload['filename']}' cancelled"
+        except Exception as e:
+            return False, f"Failed to cancel upload: {str(e)}"
+    
+    @instrumented('cwd')
+    async def change_directory(self, session_id: str, path: str) -> tuple:
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection"
+            
+            async with connection['pool'].metadata(connection['current_path']) as ftp:
+                if path == "..":
+                    # Go up one directory
+                    current = await ftp.pwd()
+                    if current != "/":
+                        parts = current.rstrip('/').split('/')
+                        if len(parts) > 1:
+                            new_path = '/'.join(parts[:-1]) or '/'
+                            await ftp.cwd(new_path)
+                else:
+                    await ftp.cwd(path)
+                
+                new_path = await ftp.pwd()
+                ftp.working_directory = connection['current_path'] = new_path
+            
+            return True, f"Changed directory to {new_path}"
+        except Exception as e:
+            return False, f"Failed to change directory: {str(e)}"
+    
+    async def _delete(self, connection: dict, ftp: FTPConnectionBase, filename: str) -> tuple:
+        target = remote_path(connection['current_path'], filename)
+        
+        # Try to delete as file first, then as directory
+        try:
+            await ftp.delete(filename)
+            listing_cache.remove_entry(connection['server_key'], target)
+            return True, f"File '{filename}' deleted successfully"
+        except:
+            try:
+                await ftp.rmd(filename)
+                listing_cache.remove_entry(connection['server_key'], target)
+                listing_cache.invalidate_tree(connection['server_key'], target)
+                return True, f"Directory '{filename}' deleted successfully"
+            except Exception as e:
+                return False, f"Failed to delete '{filename}': {str(e)}"
+    
+    async def _rename(self, connection: dict, ftp: FTPConnectionBase, old_name: str, new_name: str) -> tuple:
+        try:
+            await ftp.rename(old_name, new_name)
+        except Exception as e:
+            return False, f"Failed to rename: {str(e)}"
+        
+        # Move the cached entry; anything cached below the old path is stale
+        server_key = connection['server_key']
+        old_path = remote_path(connection['current_path'], old_name)
+        new_path = remote_path(connection['current_path'], new_name)
+        entry = listing_cache.remove_entry(server_key, old_path)
+        listing_cache.invalidate_tree(server_key, old_path)
+        if entry is not None:
+            listing_cache.add_entry(server_key, new_path, entry)
+        else:
+            listing_cache.invalidate(server_key, posixpath.dirname(new_path))
+        return True, f"Renamed '{old_name}' to '{new_name}'"
+    
+    async def _create_directory(self, connection: dict, ftp: FTPConnectionBase, directory_name: str) -> tuple:
+        try:
+            await ftp.mkd(directory_name)
+        except Exception as e:
+            return False, f"Failed to create directory: {str(e)}"
+        
+        target = remote_path(connection['current_path'], directory_name)
+        listing_cache.invalidate(connection['server_key'], posixpath.dirname(target))
+        return True, f"Directory '{directory_name}' created successfully"
+    
+    async def _stat(self, connection: dict, ftp: FTPConnectionBase, name: str) -> tuple:
+        """Describe one entry, as ``(success, message, file_info)``.
+
+        Uses MLST when the server has it, otherwise SIZE and MDTM, telling
+        directories apart by whether CWD into them works.
+        """
+        try:
+            if 'MLST' in connection['features']:
+                resp = await ftp.sendcmd(f'MLST {name}')
+                files = parse_mlsd_lines(line.strip() for line in resp.splitlines()[1:-1])
+                if not files:
+                    return False, f"No information returned for '{name}'", None
+                info = files[0].model_copy(update={'name': posixpath.basename(name.rstrip('/')) or name})
+                return True, f"Stat of '{name}' retrieved", info
+            
+            try:
+                size = await ftp.size(name)
+                file_type = 'file'
+            except ftplib.error_perm:
+                await ftp.cwd(name)
+                try:
+                    await ftp.cwd(ftp.working_directory)
+                except Exception:
+                    ftp.working_directory = None  # Changed into again by the next checkout
+                size, file_type = None, 'directory'
+            try:
+                modified = format_ftp_timestamp((await ftp.sendcmd(f'MDTM {name}'))[4:].strip())
+            except ftplib.error_perm:
+                modified = None
+            info = FTPFileInfo(name=posixpath.basename(name.rstrip('/')) or name, type=file_type, size=size, modified=modified)
+            return True, f"Stat of '{name}' retrieved", info
+        except Exception as e:
+            return False, f"Failed to stat '{name}': {str(e)}", None
+    
+    async def _run_operation(self, connection: dict, ftp: FTPConnectionBase, operation) -> tuple:
+        """Run one batch operation, as ``(success, message, file_info)``."""
+        if operation.op == 'delete':
+            return (*await self._delete(connection, ftp, operation.name), None)
+        if operation.op == 'rename':
+            if not operation.new_name:
+                return False, "Rename needs a new_name", None
+            return (*await self._rename(connection, ftp, operation.name, operation.new_name), None)
+        if operation.op == 'mkdir':
+            return (*await self._create_directory(connection, ftp, operation.name), None)
+        if operation.op == 'stat':
+            return await self._stat(connection, ftp, operation.name)
+        return False, f"Unknown operation '{operation.op}'", None
+    
+    @instrumented('delete')
+    async def delete_file(self, session_id: str, filename: str) -> tuple:
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection"
+            
+            async with connection['pool'].metadata(connection['current_path']) as ftp:
+                return await self._delete(connection, ftp, filename)
                     
         except Exception as e:
             return False, f"Failed to delete: {str(e)}"
     
-    def rename_file(self, session_id: str, old_name: str, new_name: str) -> tuple:
+    @instrumented('rename')
+    async def rename_file(self, session_id: str, old_name: str, new_name: str) -> tuple:
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection"
+            
+            async with connection['pool'].metadata(connection['current_path']) as ftp:
+                return await self._rename(connection, ftp, old_name, new_name)
+            
+        except Exception as e:
+            return False, f"Failed to rename: {str(e)}"
+    
+    @instrumented('mkdir')
+    async def create_directory(self, session_id: str, directory_name: str) -> tuple:
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection"
+            
+            async with connection['pool'].metadata(connection['current_path']) as ftp:
+                return await self._create_directory(connection, ftp, directory_name)
+            
+        except Exception as e:
+            return False, f"Failed to create directory: {str(e)}"
+    
+    async def run_batch(self, session_id: str, operations: list, parallel: bool, emit) -> tuple:
+        """Run file operations in the current directory, reporting each as it finishes.
+
+        ``emit(index, success, message, file_info)`` is awaited per operation
+        and returns False to stop the batch, e.g. when the client has gone.
+        Sequential batches run on the session's own connection, taking it for
+        one operation at a time so that other requests on the session get
+        their turn in between; parallel ones also spread operations over the
+        session's pool, so results may arrive out of order. An operation in a parallel batch
+        still waits for earlier ones on the same path, on one of its parent
+        directories or inside it, so a mkdir followed by a rename of the new
+        directory runs in order.
+        """
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection"
+            
+            pool = connection['pool']
+            directory = connection['current_path']
+            succeeded = 0
+            next_index = 0
+            finished = 0
+            stopped = False
+            exact = {}  # path -> event set once the latest operation on that path finishes
+            inside = {}  # path -> events of operations below it since the latest one on the path itself
+            
+            def claim(operation: FTPBatchOperation) -> tuple:
+                """Events of the earlier operations this one depends on, and its own event."""
+                paths = {remote_path(directory, operation.name)}
+                if operation.new_name:
+                    paths.add(remote_path(directory, operation.new_name))
+                parents = {}
+                for path in paths:
+                    parents[path] = []
+                    child, parent = path, posixpath.dirname(path)
+                    while parent != child:
+                        parents[path].append(parent)
+                        child, parent = parent, posixpath.dirname(parent)
+                waits = []
+                for path in paths:
+                    waits += [exact[other] for other in (path, *parents[path]) if other in exact]
+                    waits += inside.pop(path, [])
+                done = asyncio.Event()
+                for path in paths:
+                    exact[path] = done
+                    for parent in parents[path]:
+                        inside.setdefault(parent, []).append(done)
+                return waits, done
+            
+            async def work(acquire):
+                nonlocal succeeded, next_index, finished, stopped
+                while next_index < len(operations) and not stopped:
+                    index = next_index
+                    next_index += 1
+                    waits, done = claim(operations[index])
+                    try:
+                        for event in waits:
+                            await event.wait()
+                        async with acquire() as ftp:
+                            success, message, info = await self._run_operation(connection, ftp, operations[index])
+                    finally:
+                        done.set()
+                    # Between operations the session holds no connection; keep the reaper off it
+                    connection['last_used'] = time.monotonic()
+                    succeeded += success
+                    finished += 1
+                    if not await emit(index, success, message, info):
+                        stopped = True
+            
+            async def member_worker():
+                async with pool.checkout(directory) as ftp:
+                    await work(lambda: nullcontext(ftp))
+            
+            async def primary_worker():
+                await work(lambda: pool.metadata(directory))
+            
+            workers = [primary_worker()]
+            if parallel:
+                workers += [member_worker() for _ in range(min(pool.max_size, len(operations)) - 1)]
+            await asyncio.gather(*workers)
+            
+            if stopped:
+                return False, f"Batch stopped after {finished} of {len(operations)} operations"
+            return True, f"{succeeded} of {len(operations)} operations succeeded"
+        except Exception as e:
+            return False, f"Batch failed: {str(e)}"
+    
+    async def submit_job(self, session_id: str, kind: str, path: str, local_path: str = None,
+                         destination: str = None, priority: int = 0, max_attempts: int = None) -> tuple:
+        """Queue a background transfer with this session's server and login.
+
+        Remote paths are resolved against the session's current directory
+        now; the job itself runs on a session of its own, so it outlives
+        this one. Returns ``(success, message, job)``.
+        """
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection", None
+            
+            if kind not in ('upload', 'download', 'copy'):
+                return False, "kind must be 'upload', 'download' or 'copy'", None
+            if kind == 'copy':
+                if not destination:
+                    return False, "Copy jobs need a destination", None
+                destination = remote_path(connection['current_path'], destination)
+            else:
+                if not local_path:
+                    return False, f"{kind.capitalize()} jobs need a local_path", None
+                local_file = resolve_mirror_path(local_path)
+                if kind == 'upload' and not os.path.isfile(local_file):
+                    return False, f"Local file '{local_path}' does not exist", None
+            
+            job = await transfer_jobs.submit({
+                'kind': kind,
+                'host': connection['host'],
+                'port': connection['port'],
+                'username': connection['username'],
+                'engine': connection['ftp'].engine,
+                'remote_path': remote_path(connection['current_path'], path),
+                'local_path': local_path,
+                'destination': destination,
+                'priority': priority,
+                'max_attempts': max(max_attempts or FTP_JOB_MAX_ATTEMPTS, 1)
+            }, connection['pool'].password)
+            return True, f"Job {job['job_id']} queued", job
+        except Exception as e:
+            return False, f"Failed to queue job: {str(e)}", None
+    
+    async def _job(self, connection: dict, job_id: str):
+        """Look up a background job; any session logged in as the user who queued it may see it."""
+        job = await transfer_jobs.get(job_id)
+        if job is None or TransferJobQueue.owner(job) != connection['server_key']:
+            return None
+        return job
+    
+    async def list_jobs(self, session_id: str, status: str = None) -> tuple:
+        """Jobs queued with this session's server and login, as ``(success, message, jobs)``."""
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection", []
+            
+            jobs = [job for job in transfer_jobs.list(status)
+                    if TransferJobQueue.owner(job) == connection['server_key']]
+            return True, f"{len(jobs)} jobs", jobs
+        except Exception as e:
+            return False, f"Failed to list jobs: {str(e)}", []
+    
+    async def get_job(self, session_id: str, job_id: str) -> tuple:
+        """State of a job queued with this session's login, as ``(success, message, job)``."""
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection", None
+            job = await self._job(connection, job_id)
+            if job is None:
+                return False, f"Job {job_id} not found", None
+            
+            return True, f"Job {job_id} is {job['status']}", job
+        except Exception as e:
+            return False, f"Failed to get job: {str(e)}", None
+    
+    async def cancel_job(self, session_id: str, job_id: str) -> tuple:
+        """Cancel a queued or running job queued with this session's login."""
+        try:
+            connection = self._session(session_id)
+            if connection is None:
+                return False, "No active FTP connection"
+            if await self._job(connection, job_id) is None:
+                return False, f"Job {job_id} not found"
+            
+            return await transfer_jobs.cancel(job_id)
+        except Exception as e:
+            return False, f"Failed to cancel job: {str(e)}"
+
+# Create FTP manager instance
+ftp_manager = FTPClientManager(FTP_SESSION_IDLE_TIMEOUT, FTP_MAX_SESSIONS, FTP_MAX_SESSIONS_PER_HOST)
+
+# Background transfer jobs
+class TransferJobQueue:
+    """Uploads, downloads and copies run in the background on sessions of their own.
+
+    Queued jobs start highest ``priority`` first, oldest first among equals,
+    while fewer than ``workers`` jobs run overall and fewer than
+    ``per_host`` against the job's host. A failed attempt is retried after
+    ``retry_delay`` seconds, doubling with every retry, until the job's
+    ``max_attempts`` are used up. Every state change is written to
+    ``collection`` in the background, latest state per job and in order of
+    change, so a slow database never holds up the API; queued and
+    interrupted jobs resume after a restart;
+    their passwords are stored only when encrypted with ``cipher`` and jobs
+    without one fail on restore. The last ``history`` finished jobs stay in
+    memory, older ones are read back from the collection.
+    """
+    TERMINAL = ('succeeded', 'failed', 'cancelled')
+
+    @staticmethod
+    def owner(job: dict) -> tuple:
+        """Server key of the login a job runs with, comparable with a session's ``server_key``."""
+        return job['host'], job['port'], job['username']
+
+    def __init__(self, collection, workers: int, per_host: int, retry_delay: float, history: int, cipher=None):
+        self.collection = collection
+        self.workers = max(workers, 1)
+        self.per_host = max(per_host, 1)
+        self.retry_delay = retry_delay
+        self.history = history
+        self.cipher = cipher
+        self.jobs = {}  # job id -> job state
+        self.passwords = {}  # job id -> password, for jobs not finished
+        self.running = {}  # job id -> task
+        self.watchers = {}  # job id -> queues of subscribers
+        self.finished = deque()  # ids of finished jobs still in memory, oldest first
+        self._unsaved = {}  # job id -> latest state not yet written to the collection
+        self._writer = None
+        self._wake = None
+        self._dispatcher = None
+
+    def start(self):
+        if self._dispatcher is None:
+            self._wake = asyncio.Event()
+            self._dispatcher = spawn(self._dispatch())
+            self._wake.set()
+
+    async def stop(self, flush_timeout: float = 5):
+        """Stop scheduling and interrupt running jobs; their stored state makes a restart resume them.
+
+        Pending state writes get ``flush_timeout`` seconds to reach the collection.
+        """
+        tasks = list(self.running.values())
+        if self._dispatcher is not None:
+            tasks.append(self._dispatcher)
+            self._dispatcher = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._writer is not None:
+            done, _ = await asyncio.wait([self._writer], timeout=flush_timeout)
+            if not done:
+                logger.warning(f"Dropping {len(self._unsaved)} unsaved job states on shutdown")
+                self._writer.cancel()
+                self._unsaved.clear()
+            self._writer = None
+
+    async def submit(self, fields: dict, password: str) -> dict:
+        job = {
+            'job_id': str(uuid.uuid4()),
+            'status': 'queued',
+            'attempts': 0,
+            'bytes': 0,
+            'message': None,
+            'created': time.time(),
+            'started': None,
+            'finished': None,
+            'next_attempt': None,
+            **fields
+        }
+        if self.cipher is not None:
+            job['password_token'] = self.cipher.encrypt(password.encode()).decode()
+        self.jobs[job['job_id']] = job
+        self.passwords[job['job_id']] = password
+        self._update(job)
+        self._wake_dispatcher()
+        return job
+
+    async def get(self, job_id: str):
+        job = self.jobs.get(job_id)
+        if job is None and self.collection is not None:
+            job = await self.collection.find_one({'_id': job_id})
+        return job
+
+    def list(self, status: str = None) -> list:
+        """Jobs held in memory, newest first: everything unfinished plus recent history."""
+        jobs = [job for job in self.jobs.values() if status is None or job['status'] == status]
+        return sorted(jobs, key=lambda job: job['created'], reverse=True)
+
+    async def cancel(self, job_id: str) -> tuple:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return False, f"Job {job_id} not found"
+        if job['status'] in self.TERMINAL:
+            return False, f"Job {job_id} has already {job['status']}"
+        self._finish(job, 'cancelled', "Cancelled")
+        task = self.running.get(job_id)
+        if task is not None:
+            task.cancel()
+        self._update(job)
+        return True, f"Job {job_id} cancelled"
+
+    async def restore(self):
+        """Requeue the jobs a previous process left queued or running."""
+        if self.collection is None:
+            return
+        async for document in self.collection.find({'status': {'$in': ['queued', 'running']}}):
+            if document['_id'] in self.jobs:
+                continue  # submitted by this process while restoring
+            job = {key: value for key, value in document.items() if key != '_id'}
+            password = None
+            if self.cipher is not None and job.get('password_token'):
+                try:
+                    password = self.cipher.decrypt(job['password_token'].encode()).decode()
+                except InvalidToken:
+                    pass
+            if job['status'] == 'running':
+                # The interruption is not the job's fault
+                job['attempts'] = max(job['attempts'] - 1, 0)
+            self.jobs[job['job_id']] = job
+            if password is None:
+                self._finish(job, 'failed',
+                             "Password was not stored; set FTP_JOB_SECRET to resume jobs after a restart")
+            else:
+                self.passwords[job['job_id']] = password
+                job['status'] = 'queued'
+            self._update(job)
+        logger.info(f"Restored {len(self.passwords)} background transfer jobs")
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self.watchers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        watchers = self.watchers.get(job_id)
+        if watchers is not None:
+            watchers.discard(queue)
+            if not watchers:
+                del self.watchers[job_id]
+
+    def _update(self, job: dict):
+        """Tell subscribers about a state change and queue it for storing."""
+        for queue in self.watchers.get(job['job_id'], ()):
+            queue.put_nowait(dict(job))
+        if self.collection is None:
+            return
+        # A job changed again before its last state was written keeps its place in line
+        self._unsaved[job['job_id']] = dict(job)
+        if self._writer is None or self._writer.done():
+            self._writer = spawn(self._write_states())
+
+    async def _write_states(self):
+        """Store queued job states one at a time until none are left."""
+        while self._unsaved:
+            job_id = next(iter(self._unsaved))
+            job = self._unsaved.pop(job_id)
+            try:
+                await self.collection.replace_one({'_id': job_id}, {'_id': job_id, **job}, upsert=True)
+            except Exception as e:
+                logger.warning(f"Could not store state of job {job_id}: {str(e)}")
+
+    def _finish(self, job: dict, status: str, message: str):
+        job['status'] = status
+        job['message'] = message
+        job['finished'] = time.time()
+        job['next_attempt'] = None
+        self.passwords.pop(job['job_id'], None)
+        self.finished.append(job['job_id'])
+        while len(self.finished) > self.history:
+            self.jobs.pop(self.finished.popleft(), None)
+
+    def _wake_dispatcher(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    def _next_job(self) -> tuple:
+        """The queued job to start now, or None, and the earliest time a retry becomes due."""
+        now = time.time()
+        per_host = Counter(self.jobs[job_id]['host'] for job_id in self.running)
+        best, retry_at = None, None
+        for job in self.jobs.values():
+            if job['status'] != 'queued':
+                continue
+            if job['next_attempt'] is not None and job['next_attempt'] > now:
+                retry_at = job['next_attempt'] if retry_at is None else min(retry_at, job['next_attempt'])
+                continue
+            if per_host[job['host']] >= self.per_host:
+                continue
+            if best is None or (-job['priority'], job['created']) < (-best['priority'], best['created']):
+                best = job
+        return best, retry_at
+
+    async def _dispatch(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            retry_at = None
+            while len(self.running) < self.workers:
+                job, retry_at = self._next_job()
+                if job is None:
+                    break
+                job['status'] = 'running'
+                job['attempts'] += 1
+                job['started'] = time.time()
+                job['next_attempt'] = None
+                job['bytes'] = 0
+                self.running[job['job_id']] = spawn(self._run(job))
+            if retry_at is not None:
+                asyncio.get_event_loop().call_later(max(retry_at - time.time(), 0), self._wake_dispatcher)
+
+    async def _run(self, job: dict):
         try:
-            if session_id not in self.connections:
-                return False, "No active FTP connection"
-            
-            ftp = self.connections[session_id]['ftp']
-            
-            ftp.rename(old_name, new_name)
-            return True, f"Renamed '{old_name}' to '{new_name}'"
-            
+            self._update(job)
+            success, message = await self._attempt(job)
+        except asyncio.CancelledError:
+            # Either cancel() already recorded the outcome, or the process is
+            # stopping and the stored 'running' state lets restore() retry it
+            raise
         except Exception as e:
-            return False, f"Failed to rename: {str(e)}"
-    
-    def create_directory(self, session_id: str, directory_name: str) -> tuple:
+            success, message = False, str(e)
+        finally:
+            self.running.pop(job['job_id'], None)
+            self._wake_dispatcher()
+
+        if success:
+            self._finish(job, 'succeeded', message)
+        elif job['attempts'] < job['max_attempts']:
+            delay = self.retry_delay * 2 ** (job['attempts'] - 1)
+            logger.warning(f"Job {job['job_id']} attempt {job['attempts']} failed, retrying in {delay:g}s: {message}")
+            job['message'] = message
+            job['next_attempt'] = time.time() + delay
+            job['status'] = 'queued'
+        else:
+            self._finish(job, 'failed', message)
+        self._update(job)
+
+    async def _attempt(self, job: dict) -> tuple:
+        """Run one attempt of a job on a session opened for it."""
+        session_id = f"job-{job['job_id']}"
+        success, message = await ftp_manager.connect(session_id, job['host'], job['port'], job['username'],
+                                                     self.passwords[job['job_id']], job['engine'], background=True)
+        if not success:
+            return False, message
         try:
-            if session_id not in self.connections:
-                return False, "No active FTP connection"
-            
-            ftp = self.connections[session_id]['ftp']
-            
-            ftp.mkd(directory_name)
-            return True, f"Directory '{directory_name}' created successfully"
-            
-        except Exception as e:
-            return False, f"Failed to create directory: {str(e)}"
+            if job['kind'] == 'copy':
+                success, message, job['bytes'], _ = await ftp_manager.copy_file(
+                    session_id, job['remote_path'], job['destination']
+                )
+                return success, message
+            path = resolve_mirror_path(job['local_path'])
+            if job['kind'] == 'upload':
+                async def counted(chunks):
+                    async for chunk in chunks:
+                        job['bytes'] += len(chunk)
+                        yield chunk
 
-# Create FTP manager instance
-ftp_manager = FTPClientManager()
+                success, message, _ = await ftp_manager.upload_file(
+                    session_id, job['remote_path'], counted(_read_local_file(path))
+                )
+                return success, message
+            return await self._download(session_id, job, path)
+        finally:
+            await ftp_manager.disconnect(session_id)
+
+    async def _download(self, session_id: str, job: dict, path: str) -> tuple:
+        """Download into a temporary file next to ``path`` and move it into place once complete."""
+        loop = asyncio.get_event_loop()
+        temporary = f"{path}.{MIRROR_STATE_PREFIX}part"
+        make_parent = functools.partial(os.makedirs, os.path.dirname(path), exist_ok=True)
+        await loop.run_in_executor(executor, make_parent)
+        f = await loop.run_in_executor(executor, open, temporary, 'wb')
+
+        async def write_chunk(chunk: bytes) -> bool:
+            await loop.run_in_executor(executor, f.write, chunk)
+            job['bytes'] += len(chunk)
+            return True
+
+        success = False
+        try:
+            success, message = await ftp_manager.download_file(session_id, job['remote_path'], write_chunk)
+        finally:
+            f.close()
+            if success:
+                os.replace(temporary, path)
+            else:
+                os.remove(temporary)
+        return success, message
+
+transfer_jobs = TransferJobQueue(
+    db.ftp_jobs if FTP_JOB_PERSIST else None,
+    FTP_JOB_WORKERS,
+    FTP_JOB_MAX_PER_HOST,
+    FTP_JOB_RETRY_DELAY,
+    FTP_JOB_HISTORY,
+    Fernet(FTP_JOB_SECRET) if FTP_JOB_SECRET else None
+)
+
+def transfer_job(job: dict) -> FTPJob:
+    return FTPJob(**{key: value for key, value in job.items() if key in FTPJob.model_fields})
 
 # Original routes
 @api_router.get("/")
@@ -291,16 +4492,14 @@ async def connect_ftp(connection_request: FTPConnectionRequest):
     """Connect to an FTP server"""
     session_id = str(uuid.uuid4())
     
-    # Run FTP connection in thread pool to avoid blocking
-    loop = asyncio.get_event_loop()
-    success, message = await loop.run_in_executor(
-        executor, 
-        ftp_manager.connect,
+    success, message = await ftp_manager.connect(
         session_id,
         connection_request.host,
         connection_request.port,
         connection_request.username,
-        connection_request.password
+        connection_request.password,
+        connection_request.engine,
+        connection_request.pool_size
     )
     
     if success:
@@ -315,95 +4514,766 @@ async def connect_ftp(connection_request: FTPConnectionRequest):
 @api_router.post("/ftp/disconnect/{session_id}", response_model=FTPOperationResponse)
 async def disconnect_ftp(session_id: str):
     """Disconnect from FTP server"""
-    loop = asyncio.get_event_loop()
-    success, message = await loop.run_in_executor(
-        executor, 
-        ftp_manager.disconnect,
-        session_id
-    )
+    success, message = await ftp_manager.disconnect(session_id)
     
     return FTPOperationResponse(status="success" if success else "error", message=message)
 
 @api_router.get("/ftp/list/{session_id}", response_model=FTPListResponse)
-async def list_ftp_files(session_id: str, path: str = None):
-    """List files and directories on FTP server"""
-    loop = asyncio.get_event_loop()
-    success, message, files, current_path = await loop.run_in_executor(
-        executor, 
-        ftp_manager.list_files,
+async def list_ftp_files(session_id: str, path: str = None, refresh: bool = False, sort: str = None,
+                         order: str = 'asc', prefix: str = None, pattern: str = None, type: str = None,
+                         limit: int = None, cursor: str = None):
+    """List files and directories on FTP server
+
+    Without paging or filter parameters the whole directory is returned in
+    server order. ``sort`` (name, size or modified), ``order``, the
+    ``prefix``, ``pattern`` (glob) and ``type`` filters and ``limit`` page
+    through the cached listing; each response carries ``next_cursor`` until
+    the last page.
+    """
+    if sort is not None and sort not in ListingViews.SORT_KEYS:
+        raise HTTPException(status_code=400, detail="sort must be 'name', 'size' or 'modified'")
+    if order not in ('asc', 'desc'):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    if type not in (None, 'file', 'directory'):
+        raise HTTPException(status_code=400, detail="type must be 'file' or 'directory'")
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    paged = any(value is not None for value in (sort, prefix, pattern, type, limit, cursor))
+    sort = sort or 'name'
+    descending = order == 'desc'
+    after = None
+    if cursor is not None:
+        try:
+            after = decode_listing_cursor(cursor, sort, descending)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    # Later pages come from the cached listing even if the first page forced a refresh
+    success, message, files, current_path, cache_age = await ftp_manager.list_files(
         session_id,
-        path
+        path,
+        refresh and cursor is None
     )
     
-    if success:
+    if not success:
+        raise HTTPException(status_code=400, detail=message)
+    if not paged:
         return FTPListResponse(
             files=files,
             current_path=current_path,
-            status="success"
+            status="success",
+            cached=cache_age is not None,
+            cache_age=cache_age
         )
-    else:
-        raise HTTPException(status_code=400, detail=message)
+    
+    # The session may have been closed while the listing was fetched
+    connection = ftp_manager.connections.get(session_id)
+    if connection is None:
+        raise HTTPException(status_code=400, detail="No active FTP connection")
+    name_filter = build_file_filter(pattern=pattern, file_type=type)
+    matches = name_filter if not prefix else lambda info: info.name.startswith(prefix) and name_filter(info)
+    page, total, last_key = listing_views.page(
+        connection['server_key'], current_path, files, sort, descending,
+        (prefix, pattern, type), matches, limit, after
+    )
+    return FTPListResponse(
+        files=page,
+        current_path=current_path,
+        status="success",
+        cached=cache_age is not None,
+        cache_age=cache_age,
+        total=total,
+        next_cursor=encode_listing_cursor(sort, descending, last_key) if last_key is not None else None
+    )
+
+async def _iter_upload_file(file: UploadFile):
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
 
-@api_router.post("/ftp/upload/{session_id}")
-async def upload_file_to_ftp(session_id: str, file: UploadFile = File(...)):
-    """Upload a file to FTP server"""
+def _checksum_param(name: str):
+    """Checksum algorithm from a query parameter, as a 400 error when unsupported."""
     try:
-        # Read file data
-        file_data = await file.read()
-        
-        # Upload file using thread pool
-        loop = asyncio.get_event_loop()
-        success, message = await loop.run_in_executor(
-            executor,
-            ftp_manager.upload_file,
-            session_id,
-            file.filename,
-            file_data
+        return checksum_algorithm(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.post("/ftp/upload/{session_id}", response_model=FTPUploadResponse)
+async def upload_file_to_ftp(session_id: str, file: UploadFile = File(...), checksum: str = None):
+    """Upload a file to FTP server.
+
+    The multipart body is parsed, and the file spooled to a temporary file,
+    before this runs, so the FTP transfer only starts once the whole upload
+    has arrived. Clients sending large files should use
+    ``PUT /ftp/upload-stream/{session_id}/{filename}``, which relays the
+    request body to the server as it is received.
+    """
+    algorithm = _checksum_param(checksum)
+    try:
+        # Pipe the spooled upload to the FTP server chunk by chunk
+        success, message, checksums = await ftp_manager.upload_file(
+            session_id, file.filename, _iter_upload_file(file), algorithm, file.size
         )
         
         if success:
-            return FTPOperationResponse(status="success", message=message)
+            return FTPUploadResponse(status="success", message=message, **(checksums or {}))
         else:
             raise HTTPException(status_code=400, detail=message)
-            
+    
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
-@api_router.get("/ftp/download/{session_id}/{filename}")
-async def download_file_from_ftp(session_id: str, filename: str):
-    """Download a file from FTP server"""
-    loop = asyncio.get_event_loop()
-    success, message, file_buffer = await loop.run_in_executor(
-        executor,
-        ftp_manager.download_file,
+@api_router.put("/ftp/upload-stream/{session_id}/{filename}", response_model=FTPUploadResponse)
+async def upload_stream_to_ftp(session_id: str, filename: str, request: Request, checksum: str = None):
+    """Upload a raw request body to FTP server as it is received"""
+    algorithm = _checksum_param(checksum)
+    size = request.headers.get('content-length')
+    success, message, checksums = await ftp_manager.upload_file(
+        session_id, filename, request.stream(), algorithm, int(size) if size and size.isdigit() else None
+    )
+    
+    if success:
+        return FTPUploadResponse(status="success", message=message, **(checksums or {}))
+    else:
+        raise HTTPException(status_code=400, detail=message)
+
+@api_router.get("/ftp/checksum/{session_id}/{filename}", response_model=FTPChecksumResponse)
+async def get_ftp_checksum(session_id: str, filename: str, algorithm: str = None, allow_download: bool = True):
+    """Checksum of a remote file, computed by the server when it supports HASH, XSHA256, XMD5 or XCRC"""
+    algorithm = _checksum_param(algorithm) or 'sha256'
+    success, message, checksum, source, size = await ftp_manager.file_checksum(
+        session_id, filename, algorithm, allow_download
+    )
+    
+    if not success:
+        raise HTTPException(status_code=400, detail=message)
+    if checksum is None:
+        raise HTTPException(status_code=400, detail=message)
+    return FTPChecksumResponse(
+        status="success",
+        message=message,
+        filename=filename,
+        algorithm=algorithm,
+        checksum=checksum,
+        source=source,
+        bytes=size
+    )
+
+@api_router.post("/ftp/copy/{session_id}", response_model=FTPCopyResponse)
+async def copy_ftp_file(session_id: str, copy_request: FTPCopyRequest):
+    """Copy a file on the server, or to another session's server, without passing it through the client"""
+    success, message, size, seconds = await ftp_manager.copy_file(
         session_id,
-        filename
+        copy_request.source,
+        copy_request.destination,
+        copy_request.destination_session_id
+    )
+    
+    if success:
+        return FTPCopyResponse(
+            status="success",
+            message=message,
+            bytes=size,
+            seconds=round(seconds, 3),
+            bytes_per_second=round(size / seconds, 1) if seconds > 0 else 0.0
+        )
+    else:
+        raise HTTPException(status_code=400, detail=message)
+
+def _upload_status(upload: dict, message: str) -> FTPUploadStatus:
+    return FTPUploadStatus(
+        upload_id=upload['upload_id'],
+        filename=upload['filename'],
+        current_path=upload['directory'],
+        offset=upload['offset'],
+        size=upload['size'],
+        status="success",
+        message=message
     )
+
+@api_router.post("/ftp/uploads/{session_id}", response_model=FTPUploadStatus)
+async def create_resumable_upload(session_id: str, upload_request: FTPUploadCreateRequest):
+    """Start a resumable upload into the current directory"""
+    success, message, upload = await ftp_manager.create_upload(
+        session_id,
+        upload_request.filename,
+        upload_request.size
+    )
+    
+    if success:
+        return _upload_status(upload, message)
+    else:
+        raise HTTPException(status_code=400, detail=message)
+
+@api_router.get("/ftp/uploads/{session_id}/{upload_id}", response_model=FTPUploadStatus)
+async def get_resumable_upload(session_id: str, upload_id: str):
+    """Report how many bytes of a resumable upload the server holds"""
+    success, message, upload = await ftp_manager.upload_status(session_id, upload_id)
+    
+    if success:
+        return _upload_status(upload, message)
+    else:
+        raise HTTPException(status_code=404 if upload is None else 400, detail=message)
+
+@api_router.put("/ftp/uploads/{session_id}/{upload_id}", response_model=FTPUploadStatus)
+async def put_resumable_upload_chunk(session_id: str, upload_id: str, offset: int, request: Request):
+    """Append the request body to a resumable upload at ``offset``"""
+    success, message, upload = await ftp_manager.upload_chunk(session_id, upload_id, offset, request.stream())
+    
+    if success:
+        return _upload_status(upload, message)
+    elif upload is not None:
+        # Conflicting offset or concurrent chunk: tell the client where to resume from
+        raise HTTPException(status_code=409, detail=message, headers={'Upload-Offset': str(upload['offset'])})
+    else:
+        raise HTTPException(status_code=400, detail=message)
+
+@api_router.post("/ftp/uploads/{session_id}/{upload_id}/complete", response_model=FTPOperationResponse)
+async def complete_resumable_upload(session_id: str, upload_id: str):
+    """Finish a resumable upload, moving the file into place"""
+    success, message = await ftp_manager.complete_upload(session_id, upload_id)
+    
+    if success:
+        return FTPOperationResponse(status="success", message=message)
+    else:
+        raise HTTPException(status_code=400, detail=message)
+
+@api_router.delete("/ftp/uploads/{session_id}/{upload_id}", response_model=FTPOperationResponse)
+async def abort_resumable_upload(session_id: str, upload_id: str):
+    """Cancel a resumable upload and remove its partial file"""
+    success, message = await ftp_manager.abort_upload(session_id, upload_id)
+    
+    return FTPOperationResponse(status="success" if success else "error", message=message)
+
+async def _pump_batch(session_id: str, batch_request: FTPBatchRequest, pipe: ChunkPipe):
+    """Run a batch, feeding one JSON line per result into ``pipe``."""
+    operations = batch_request.operations
+    
+    async def emit(index, success, message, info):
+        result = {
+            'index': index,
+            'op': operations[index].op,
+            'name': operations[index].name,
+            'status': "success" if success else "error",
+            'message': message
+        }
+        if info is not None:
+            result['file'] = info.model_dump()
+        return await pipe.put((json.dumps(result) + '\n').encode())
+    
+    success, message = await ftp_manager.run_batch(session_id, operations, batch_request.parallel, emit)
+    summary = {'done': True, 'status': "success" if success else "error", 'message': message}
+    await pipe.put((json.dumps(summary) + '\n').encode())
+    await pipe.finish()
+
+@api_router.post("/ftp/batch/{session_id}")
+async def run_ftp_batch(session_id: str, batch_request: FTPBatchRequest):
+    """Run many delete, rename, mkdir and stat operations in one request.
+
+    Results are streamed as newline-delimited JSON as they complete, each
+    carrying the index of its operation, followed by a summary line.
+    """
+    if session_id not in ftp_manager.connections:
+        raise HTTPException(status_code=400, detail="No active FTP connection")
+    if len(batch_request.operations) > FTP_BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {FTP_BATCH_MAX_OPERATIONS} operations per batch")
+    
+    loop = asyncio.get_event_loop()
+    pipe = ChunkPipe(loop, DOWNLOAD_QUEUE_CHUNKS)
+    spawn(_pump_batch(session_id, batch_request, pipe))
     
-    if success and file_buffer:
-        def generate():
-            file_buffer.seek(0)
+    async def generate():
+        try:
             while True:
-                chunk = file_buffer.read(8192)  # Read in 8KB chunks
-                if not chunk:
+                line = await pipe.get()
+                if line is None:
                     break
+                yield line
+        finally:
+            pipe.close()
+    
+    return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+async def _pump_archive(session_id: str, path: str, archive_format: str, prefetch: int, pipe: ChunkPipe):
+    """Build a directory archive, feeding its bytes into ``pipe``."""
+    
+    async def write_chunk(data: bytes) -> bool:
+        return await pipe.put(data) if data else not pipe.closed
+    
+    success, message = await ftp_manager.download_directory(session_id, path, archive_format, write_chunk, prefetch)
+    await pipe.finish(None if success else FTPTransferError(message))
+
+@api_router.get("/ftp/archive/{session_id}")
+async def download_directory_archive(session_id: str, path: str = None, format: str = 'zip', prefetch: int = None):
+    """Download a directory tree as a ZIP or tar archive streamed while it is fetched"""
+    writer_class = ARCHIVE_WRITERS.get(format)
+    if writer_class is None:
+        raise HTTPException(status_code=400, detail=f"Unknown archive format '{format}'")
+    prefetch = min(max(FTP_ARCHIVE_PREFETCH if prefetch is None else prefetch, 0), FTP_POOL_MAX_SIZE)
+    
+    loop = asyncio.get_event_loop()
+    pipe = ChunkPipe(loop, DOWNLOAD_QUEUE_CHUNKS)
+    spawn(_pump_archive(session_id, path, format, prefetch, pipe))
+    
+    # Wait for the first bytes so that a missing directory is still a proper HTTP error
+    try:
+        first_chunk = await pipe.get()
+    except FTPTransferError as e:
+        pipe.close()
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def generate():
+        try:
+            chunk = first_chunk
+            while chunk is not None:
                 yield chunk
-        
-        return StreamingResponse(
-            generate(),
-            media_type='application/octet-stream',
-            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+                chunk = await pipe.get()
+        finally:
+            pipe.close()
+    
+    connection = ftp_manager.connections.get(session_id)
+    base = posixpath.basename(remote_path(connection['current_path'], path or '.')) if connection else ''
+    return StreamingResponse(
+        generate(),
+        media_type=writer_class.media_type,
+        headers={'Content-Disposition': f'attachment; filename="{base or "root"}.{writer_class.extension}"'}
+    )
+
+_BYTE_RANGE_RE = re.compile(r'^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$', re.IGNORECASE)
+
+def parse_byte_range(header: str, size: int):
+    """Resolve a ``Range`` header to inclusive ``(start, end)`` offsets.
+
+    Returns None when the header should be ignored (malformed, not in bytes
+    or asking for several ranges) and raises ValueError when the range lies
+    outside the file.
+    """
+    match = _BYTE_RANGE_RE.match(header)
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError(header)
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    return start, min(int(last), size - 1) if last else size - 1
+
+@api_router.put("/ftp/extract/{session_id}", response_model=FTPExtractResponse)
+async def extract_archive_to_ftp(session_id: str, request: Request, path: str = None, format: str = 'auto',
+                                 parallel: int = 1):
+    """Expand a tar or ZIP request body into a remote directory tree as it is received"""
+    parallel = min(max(parallel, 1), FTP_POOL_MAX_SIZE)
+    success, message, progress = await ftp_manager.extract_archive(session_id, path, format, request.stream(), parallel)
+    
+    if success:
+        return FTPExtractResponse(status="success", message=message, **progress)
+    else:
+        raise HTTPException(status_code=400, detail=message)
+
+@api_router.get("/ftp/extract/{session_id}", response_model=List[FTPExtractProgress])
+async def get_ftp_extract_progress(session_id: str):
+    """Report the progress of the archive extractions running on a session"""
+    return [
+        FTPExtractProgress(**progress)
+        for progress in ftp_manager.extractions.values()
+        if progress['session_id'] == session_id
+    ]
+
+def _parse_time_bound(value: str, name: str):
+    """Parse an ISO 8601 query parameter to a UTC timestamp; naive values are taken as UTC."""
+    if value is None:
+        return None
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be an ISO 8601 date or time")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+async def _pump_find(session_id: str, path: str, matches, max_depth: int, limit: int, parallel: int,
+                     pipe: ChunkPipe):
+    """Run a search, feeding one JSON line per match into ``pipe``."""
+    
+    async def emit(entry_path: str, info: FTPFileInfo, depth: int) -> bool:
+        result = {'path': entry_path, 'depth': depth, **info.model_dump()}
+        return await pipe.put((json.dumps(result) + '\n').encode())
+    
+    success, message = await ftp_manager.find_files(session_id, path, matches, emit, max_depth, limit, parallel)
+    summary = {'done': True, 'status': "success" if success else "error", 'message': message}
+    await pipe.put((json.dumps(summary) + '\n').encode())
+    await pipe.finish()
+
+@api_router.get("/ftp/find/{session_id}")
+async def find_ftp_files(session_id: str, path: str = None, pattern: str = None, regex: str = None,
+                         type: str = None, min_size: int = None, max_size: int = None,
+                         modified_after: str = None, modified_before: str = None, ignore_case: bool = False,
+                         max_depth: int = None, limit: int = None, parallel: int = None):
+    """Search a remote tree by name, type, size and modification time.
+
+    The tree is crawled breadth first over several pooled connections and
+    matches are streamed as newline-delimited JSON while the crawl runs,
+    followed by a summary line.
+    """
+    if session_id not in ftp_manager.connections:
+        raise HTTPException(status_code=400, detail="No active FTP connection")
+    if type not in (None, 'file', 'directory'):
+        raise HTTPException(status_code=400, detail="type must be 'file' or 'directory'")
+    try:
+        matches = build_file_filter(
+            pattern, regex, type, min_size, max_size,
+            _parse_time_bound(modified_after, 'modified_after'),
+            _parse_time_bound(modified_before, 'modified_before'),
+            ignore_case
+        )
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid pattern: {str(e)}")
+    parallel = min(max(parallel or ftp_manager.connections[session_id]['pool'].max_size, 1), FTP_POOL_MAX_SIZE)
+    
+    loop = asyncio.get_event_loop()
+    pipe = ChunkPipe(loop, DOWNLOAD_QUEUE_CHUNKS)
+    spawn(_pump_find(session_id, path, matches, max_depth, limit, parallel, pipe))
+    
+    async def generate():
+        try:
+            while True:
+                line = await pipe.get()
+                if line is None:
+                    break
+                yield line
+        finally:
+            pipe.close()
+    
+    return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+@api_router.post("/ftp/index/{session_id}", response_model=FTPIndexResponse)
+async def index_ftp_tree(session_id: str, index_request: FTPIndexRequest):
+    """Crawl a remote tree into the metadata index, rewriting only directories that changed"""
+    connection = ftp_manager.connections.get(session_id)
+    parallel = index_request.parallel or (connection['pool'].max_size if connection else 1)
+    success, message, summary = await ftp_manager.index_tree(
+        session_id,
+        index_request.path,
+        index_request.max_depth,
+        min(max(parallel, 1), FTP_POOL_MAX_SIZE)
+    )
+    
+    if success:
+        return FTPIndexResponse(status="success", message=message, **summary)
+    else:
+        raise HTTPException(status_code=400, detail=message)
+
+@api_router.get("/ftp/index/{session_id}/list", response_model=FTPIndexListResponse)
+async def list_indexed_files(session_id: str, path: str = None):
+    """List a directory from the metadata index without contacting the FTP server"""
+    success, message, documents, current_path, indexed_at = await ftp_manager.indexed_listing(session_id, path)
+    
+    if success:
+        return FTPIndexListResponse(
+            files=[index_entry(document) for document in documents],
+            current_path=current_path,
+            status="success",
+            indexed=indexed_at is not None,
+            stale_seconds=round((datetime.utcnow() - indexed_at).total_seconds(), 3) if indexed_at else None
         )
     else:
         raise HTTPException(status_code=400, detail=message)
 
+@api_router.get("/ftp/index/{session_id}/search", response_model=FTPIndexSearchResponse)
+async def search_indexed_files(session_id: str, path: str = None, pattern: str = None, regex: str = None,
+                               type: str = None, min_size: int = None, max_size: int = None,
+                               modified_after: str = None, modified_before: str = None,
+                               ignore_case: bool = False, limit: int = None):
+    """Search the metadata index by name, type, size and modification time"""
+    if type not in (None, 'file', 'directory'):
+        raise HTTPException(status_code=400, detail="type must be 'file' or 'directory'")
+    query = {}
+    names = [glob_to_regex(pattern)] if pattern else []
+    if regex:
+        names.append(regex)
+    # Reject malformed patterns here rather than as a database error
+    for name in names:
+        try:
+            re.compile(name)
+        except re.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid pattern: {str(e)}")
+    if names:
+        options = 'i' if ignore_case else ''
+        query['$and'] = [{'name': {'$regex': name, '$options': options}} for name in names]
+    if type:
+        query['type'] = type
+    if min_size is not None or max_size is not None:
+        query['size'] = {key: value for key, value in (('$gte', min_size), ('$lte', max_size)) if value is not None}
+    after = _parse_time_bound(modified_after, 'modified_after')
+    before = _parse_time_bound(modified_before, 'modified_before')
+    if after is not None or before is not None:
+        query['mtime'] = {key: value for key, value in (('$gte', after), ('$lte', before)) if value is not None}
+    limit = min(max(limit or FTP_INDEX_SEARCH_LIMIT, 1), FTP_INDEX_SEARCH_LIMIT)
+    
+    success, message, documents = await ftp_manager.search_index(session_id, path, query, limit)
+    
+    if success:
+        return FTPIndexSearchResponse(
+            entries=[index_entry(document) for document in documents],
+            status="success",
+            message=message
+        )
+    else:
+        raise HTTPException(status_code=400, detail=message)
+
+@api_router.delete("/ftp/index/{session_id}", response_model=FTPOperationResponse)
+async def drop_ftp_index(session_id: str):
+    """Remove everything indexed for the session's server"""
+    success, message = await ftp_manager.drop_index(session_id)
+    
+    if success:
+        return FTPOperationResponse(status="success", message=message)
+    else:
+        raise HTTPException(status_code=400, detail=message)
+
+@api_router.post("/ftp/mirror/{session_id}", response_model=FTPMirrorResponse)
+async def mirror_ftp_directory(session_id: str, mirror_request: FTPMirrorRequest):
+    """Sync a local directory below FTP_MIRROR_ROOT with a remote one, transferring only what changed"""
+    connection = ftp_manager.connections.get(session_id)
+    parallel = mirror_request.parallel or FTP_MIRROR_PARALLEL
+    if connection is not None:
+        parallel = min(parallel, max(connection['pool'].max_size, 1))
+    success, message, report = await ftp_manager.mirror(
+        session_id,
+        mirror_request.local_path,
+        mirror_request.remote_path,
+        mirror_request.direction,
+        mirror_request.delete,
+        mirror_request.dry_run,
+        mirror_request.rescan,
+        max(parallel, 1)
+    )
+    
+    if success:
+        return FTPMirrorResponse(
+            status="success",
+            message=message,
+            dry_run=mirror_request.dry_run,
+            actions=[FTPMirrorAction(**entry) for entry in report['actions']],
+            unchanged=report['unchanged'],
+            conflicts=report['conflicts'],
+            bytes=report['bytes'],
+            seconds=round(report['seconds'], 3)
+        )
+    else:
+        raise HTTPException(status_code=400, detail=message)
+
+@api_router.get("/ftp/progress/{session_id}")
+async def stream_ftp_progress(session_id: str):
+    """Stream progress of the session's uploads, downloads and copies as Server-Sent Events.
+
+    Each transfer sends at most one ``progress`` event every
+    FTP_PROGRESS_INTERVAL seconds, with bytes done, rate and ETA, plus a
+    final one with status 'success' or 'error'. A comment line is sent
+    while idle so proxies keep the stream open; it ends with the session.
+    """
+    if session_id not in ftp_manager.connections:
+        raise HTTPException(status_code=400, detail="No active FTP connection")
+    queue = progress_hub.subscribe(session_id)
+    
+    async def generate():
+        try:
+            yield b'retry: 2000\n\n'
+            while session_id in ftp_manager.connections:
+                try:
+                    event = await asyncio.wait_for(queue.get(), PROGRESS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield b': keepalive\n\n'
+                    continue
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n".encode()
+        finally:
+            progress_hub.unsubscribe(session_id, queue)
+    
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@api_router.post("/ftp/jobs/{session_id}", response_model=FTPJob)
+async def submit_ftp_job(session_id: str, job_request: FTPJobRequest):
+    """Queue a background upload, download or copy with this session's server and login"""
+    success, message, job = await ftp_manager.submit_job(
+        session_id,
+        job_request.kind,
+        job_request.remote_path,
+        job_request.local_path,
+        job_request.destination,
+        job_request.priority,
+        job_request.max_attempts
+    )
+    
+    if success:
+        return transfer_job(job)
+    else:
+        raise HTTPException(status_code=400, detail=message)
+
+@api_router.get("/ftp/jobs/{session_id}", response_model=FTPJobListResponse)
+async def list_ftp_jobs(session_id: str, status: str = None):
+    """Unfinished background jobs of this session's login and recently finished ones, newest first"""
+    success, message, jobs = await ftp_manager.list_jobs(session_id, status)
+    
+    if success:
+        return FTPJobListResponse(jobs=[transfer_job(job) for job in jobs])
+    else:
+        raise HTTPException(status_code=400, detail=message)
+
+@api_router.get("/ftp/jobs/{session_id}/{job_id}", response_model=FTPJob)
+async def get_ftp_job(session_id: str, job_id: str):
+    """Current state of a background job"""
+    success, message, job = await ftp_manager.get_job(session_id, job_id)
+    
+    if success:
+        return transfer_job(job)
+    else:
+        raise HTTPException(status_code=404 if session_id in ftp_manager.connections else 400, detail=message)
+
+@api_router.get("/ftp/jobs/{session_id}/{job_id}/events")
+async def watch_ftp_job(session_id: str, job_id: str):
+    """Stream a job's state as newline-delimited JSON, once now and on every change until it finishes"""
+    success, message, job = await ftp_manager.get_job(session_id, job_id)
+    if not success:
+        raise HTTPException(status_code=404 if session_id in ftp_manager.connections else 400, detail=message)
+    queue = transfer_jobs.subscribe(job_id)
+    
+    async def generate():
+        try:
+            state = job
+            while True:
+                yield (transfer_job(state).model_dump_json() + '\n').encode()
+                if state['status'] in TransferJobQueue.TERMINAL:
+                    break
+                state = await queue.get()
+        finally:
+            transfer_jobs.unsubscribe(job_id, queue)
+    
+    return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+@api_router.delete("/ftp/jobs/{session_id}/{job_id}", response_model=FTPOperationResponse)
+async def cancel_ftp_job(session_id: str, job_id: str):
+    """Cancel a queued or running background job"""
+    success, message = await ftp_manager.cancel_job(session_id, job_id)
+    
+    if success:
+        return FTPOperationResponse(status="success", message=message)
+    else:
+        raise HTTPException(status_code=400, detail=message)
+
+async def _pump_download(session_id: str, filename: str, pipe: ChunkPipe, offset: int = 0, length: int = None,
+                         connections: int = 1, segment_size: int = None, algorithm: str = None,
+                         expected_checksum: str = None):
+    """Run a download, feeding its chunks into ``pipe``."""
+    digest = CHECKSUM_ALGORITHMS[algorithm]() if algorithm else None
+    success, message = await ftp_manager.download_file(session_id, filename, pipe.put, offset, length,
+                                                       connections, segment_size, digest, expected_checksum)
+    if success and digest is not None:
+        logger.info(f"Downloaded '{filename}' with {algorithm} {digest.hexdigest()}"
+                    + (" (verified)" if expected_checksum else ""))
+    await pipe.finish(None if success else FTPTransferError(message))
+
+@api_router.get("/ftp/download/{session_id}/{filename}")
+async def download_file_from_ftp(session_id: str, filename: str, request: Request,
+                                 connections: int = None, segment_size: int = None, checksum: str = None):
+    """Download a file from FTP server, honouring a single byte range.
+
+    ``connections`` above one fetches large files as parallel segments of
+    ``segment_size`` bytes; both default to the FTP_SEGMENT_* settings.
+    Whole-file downloads are digested with ``checksum`` (default
+    FTP_TRANSFER_CHECKSUM) as they stream. When the server can compute the
+    same checksum it is sent as an X-Checksum-* header up front and a
+    mismatch aborts the response before its last chunk.
+    """
+    algorithm = _checksum_param(checksum)
+    status_code = 200
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"', 'Accept-Ranges': 'bytes'}
+    offset, length = 0, None
+    connections = min(max(connections or FTP_SEGMENT_CONNECTIONS, 1), FTP_SEGMENT_MAX_CONNECTIONS)
+    if segment_size is not None and segment_size < TRANSFER_CHUNK_SIZE:
+        raise HTTPException(status_code=400, detail=f"segment_size must be at least {TRANSFER_CHUNK_SIZE} bytes")
+    
+    range_header = request.headers.get('range')
+    if range_header or connections > 1:
+        success, message, size = await ftp_manager.file_size(session_id, filename)
+        if not success:
+            raise HTTPException(status_code=400, detail=message)
+        if size is not None:
+            length = size
+            headers['Content-Length'] = str(size)
+    if range_header:
+        try:
+            byte_range = parse_byte_range(range_header, size) if size is not None else None
+        except ValueError:
+            raise HTTPException(
+                status_code=416,
+                detail=f"Range not satisfiable for '{filename}' ({size} bytes)",
+                headers={'Content-Range': f'bytes */{size}'}
+            )
+        if byte_range is not None:
+            start, end = byte_range
+            offset, length = start, end - start + 1
+            status_code = 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+            headers['Content-Length'] = str(length)
+    
+    # A byte range has no checksum to compare with, so only whole files are digested
+    expected_checksum = None
+    if algorithm and status_code == 200:
+        success, message, expected_checksum, _, _ = await ftp_manager.file_checksum(
+            session_id, filename, algorithm, allow_download=False
+        )
+        if not success:
+            raise HTTPException(status_code=400, detail=message)
+        if expected_checksum is not None:
+            headers[f'X-Checksum-{algorithm.upper()}'] = expected_checksum
+    elif algorithm:
+        algorithm = None
+    
+    loop = asyncio.get_event_loop()
+    pipe = ChunkPipe(loop, DOWNLOAD_QUEUE_CHUNKS)
+    spawn(_pump_download(session_id, filename, pipe, offset, length, connections, segment_size,
+                         algorithm, expected_checksum))
+    
+    # Wait for the first chunk so that errors like a missing file still
+    # produce a proper HTTP error instead of an empty 200 response
+    try:
+        first_chunk = await pipe.get()
+    except FTPTransferError as e:
+        pipe.close()
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def generate():
+        try:
+            chunk = first_chunk
+            while chunk is not None:
+                yield chunk
+                chunk = await pipe.get()
+        finally:
+            pipe.close()
+    
+    return StreamingResponse(
+        generate(),
+        status_code=status_code,
+        media_type='application/octet-stream',
+        headers=headers
+    )
+
 @api_router.post("/ftp/change-directory/{session_id}")
 async def change_ftp_directory(session_id: str, path: str = Form(...)):
     """Change current directory on FTP server"""
-    loop = asyncio.get_event_loop()
-    success, message = await loop.run_in_executor(
-        executor,
-        ftp_manager.change_directory,
+    success, message = await ftp_manager.change_directory(
         session_id,
         path
     )
@@ -413,10 +5283,7 @@ async def change_ftp_directory(session_id: str, path: str = Form(...)):
 @api_router.delete("/ftp/delete/{session_id}/{filename}")
 async def delete_ftp_file(session_id: str, filename: str):
     """Delete a file or directory from FTP server"""
-    loop = asyncio.get_event_loop()
-    success, message = await loop.run_in_executor(
-        executor,
-        ftp_manager.delete_file,
+    success, message = await ftp_manager.delete_file(
         session_id,
         filename
     )
@@ -426,10 +5293,7 @@ async def delete_ftp_file(session_id: str, filename: str):
 @api_router.put("/ftp/rename/{session_id}")
 async def rename_ftp_file(session_id: str, rename_request: FTPRenameRequest):
     """Rename a file or directory on FTP server"""
-    loop = asyncio.get_event_loop()
-    success, message = await loop.run_in_executor(
-        executor,
-        ftp_manager.rename_file,
+    success, message = await ftp_manager.rename_file(
         session_id,
         rename_request.old_name,
         rename_request.new_name
@@ -440,16 +5304,69 @@ async def rename_ftp_file(session_id: str, rename_request: FTPRenameRequest):
 @api_router.post("/ftp/create-directory/{session_id}")
 async def create_ftp_directory(session_id: str, directory_request: FTPCreateDirectoryRequest):
     """Create a new directory on FTP server"""
-    loop = asyncio.get_event_loop()
-    success, message = await loop.run_in_executor(
-        executor,
-        ftp_manager.create_directory,
+    success, message = await ftp_manager.create_directory(
         session_id,
         directory_request.directory_name
     )
     
     return FTPOperationResponse(status="success" if success else "error", message=message)
 
+@api_router.get("/ftp/pool/stats", response_model=FTPPoolStats)
+async def get_ftp_pool_stats():
+    """Report reuse statistics of the shared pool of logged-in connections"""
+    return FTPPoolStats(
+        **connection_pool.stats(),
+        sessions=len(ftp_manager.connections),
+        sessions_evicted=ftp_manager.evicted,
+        sessions_reaped=ftp_manager.reaped
+    )
+
+@app.get("/metrics")
+async def get_metrics():
+    """Expose FTP latency, throughput and pool metrics in the Prometheus text format"""
+    sessions = list(ftp_manager.connections.values())
+    gauges = [
+        ('ftp_sessions', "Open FTP sessions", len(sessions)),
+        ('ftp_sessions_busy', "Sessions with an operation queued or running", sum(c['pool'].busy for c in sessions)),
+        ('ftp_command_queue_depth', "Operations queued or running on session control connections",
+         sum(c['ftp'].queue_depth for c in sessions)),
+        ('ftp_pool_connections', "Connections held by session pools", sum(c['pool'].size for c in sessions)),
+        ('ftp_pool_connections_in_use', "Session pool connections checked out for transfers",
+         sum(c['pool'].in_use for c in sessions)),
+        ('ftp_shared_pool_idle_connections', "Logged-in connections waiting in the shared pool",
+         connection_pool.idle_count),
+        ('ftp_executor_queue_depth', "Tasks waiting for a thread of the shared executor", executor.queued),
+        ('ftp_executor_busy_threads', "Shared executor threads running a task", executor.busy),
+        ('ftp_resumable_uploads', "Resumable uploads in progress", len(ftp_manager.uploads)),
+    ]
+    counters = [
+        ('ftp_sessions_evicted_total', "Sessions closed to stay within the session caps", ftp_manager.evicted),
+        ('ftp_sessions_reaped_total', "Sessions closed after sitting idle", ftp_manager.reaped),
+        ('ftp_shared_pool_hits_total', "Connections reused from the shared pool", connection_pool.hits),
+        ('ftp_shared_pool_misses_total', "Connections opened because the shared pool had none", connection_pool.misses),
+    ]
+    return PlainTextResponse(metrics.render(gauges, counters), media_type='text/plain; version=0.0.4')
+
+@api_router.get("/ftp/session/{session_id}", response_model=FTPSessionStatus)
+async def get_ftp_session_status(session_id: str):
+    """Report the state of an FTP session, including its pending command count"""
+    connection = ftp_manager.connections.get(session_id)
+    if connection is None:
+        raise HTTPException(status_code=404, detail="No active FTP connection")
+    
+    return FTPSessionStatus(
+        session_id=session_id,
+        host=connection['host'],
+        username=connection['username'],
+        engine=connection['ftp'].engine,
+        current_path=connection['current_path'],
+        queue_depth=connection['ftp'].queue_depth,
+        pool_size=connection['pool'].max_size,
+        pool_connections=connection['pool'].size,
+        pool_in_use=connection['pool'].in_use,
+        idle_seconds=round(time.monotonic() - connection['last_used'], 3)
+    )
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -468,12 +5385,53 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def bind_db_client():
+    # Motor ties a client to the event loop that first uses it; a later app
+    # lifespan in the same process runs on a new loop and needs a new client
+    global client, db, metadata_index
+    if client.io_loop is asyncio.get_running_loop():
+        return
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ['DB_NAME']]
+    if metadata_index is not None:
+        metadata_index = MetadataIndex(db, FTP_INDEX_BATCH_SIZE, FTP_INDEX_SEARCH_TIMEOUT)
+    if transfer_jobs.collection is not None:
+        transfer_jobs.collection = db.ftp_jobs
+
+@app.on_event("startup")
+async def start_session_reaper():
+    ftp_manager.start_reaper(FTP_SESSION_REAP_INTERVAL)
+
+@app.on_event("startup")
+async def create_metadata_indexes():
+    if metadata_index is not None:
+        try:
+            await metadata_index.ensure_indexes()
+        except Exception as e:
+            logger.warning(f"Could not create metadata index collections: {str(e)}")
+
+async def _restore_transfer_jobs():
+    try:
+        await transfer_jobs.restore()
+    except Exception as e:
+        logger.warning(f"Could not restore background transfer jobs: {str(e)}")
+
+@app.on_event("startup")
+async def start_transfer_jobs():
+    transfer_jobs.start()
+    # An unreachable MongoDB takes a server selection timeout to fail, so don't hold up startup for it
+    spawn(_restore_transfer_jobs())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    ftp_manager.stop_reaper()
+    await transfer_jobs.stop()
     # Close all FTP connections
     for session_id in list(ftp_manager.connections.keys()):
         try:
-            ftp_manager.disconnect(session_id)
+            await ftp_manager.disconnect(session_id)
         except:
             pass
+    await connection_pool.close()
     client.close()
\ No newline at end of file
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the FTP API endpoints
+Runs a local pyftpdlib server on a temporary directory and the FastAPI app in-process,
+then measures latency percentiles and throughput across file sizes, directory sizes
+and concurrency levels, optionally comparing against a stored baseline
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.servers import ThreadedFTPServer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+# The app connects to MongoDB lazily; none of the FTP endpoints touch it
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "ftp_benchmark")
+
+import server  # noqa: E402
+
+USERNAME = "bench"
+PASSWORD = "bench"
+
+
+def start_ftp_server(root: str) -> tuple:
+    """Serve ``root`` on a free local port; returns the server and its port."""
+    authorizer = DummyAuthorizer()
+    authorizer.add_user(USERNAME, PASSWORD, root, perm="elradfmwMT")
+    handler = type("BenchmarkHandler", (FTPHandler,), {"authorizer": authorizer})
+    ftp_server = ThreadedFTPServer(("127.0.0.1", 0), handler)
+    ftp_server.max_cons = 512
+    threading.Thread(target=ftp_server.serve_forever, kwargs={"handle_exit": False}, daemon=True).start()
+    return ftp_server, ftp_server.socket.getsockname()[1]
+
+
+def populate(root: str, file_sizes: list, directory_sizes: list):
+    for size in file_sizes:
+        os.makedirs(os.path.join(root, "files"), exist_ok=True)
+        with open(os.path.join(root, "files", f"{size}.bin"), "wb") as f:
+            f.write(os.urandom(size))
+    for entries in directory_sizes:
+        directory = os.path.join(root, "dirs", str(entries))
+        os.makedirs(directory)
+        for i in range(entries):
+            open(os.path.join(directory, f"entry_{i:07d}.dat"), "wb").close()
+    os.makedirs(os.path.join(root, "work"))
+
+
+def percentile(samples: list, fraction: float) -> float:
+    """Nearest-rank percentile of already sorted ``samples``."""
+    return samples[max(math.ceil(fraction * len(samples)) - 1, 0)]
+
+
+class Bench:
+    def __init__(self, client: httpx.AsyncClient, port: int, engine: str):
+        self.client = client
+        self.port = port
+        self.engine = engine
+
+    async def connect(self, directory: str = None) -> str:
+        response = await self.client.post("/api/ftp/connect", json={
+            "host": "127.0.0.1", "port": self.port, "username": USERNAME, "password": PASSWORD,
+            "engine": self.engine,
+        })
+        response.raise_for_status()
+        session_id = response.json()["session_id"]
+        if directory:
+            response = await self.client.post(f"/api/ftp/change-directory/{session_id}", data={"path": directory})
+            response.raise_for_status()
+        return session_id
+
+    async def disconnect(self, session_id: str):
+        await self.client.post(f"/api/ftp/disconnect/{session_id}")
+
+    async def measure(self, name: str, operation, concurrency: int, requests: int, size: int = 0,
+                      directory: str = None) -> dict:
+        """Run ``operation(session_id, worker, number)`` ``requests`` times over ``concurrency`` sessions.
+
+        Every worker has its own session and runs one untimed request first.
+        ``size`` is the number of payload bytes per request, for throughput.
+        """
+        sessions = [await self.connect(directory) for _ in range(concurrency)]
+        for worker, session_id in enumerate(sessions):
+            await operation(session_id, worker, -1)
+        latencies = []
+        counter = iter(range(requests))
+
+        async def worker_loop(worker: int, session_id: str):
+            for number in counter:
+                start = time.perf_counter()
+                await operation(session_id, worker, number)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker_loop(worker, session_id) for worker, session_id in enumerate(sessions)))
+        elapsed = time.perf_counter() - start
+        for session_id in sessions:
+            await self.disconnect(session_id)
+
+        latencies.sort()
+        result = {
+            "name": f"{self.engine}/{name}/c{concurrency}",
+            "engine": self.engine,
+            "operation": name,
+            "concurrency": concurrency,
+            "requests": len(latencies),
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "requests_per_second": round(len(latencies) / elapsed, 1),
+        }
+        if size:
+            result["mb_per_second"] = round(size * len(latencies) / elapsed / 1e6, 2)
+        print(f"{result['name']:<40} p50 {result['p50_ms']:>9.3f} ms  p99 {result['p99_ms']:>9.3f} ms  "
+              f"{result['requests_per_second']:>8.1f} req/s"
+              + (f"  {result['mb_per_second']:>8.2f} MB/s" if size else ""))
+        return result
+
+
+def checked(response: httpx.Response) -> httpx.Response:
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.request.method} {response.request.url.path}: "
+                           f"{response.status_code} {response.text[:200]}")
+    return response
+
+
+async def run_engine(client: httpx.AsyncClient, port: int, engine: str, args) -> list:
+    bench = Bench(client, port, engine)
+    results = []
+    for concurrency in args.concurrency:
+        async def connect(session_id, worker, number):
+            await bench.disconnect(await bench.connect())
+        results.append(await bench.measure("connect", connect, concurrency, args.requests))
+
+        for entries in args.entries:
+            async def list_directory(session_id, worker, number, entries=entries):
+                checked(await client.get(f"/api/ftp/list/{session_id}",
+                                         params={"path": f"/dirs/{entries}", "refresh": True}))
+            results.append(await bench.measure(f"list/{entries}", list_directory, concurrency, args.requests))
+
+            async def list_cached(session_id, worker, number, entries=entries):
+                checked(await client.get(f"/api/ftp/list/{session_id}", params={"path": f"/dirs/{entries}"}))
+            results.append(await bench.measure(f"list_cached/{entries}", list_cached, concurrency, args.requests))
+
+        for size in args.sizes:
+            async def download(session_id, worker, number, size=size):
+                response = checked(await client.get(f"/api/ftp/download/{session_id}/{size}.bin"))
+                assert len(response.content) == size
+            results.append(await bench.measure(f"download/{size}", download, concurrency, args.requests,
+                                               size, "/files"))
+
+            payload = os.urandom(size)
+
+            async def upload(session_id, worker, number, payload=payload):
+                checked(await client.put(f"/api/ftp/upload-stream/{session_id}/{engine}_{worker}.bin",
+                                         content=payload))
+            results.append(await bench.measure(f"upload/{size}", upload, concurrency, args.requests,
+                                               size, "/work"))
+
+        async def metadata(session_id, worker, number):
+            name = f"{engine}_{concurrency}_{worker}_{number}"
+            checked(await client.post(f"/api/ftp/create-directory/{session_id}", json={"directory_name": name}))
+            checked(await client.put(f"/api/ftp/rename/{session_id}",
+                                     json={"old_name": name, "new_name": name + "_renamed"}))
+            checked(await client.delete(f"/api/ftp/delete/{session_id}/{name}_renamed"))
+        results.append(await bench.measure("mkdir_rename_delete", metadata, concurrency, args.requests,
+                                           directory="/work"))
+    return results
+
+
+async def run(args) -> list:
+    with tempfile.TemporaryDirectory() as root:
+        populate(root, args.sizes, args.entries)
+        ftp_server, port = start_ftp_server(root)
+        try:
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300) as client:
+                results = []
+                for engine in args.engine:
+                    results.extend(await run_engine(client, port, engine, args))
+            for session_id in list(server.ftp_manager.connections):
+                await server.ftp_manager.disconnect(session_id)
+            await server.connection_pool.close()
+        finally:
+            ftp_server.close_all()
+    return results
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """Names of results that got slower or lost throughput by more than ``tolerance``."""
+    previous = {result["name"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(result["name"])
+        if old is None:
+            continue
+        changes = []
+        for key in ("p50_ms", "p99_ms"):
+            if old.get(key) and result[key] > old[key] * (1 + tolerance):
+                changes.append(f"{key} {old[key]} -> {result[key]}")
+        for key in ("requests_per_second", "mb_per_second"):
+            if old.get(key) and key in result and result[key] < old[key] * (1 - tolerance):
+                changes.append(f"{key} {old[key]} -> {result[key]}")
+        if changes:
+            regressions.append(result["name"])
+            print(f"REGRESSION {result['name']}: {', '.join(changes)}")
+    return regressions
+
+
+def int_list(value: str) -> list:
+    return [int(item) for item in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--engine", choices=sorted(server.FTP_ENGINES), action="append",
+                        help="limit to these engines")
+    parser.add_argument("--sizes", type=int_list, default=[64 * 1024, 1024 * 1024, 16 * 1024 * 1024],
+                        help="comma-separated file sizes in bytes")
+    parser.add_argument("--entries", type=int_list, default=[100, 1000, 10000],
+                        help="comma-separated directory sizes in entries")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 4, 16],
+                        help="comma-separated numbers of concurrent sessions")
+    parser.add_argument("--requests", type=int, default=50, help="timed requests per scenario")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against results written by --json")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="relative slowdown tolerated before a result counts as a regression")
+    args = parser.parse_args()
+    args.engine = args.engine or sorted(server.FTP_ENGINES)
+    logging.getLogger("pyftpdlib").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    results = asyncio.run(run(args))
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        print(f"{len(regressions)} regressions against {args.baseline}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
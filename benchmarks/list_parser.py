@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the FTP directory listing parsers
+Parses synthetic listings (1M lines by default) in every supported format
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from server import parse_list_lines, parse_mlsd_lines  # noqa: E402
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+def unix_listing(count: int) -> list:
+    lines = ["total %d" % count]
+    for i in range(count):
+        kind = "d" if i % 10 == 0 else "-"
+        when = "%s %2d %02d:%02d" % (MONTHS[i % 12], i % 28 + 1, i % 24, i % 60) if i % 3 else "%s %2d  2021" % (MONTHS[i % 12], i % 28 + 1)
+        lines.append("%srw-r--r--   1 ftpuser  ftpgroup %12d %s file_%07d.dat" % (kind, i * 37, when, i))
+    return lines
+
+
+def dos_listing(count: int) -> list:
+    lines = []
+    for i in range(count):
+        size = "<DIR>         " if i % 10 == 0 else "%14d" % (i * 37)
+        lines.append("%02d-%02d-24  %02d:%02dPM       %s file_%07d.dat" % (i % 12 + 1, i % 28 + 1, i % 12 + 1, i % 60, size, i))
+    return lines
+
+
+def eplf_listing(count: int) -> list:
+    lines = []
+    for i in range(count):
+        kind = "/" if i % 10 == 0 else "r,s%d" % (i * 37)
+        lines.append("+i%d.%d,m%d,%s,\tfile_%07d.dat" % (i, i, 1600000000 + i, kind, i))
+    return lines
+
+
+def mlsd_listing(count: int) -> list:
+    lines = ["type=cdir;modify=20240101000000;perm=el; ."]
+    for i in range(count):
+        kind = "dir" if i % 10 == 0 else "file"
+        lines.append("type=%s;size=%d;modify=202401%02d%02d%02d%02d;perm=r; file_%07d.dat" % (kind, i * 37, i % 28 + 1, i % 24, i % 60, i % 60, i))
+    return lines
+
+
+FORMATS = {
+    "unix": (unix_listing, parse_list_lines),
+    "dos": (dos_listing, parse_list_lines),
+    "eplf": (eplf_listing, parse_list_lines),
+    "mlsd": (mlsd_listing, parse_mlsd_lines),
+}
+
+
+def run(formats: list, count: int, repeat: int) -> list:
+    results = []
+    for name in formats:
+        generate, parse = FORMATS[name]
+        lines = generate(count)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            entries = parse(lines)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        results.append({
+            "format": name,
+            "lines": len(lines),
+            "entries": len(entries),
+            "best_seconds": round(best, 4),
+            "lines_per_second": int(len(lines) / best),
+            "us_per_line": round(best * 1e6 / len(lines), 3),
+        })
+        print(f"{name:>5}: {len(lines):>9} lines in {best:.3f}s "
+              f"({results[-1]['lines_per_second']:,} lines/s, {results[-1]['us_per_line']} us/line)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=1_000_000, help="entries per listing")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per format, the best is reported")
+    parser.add_argument("--format", choices=sorted(FORMATS), action="append", help="limit to these formats")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.format or list(FORMATS), args.lines, args.repeat)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
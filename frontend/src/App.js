@@ -23,6 +23,7 @@ function App() {
   const [renameFile, setRenameFile] = useState({ oldName: '', newName: '' });
   const [showCreateDirModal, setShowCreateDirModal] = useState(false);
   const [newDirectoryName, setNewDirectoryName] = useState('');
+  const [transfers, setTransfers] = useState({});
 
   // Show message helper
   const showMessage = (text, type = 'info') => {
@@ -31,6 +32,34 @@ function App() {
     setTimeout(() => setMessage(''), 5000);
   };
 
+  // Follow transfer progress of the session over Server-Sent Events
+  useEffect(() => {
+    if (!sessionId) return;
+    
+    const source = new EventSource(`${API}/ftp/progress/${sessionId}`);
+    source.addEventListener('progress', (e) => {
+      const progress = JSON.parse(e.data);
+      setTransfers((previous) => ({ ...previous, [progress.transfer_id]: progress }));
+      if (progress.status !== 'running') {
+        setTimeout(() => setTransfers((previous) => {
+          const { [progress.transfer_id]: _, ...rest } = previous;
+          return rest;
+        }), 3000);
+      }
+    });
+    
+    return () => {
+      source.close();
+      setTransfers({});
+    };
+  }, [sessionId]);
+
+  const formatBytes = (bytes) => {
+    if (bytes >= 1024 * 1024 * 1024) return `${(bytes / (1024 * 1024 * 1024)).toFixed(1)} Go`;
+    if (bytes >= 1024 * 1024) return `${(bytes / (1024 * 1024)).toFixed(1)} Mo`;
+    return `${(bytes / 1024).toFixed(1)} Ko`;
+  };
+
   // Connect to FTP server
   const connectToFTP = async (e) => {
     e.preventDefault();
@@ -455,6 +484,45 @@ function App() {
           </div>
         </div>
 
+        {/* Transfer Progress */}
+        {Object.keys(transfers).length > 0 && (
+          <div className="glass-card p-6 mb-6">
+            <h2 className="text-xl font-semibold text-white mb-4">⏳ Transferts en cours</h2>
+            <div className="space-y-4">
+              {Object.values(transfers).map((transfer) => {
+                const percent = transfer.total ? Math.min(100, (transfer.bytes / transfer.total) * 100) : null;
+                return (
+                  <div key={transfer.transfer_id}>
+                    <div className="flex justify-between text-sm mb-1">
+                      <span className="text-white">
+                        {transfer.operation === 'upload' ? '📤' : transfer.operation === 'download' ? '📥' : '📋'} {transfer.name}
+                      </span>
+                      <span className="text-gray-400">
+                        {formatBytes(transfer.bytes)}
+                        {transfer.total ? ` / ${formatBytes(transfer.total)}` : ''}
+                        {transfer.status === 'running' && ` · ${formatBytes(transfer.bytes_per_second)}/s`}
+                        {transfer.status === 'running' && transfer.eta !== null && ` · ${Math.ceil(transfer.eta)} s restantes`}
+                        {transfer.status === 'success' && ' · terminé'}
+                        {transfer.status === 'error' && ' · échec'}
+                      </span>
+                    </div>
+                    <div className="w-full bg-gray-700 rounded-full h-2">
+                      <div
+                        className={`h-2 rounded-full transition-all duration-300 ${
+                          transfer.status === 'error' ? 'bg-red-500' :
+                          transfer.status === 'success' ? 'bg-green-500' :
+                          'bg-purple-500'
+                        } ${percent === null && transfer.status === 'running' ? 'animate-pulse' : ''}`}
+                        style={{ width: `${percent === null ? 100 : percent}%` }}
+                      />
+                    </div>
+                  </div>
+                );
+              })}
+            </div>
+          </div>
+        )}
+
         {/* Actions Bar */}
         <div className="glass-card p-4 mb-6">
           <div className="flex justify-between items-center">
@@ -0,0 +1,169 @@
+"""Fixtures shared by the backend tests: a throwaway pyftpdlib server and an API client."""
+import errno
+import hashlib
+import logging
+import os
+import sys
+import threading
+
+import pytest
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.filesystems import AbstractedFS
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.servers import ThreadedFTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+logging.getLogger('pyftpdlib').setLevel(logging.WARNING)
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+
+class FailingFile:
+    """Read-only file whose reads fail with EIO once ``limit`` bytes were read."""
+
+    def __init__(self, f, limit: int):
+        self.f = f
+        self.limit = limit
+        self.name = f.name
+
+    def read(self, size=-1):
+        remaining = self.limit - self.f.tell()
+        if remaining <= 0:
+            raise OSError(errno.EIO, "Input/output error")
+        return self.f.read(remaining if size < 0 else min(size, remaining))
+
+    # No fileno(), so the server reads through read() instead of sendfile()
+    def seek(self, offset: int, whence: int = 0):
+        return self.f.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self.f.tell()
+
+    @property
+    def closed(self) -> bool:
+        return self.f.closed
+
+    def close(self):
+        self.f.close()
+
+
+class FTPServerFixture:
+    """A local FTP server rooted in a temporary directory.
+
+    Listings of directories whose name is in ``fail_listing`` are answered
+    with a 425 reply, the way a server out of data ports would. XMD5 answers
+    with the digest listed for a file name in ``checksums``, the real MD5
+    for other files. Downloads of a file named in ``fail_reads`` break with
+    a 426 reply after the number of bytes given there.
+    """
+
+    def __init__(self, root: str):
+        self.root = str(root)
+        self.fail_listing = set()
+        self.checksums = {}
+        self.fail_reads = {}
+        fixture = self
+
+        class FailingFS(AbstractedFS):
+            def open(self, filename, mode):
+                f = super().open(filename, mode)
+                limit = fixture.fail_reads.get(os.path.basename(filename))
+                return f if limit is None or 'r' not in mode else FailingFile(f, limit)
+
+        class Handler(FTPHandler):
+            proto_cmds = dict(FTPHandler.proto_cmds, XMD5={
+                'perm': 'r', 'auth': True, 'arg': True, 'help': 'Syntax: XMD5 <SP> file-name (get MD5 digest).',
+            })
+
+            def _refuse(self, path):
+                if os.path.basename(path.rstrip('/')) in fixture.fail_listing:
+                    self.respond("425 Can't open data connection.")
+                    return True
+                return False
+
+            def ftp_LIST(self, path):
+                if not self._refuse(path):
+                    return super().ftp_LIST(path)
+
+            def ftp_NLST(self, path):
+                if not self._refuse(path):
+                    return super().ftp_NLST(path)
+
+            def ftp_MLSD(self, path):
+                if not self._refuse(path):
+                    return super().ftp_MLSD(path)
+
+            def ftp_FEAT(self, line):
+                self._extra_feats = ['XMD5']
+                return super().ftp_FEAT(line)
+
+            def ftp_XMD5(self, path):
+                if not self.fs.isfile(path):
+                    self.respond("550 No such file.")
+                    return
+                digest = fixture.checksums.get(os.path.basename(path))
+                if digest is None:
+                    with open(path, 'rb') as f:
+                        digest = hashlib.md5(f.read()).hexdigest()
+                self.respond(f"250 {digest}")
+
+        authorizer = DummyAuthorizer()
+        authorizer.add_user('user', 'secret', self.root, perm='elradfmwMT')
+        Handler.authorizer = authorizer
+        Handler.abstracted_fs = FailingFS
+        self.server = ThreadedFTPServer(('127.0.0.1', 0), Handler)
+        self.port = self.server.socket.getsockname()[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'handle_exit': False}, daemon=True)
+
+    def write(self, relative: str, data: bytes = b''):
+        """Create the file ``relative`` below the root, with its parent directories."""
+        path = os.path.join(self.root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+
+@pytest.fixture
+def ftp_server(tmp_path):
+    fixture = FTPServerFixture(tmp_path)
+    fixture.thread.start()
+    yield fixture
+    fixture.server.close_all()
+
+
+@pytest.fixture
+def within():
+    """``within(seconds, function, *args)`` calls ``function`` on a thread, failing rather than hanging."""
+    def call(seconds, function, *args, **kwargs):
+        result = {}
+
+        def run():
+            result['value'] = function(*args, **kwargs)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(seconds)
+        assert not thread.is_alive(), f"no response within {seconds}s"
+        return result['value']
+
+    return call
+
+
+@pytest.fixture(params=['ftplib', 'asyncio'])
+def engine(request):
+    return request.param
+
+
+@pytest.fixture
+def api(ftp_server, engine):
+    """A TestClient with an open session on ``ftp_server``, as ``(client, session_id)``."""
+    from fastapi.testclient import TestClient
+    import server
+
+    with TestClient(server.app) as client:
+        response = client.post('/api/ftp/connect', json={
+            'host': '127.0.0.1', 'port': ftp_server.port, 'username': 'user', 'password': 'secret',
+            'engine': engine, 'pool_size': 3,
+        })
+        assert response.status_code == 200, response.text
+        yield client, response.json()['session_id']
@@ -0,0 +1,120 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from server import TarStreamWriter, ZipStreamWriter, _PipeReader, _tar_members, _zip_members
+
+MTIME = 1700000000
+FILES = {
+    'empty.txt': b'',
+    'docs/readme.txt': b'hello archive\n' * 100,
+    'docs/random.bin': os.urandom(300 * 1024),
+}
+
+
+class ChunkSource:
+    """Stands in for the ChunkPipe a _PipeReader drains, serving fixed chunks."""
+
+    def __init__(self, data: bytes, chunk_size: int = 7001):
+        self.chunks = iter([data[i:i + chunk_size] for i in range(0, len(data), chunk_size)])
+
+    def get_threadsafe(self):
+        return next(self.chunks, None)
+
+
+def build(writer, sizes_known: bool = True) -> bytes:
+    out = [writer.add_directory('docs', MTIME)]
+    for name, data in FILES.items():
+        out.append(writer.begin_file(name, len(data) if sizes_known else None, MTIME))
+        for i in range(0, len(data), 65536):
+            out.append(writer.write(data[i:i + 65536]))
+        out.append(writer.end_file())
+    out.append(writer.close())
+    return b''.join(out)
+
+
+def read_back(members) -> tuple:
+    directories, files = [], {}
+    for name, kind, size, chunks in members:
+        if kind == 'directory':
+            directories.append(name)
+        else:
+            files[name] = b''.join(chunks)
+    return directories, files
+
+
+@pytest.mark.parametrize('sizes_known', [True, False])
+def test_zip_round_trip(sizes_known):
+    archive = build(ZipStreamWriter(), sizes_known)
+
+    with zipfile.ZipFile(io.BytesIO(archive)) as z:
+        assert z.testzip() is None
+        assert {info.filename: z.read(info) for info in z.infolist() if not info.is_dir()} == FILES
+    directories, files = read_back(_zip_members(_PipeReader(ChunkSource(archive))))
+    assert [name.rstrip('/') for name in directories] == ['docs']
+    assert files == FILES
+
+
+def test_tar_round_trip():
+    archive = build(TarStreamWriter())
+
+    assert len(archive) % 512 == 0
+    with tarfile.open(fileobj=io.BytesIO(archive)) as t:
+        assert {m.name: t.extractfile(m).read() for m in t if m.isfile()} == FILES
+    directories, files = read_back(_tar_members(_PipeReader(ChunkSource(archive))))
+    assert [name.rstrip('/') for name in directories] == ['docs']
+    assert files == FILES
+
+
+def test_tar_writer_requires_sizes():
+    assert TarStreamWriter.needs_size and not ZipStreamWriter.needs_size
+
+
+def test_truncated_zip_is_rejected():
+    archive = build(ZipStreamWriter())
+
+    with pytest.raises(ValueError):
+        read_back(_zip_members(_PipeReader(ChunkSource(archive[:len(archive) // 2]))))
+
+
+def link_archive() -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as t:
+        for name, kind in (('hard.txt', tarfile.LNKTYPE), ('soft.txt', tarfile.SYMTYPE)):
+            info = tarfile.TarInfo(name)
+            info.type, info.linkname, info.size = kind, 'docs/readme.txt', len(FILES['docs/readme.txt'])
+            t.addfile(info)
+        info = tarfile.TarInfo('docs/readme.txt')
+        info.size = len(FILES['docs/readme.txt'])
+        t.addfile(info, io.BytesIO(FILES['docs/readme.txt']))
+    return buffer.getvalue()
+
+
+def test_tar_links_have_no_data():
+    members = [(name, kind, size, b''.join(chunks))
+               for name, kind, size, chunks in _tar_members(_PipeReader(ChunkSource(link_archive())))]
+
+    assert members == [
+        ('hard.txt', 'link', 0, b''),
+        ('soft.txt', 'link', 0, b''),
+        ('docs/readme.txt', 'file', len(FILES['docs/readme.txt']), FILES['docs/readme.txt']),
+    ]
+
+
+def test_extraction_skips_tar_links(api, ftp_server):
+    client, session_id = api
+
+    response = client.put(f'/api/ftp/extract/{session_id}', content=link_archive())
+
+    assert response.status_code == 200, response.text
+    assert response.json()['files'] == 1
+    assert response.json()['failures'] == [
+        {'name': 'hard.txt', 'message': "Skipped: links are not supported"},
+        {'name': 'soft.txt', 'message': "Skipped: links are not supported"},
+    ]
+    assert sorted(os.listdir(ftp_server.root)) == ['docs']
+    with open(os.path.join(ftp_server.root, 'docs', 'readme.txt'), 'rb') as f:
+        assert f.read() == FILES['docs/readme.txt']
@@ -0,0 +1,68 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import server
+
+
+def run_batch(client, session_id, operations, parallel=False):
+    response = client.post(f'/api/ftp/batch/{session_id}', json={'operations': operations, 'parallel': parallel})
+    assert response.status_code == 200, response.text
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    return sorted(lines[:-1], key=lambda result: result['index']), lines[-1]
+
+
+@pytest.mark.parametrize('parallel', [False, True])
+def test_batch_reports_every_operation_and_a_summary(api, ftp_server, parallel):
+    client, session_id = api
+    ftp_server.write('old.txt', b'data')
+    ftp_server.write('gone.txt', b'data')
+
+    results, summary = run_batch(client, session_id, [
+        {'op': 'mkdir', 'name': 'new'},
+        {'op': 'rename', 'name': 'new', 'new_name': 'renamed'},
+        {'op': 'rename', 'name': 'old.txt', 'new_name': 'renamed/old.txt'},
+        {'op': 'delete', 'name': 'gone.txt'},
+        {'op': 'stat', 'name': 'renamed/old.txt'},
+        {'op': 'chmod', 'name': 'renamed'},
+        {'op': 'delete', 'name': 'missing.txt'},
+    ], parallel)
+
+    assert [result['status'] for result in results] == ['success'] * 5 + ['error'] * 2
+    assert results[4]['file']['size'] == 4
+    assert results[5] == {'index': 5, 'op': 'chmod', 'name': 'renamed', 'status': 'error',
+                          'message': "Unknown operation 'chmod'"}
+    assert summary == {'done': True, 'status': 'success', 'message': '5 of 7 operations succeeded'}
+    assert sorted(os.listdir(ftp_server.root)) == ['renamed']
+    assert os.listdir(os.path.join(ftp_server.root, 'renamed')) == ['old.txt']
+
+
+def test_batch_on_an_unknown_session_is_rejected(api):
+    client, _ = api
+
+    response = client.post('/api/ftp/batch/unknown', json={'operations': [{'op': 'stat', 'name': 'x'}]})
+
+    assert response.status_code == 400
+
+
+def test_sequential_batch_lets_other_requests_use_the_session(api, ftp_server, monkeypatch):
+    client, session_id = api
+    ftp_server.write('a.txt', b'data')
+    listing = []
+    run_operation = server.ftp_manager._run_operation
+
+    async def operation_next_to_a_listing(connection, ftp, operation):
+        if not listing:
+            # Queued behind this operation on the session's connection
+            listing.append(asyncio.ensure_future(server.ftp_manager.list_files(session_id, refresh=True)))
+        else:
+            assert listing[0].done(), "the batch held the session's connection between operations"
+        return await run_operation(connection, ftp, operation)
+
+    monkeypatch.setattr(server.ftp_manager, '_run_operation', operation_next_to_a_listing)
+    results, summary = run_batch(client, session_id, [{'op': 'stat', 'name': 'a.txt'}] * 2)
+
+    assert summary['status'] == 'success'
+    assert listing[0].result()[0] is True
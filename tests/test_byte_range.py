@@ -0,0 +1,37 @@
+import pytest
+
+from server import parse_byte_range
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-99', (0, 99)),
+    ('bytes=100-', (100, 999)),
+    ('bytes=900-5000', (900, 999)),
+    ('bytes=-100', (900, 999)),
+    ('bytes=-5000', (0, 999)),
+    ('bytes=999-999', (999, 999)),
+])
+def test_satisfiable_ranges(header, expected):
+    assert parse_byte_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize('header', [
+    'bytes=0-1,5-6',
+    'items=0-99',
+    'bytes=-',
+    'bytes=50-10',
+    'garbage',
+])
+def test_ignored_ranges(header):
+    assert parse_byte_range(header, 1000) is None
+
+
+@pytest.mark.parametrize('header, size', [
+    ('bytes=1000-', 1000),
+    ('bytes=1000-1100', 1000),
+    ('bytes=-0', 1000),
+    ('bytes=-10', 0),
+])
+def test_unsatisfiable_ranges(header, size):
+    with pytest.raises(ValueError):
+        parse_byte_range(header, size)
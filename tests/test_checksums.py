@@ -0,0 +1,55 @@
+import hashlib
+import os
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def payload(ftp_server):
+    data = os.urandom(1024 * 1024 + 5)
+    ftp_server.write('data.bin', data)
+    return data
+
+
+def test_download_is_verified_against_the_server_checksum(api, ftp_server, payload):
+    client, session_id = api
+
+    response = client.get(f'/api/ftp/download/{session_id}/data.bin', params={'checksum': 'md5'})
+
+    assert response.status_code == 200, response.text
+    assert response.headers['X-Checksum-MD5'] == hashlib.md5(payload).hexdigest()
+    assert response.content == payload
+
+
+def test_download_with_a_checksum_mismatch_holds_back_its_last_chunk(api, ftp_server, payload):
+    client, session_id = api
+    ftp_server.checksums['data.bin'] = '0' * 32
+    received = bytearray()
+
+    # The response task group hands the test client the error that aborted the stream
+    with pytest.raises(ExceptionGroup) as error:
+        with client.stream('GET', f'/api/ftp/download/{session_id}/data.bin', params={'checksum': 'md5'}) as response:
+            assert response.headers['X-Checksum-MD5'] == '0' * 32
+            for chunk in response.iter_bytes():
+                received += chunk
+
+    assert error.group_contains(server.FTPTransferError, match='Checksum mismatch')
+    assert payload.startswith(received)
+    assert len(received) < len(payload)
+
+
+def test_upload_with_a_checksum_mismatch_fails(api, ftp_server):
+    client, session_id = api
+    data = os.urandom(200 * 1024)
+    ftp_server.checksums['bad.bin'] = '0' * 32
+
+    response = client.put(f'/api/ftp/upload-stream/{session_id}/good.bin', params={'checksum': 'md5'}, content=data)
+    assert response.status_code == 200, response.text
+    assert response.json()['verified'] is True
+    assert response.json()['server_checksum'] == hashlib.md5(data).hexdigest()
+
+    response = client.put(f'/api/ftp/upload-stream/{session_id}/bad.bin', params={'checksum': 'md5'}, content=data)
+    assert response.status_code == 400
+    assert 'Checksum mismatch' in response.json()['detail']
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def source(ftp_server):
+    data = os.urandom(1024 * 1024)
+    ftp_server.write('source.bin', data)
+    return data
+
+
+def read(ftp_server, name: str) -> bytes:
+    with open(os.path.join(ftp_server.root, name), 'rb') as f:
+        return f.read()
+
+
+def test_copy_is_byte_exact(api, ftp_server, source):
+    client, session_id = api
+
+    response = client.post(f'/api/ftp/copy/{session_id}', json={'source': 'source.bin', 'destination': 'copy.bin'})
+
+    assert response.status_code == 200, response.text
+    assert response.json()['bytes'] == len(source)
+    assert read(ftp_server, 'copy.bin') == source
+
+
+@pytest.mark.parametrize('source_name', ['missing.bin', 'source.bin'])
+def test_failed_copy_leaves_no_destination(api, ftp_server, source, source_name):
+    client, session_id = api
+    # The source breaks off with a 426 reply after some of it was relayed
+    ftp_server.fail_reads['source.bin'] = 300 * 1024
+
+    response = client.post(f'/api/ftp/copy/{session_id}', json={'source': source_name, 'destination': 'copy.bin'})
+
+    assert response.status_code == 400
+    assert not os.path.exists(os.path.join(ftp_server.root, 'copy.bin'))
+    # The session stays usable for the next copy
+    del ftp_server.fail_reads['source.bin']
+    response = client.post(f'/api/ftp/copy/{session_id}', json={'source': 'source.bin', 'destination': 'copy.bin'})
+    assert response.status_code == 200, response.text
+    assert read(ftp_server, 'copy.bin') == source
@@ -0,0 +1,29 @@
+import json
+
+
+def test_find_skips_directories_failing_with_4xx(api, ftp_server, within):
+    client, session_id = api
+    ftp_server.write('tree/a/one.txt')
+    ftp_server.write('tree/broken/two.txt')
+    ftp_server.write('tree/c/d/three.txt')
+    ftp_server.fail_listing.add('broken')
+
+    # With a single worker, a failure that escaped it would leave /tree/c queued forever
+    response = within(30, client.get, f'/api/ftp/find/{session_id}',
+                      params={'path': '/tree', 'pattern': '*.txt', 'parallel': 1})
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line['path'] for line in lines[:-1]) == ['/tree/a/one.txt', '/tree/c/d/three.txt']
+    assert lines[-1]['message'].endswith('1 unreadable')
+
+
+def test_find_reports_unreadable_root(api, ftp_server, within):
+    client, session_id = api
+    ftp_server.write('broken/one.txt')
+    ftp_server.fail_listing.add('broken')
+
+    response = within(30, client.get, f'/api/ftp/find/{session_id}', params={'path': '/broken'})
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1]['status'] == 'error'
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def payload(ftp_server):
+    data = os.urandom(1536 * 1024 + 123)
+    ftp_server.write('big.bin', data)
+    return data
+
+
+@pytest.fixture
+def pipe_depths(monkeypatch):
+    """Deepest queue seen on each ChunkPipe created while downloading, with one-chunk pipes."""
+    depths = []
+
+    class RecordingPipe(server.ChunkPipe):
+        def __init__(self, loop, maxsize):
+            super().__init__(loop, maxsize)
+            self.index = len(depths)
+            depths.append(0)
+
+        async def put(self, item):
+            result = await super().put(item)
+            depths[self.index] = max(depths[self.index], self.queue.qsize())
+            return result
+
+    monkeypatch.setattr(server, 'DOWNLOAD_QUEUE_CHUNKS', 1)
+    monkeypatch.setattr(server, 'ChunkPipe', RecordingPipe)
+    return depths
+
+
+def test_segmented_download_is_byte_exact(api, payload, pipe_depths):
+    client, session_id = api
+
+    response = client.get(f'/api/ftp/download/{session_id}/big.bin',
+                          params={'connections': 4, 'segment_size': 256 * 1024, 'checksum': 'none'})
+
+    assert response.status_code == 200, response.text
+    assert response.content == payload
+    # Segments fetched ahead of the consumer wait on their pipe instead of buffering
+    assert len(pipe_depths) > 7
+    assert max(pipe_depths) <= 1
+
+
+@pytest.mark.parametrize('connections', [1, 4])
+@pytest.mark.parametrize('start, end', [(0, 0), (100, 300 * 1024), (256 * 1024 - 1, 1024 * 1024 + 7)])
+def test_range_download_is_byte_exact(api, payload, connections, start, end):
+    client, session_id = api
+
+    response = client.get(f'/api/ftp/download/{session_id}/big.bin',
+                          params={'connections': connections, 'segment_size': 256 * 1024},
+                          headers={'Range': f'bytes={start}-{end}'})
+
+    assert response.status_code == 206, response.text
+    assert response.headers['Content-Range'] == f'bytes {start}-{end}/{len(payload)}'
+    assert response.content == payload[start:end + 1]
+
+
+def test_open_ended_range_download_is_byte_exact(api, payload):
+    client, session_id = api
+
+    response = client.get(f'/api/ftp/download/{session_id}/big.bin',
+                          params={'connections': 3, 'segment_size': 256 * 1024},
+                          headers={'Range': 'bytes=-70000'})
+
+    assert response.status_code == 206, response.text
+    assert response.content == payload[-70000:]
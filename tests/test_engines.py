@@ -0,0 +1,111 @@
+import asyncio
+import ftplib
+import os
+from contextlib import aclosing
+
+import pytest
+
+import server
+
+
+def run(ftp_server, engine, scenario):
+    """Run ``scenario(ftp)`` on a fresh connection of ``engine`` to ``ftp_server``, failing rather than hanging."""
+    async def main():
+        ftp = await server.FTP_ENGINES[engine].open('127.0.0.1', ftp_server.port, 'user', 'secret')
+        try:
+            return await scenario(ftp)
+        finally:
+            await ftp.quit()
+
+    return asyncio.run(asyncio.wait_for(main(), 10))
+
+
+async def chunks_of(data: bytes, size: int = 10000):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def fetch(ftp, name: str, rest: int = None) -> bytes:
+    async with aclosing(ftp.retrieve(f'RETR {name}', rest)) as chunks:
+        return b''.join([chunk async for chunk in chunks])
+
+
+def read(ftp_server, name: str) -> bytes:
+    with open(os.path.join(ftp_server.root, name), 'rb') as f:
+        return f.read()
+
+
+def test_retrieve_closed_early_leaves_the_connection_usable(ftp_server, engine):
+    data = os.urandom(2 * 1024 * 1024)
+    ftp_server.write('big.bin', data)
+
+    async def scenario(ftp):
+        async with aclosing(ftp.retrieve('RETR big.bin', 1000)) as chunks:
+            first = await chunks.__anext__()
+        return first, await ftp.pwd(), await ftp.size('big.bin'), await fetch(ftp, 'big.bin', 5)
+
+    first, directory, size, rest = run(ftp_server, engine, scenario)
+
+    assert data[1000:].startswith(first) and first
+    assert directory == '/'
+    assert size == len(data)
+    assert rest == data[5:]
+
+
+def test_store_and_rename(ftp_server, engine):
+    data = os.urandom(300 * 1024 + 17)
+
+    async def scenario(ftp):
+        await ftp.store('STOR upload.bin', chunks_of(data))
+        await ftp.rename('upload.bin', 'final.bin')
+        return await fetch(ftp, 'final.bin')
+
+    assert run(ftp_server, engine, scenario) == data
+    assert read(ftp_server, 'final.bin') == data
+    assert not os.path.exists(os.path.join(ftp_server.root, 'upload.bin'))
+
+
+def test_error_replies_leave_the_connection_usable(ftp_server, engine):
+    ftp_server.write('present.bin', b'payload')
+
+    async def scenario(ftp):
+        replies = []
+        for operation in (lambda: fetch(ftp, 'missing.bin'), lambda: ftp.delete('missing.bin'),
+                          lambda: ftp.cwd('missing'), lambda: ftp.rename('missing.bin', 'other.bin')):
+            with pytest.raises(ftplib.error_perm) as error:
+                await operation()
+            replies.append(str(error.value)[:3])
+        return replies, await ftp.pwd(), await fetch(ftp, 'present.bin')
+
+    replies, directory, data = run(ftp_server, engine, scenario)
+
+    assert replies == ['550'] * 4
+    assert directory == '/'
+    assert data == b'payload'
+
+
+def test_failed_store_source_leaves_the_connection_usable(ftp_server, engine):
+    async def failing():
+        yield b'x' * 1000
+        raise OSError("source went away")
+
+    async def scenario(ftp):
+        with pytest.raises(server.FTPTransferError):
+            await ftp.store('STOR broken.bin', failing())
+        await ftp.store('STOR good.bin', chunks_of(b'fine'))
+        return await ftp.pwd()
+
+    assert run(ftp_server, engine, scenario) == '/'
+    assert read(ftp_server, 'good.bin') == b'fine'
+
+
+def test_zero_byte_files(ftp_server, engine):
+    ftp_server.write('empty.bin')
+
+    async def scenario(ftp):
+        received = await fetch(ftp, 'empty.bin')
+        await ftp.store('STOR stored.bin', chunks_of(b''))
+        return received, await ftp.size('stored.bin')
+
+    assert run(ftp_server, engine, scenario) == (b'', 0)
+    assert read(ftp_server, 'stored.bin') == b''
@@ -0,0 +1,26 @@
+import fnmatch
+import re
+
+import pytest
+
+from server import glob_to_regex
+
+NAMES = ['report.txt', 'report.TXT', 'report1.txt', 'report12.txt', 'a.b.c', 'notes', '[draft].md', 'x+y(1).txt',
+         'data-7.csv', 'data-x.csv']
+
+
+@pytest.mark.parametrize('pattern', ['*.txt', 'report?.txt', '*', 'a.b.c', 'data-[0-9].csv', 'data-[!0-9].csv',
+                                     'x+y(1).txt', '*.*.*'])
+def test_matches_like_fnmatch(pattern):
+    regex = re.compile(glob_to_regex(pattern))
+
+    assert [name for name in NAMES if regex.match(name)] == [name for name in NAMES
+                                                             if fnmatch.fnmatchcase(name, pattern)]
+
+
+def test_is_anchored_and_escapes_metacharacters():
+    assert glob_to_regex('a.b') == r'^a\.b$'
+    assert not re.match(glob_to_regex('*.txt'), 'file.txt.bak')
+    assert re.match(glob_to_regex('[a]'), 'a')
+    # An unclosed bracket is a literal
+    assert re.match(glob_to_regex('[draft'), '[draft')
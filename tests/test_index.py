@@ -0,0 +1,80 @@
+import pytest
+from pymongo.errors import ExecutionTimeout, OperationFailure
+
+import server
+
+
+class FailingIndex:
+    """Metadata index whose writes fail below the crawl root."""
+
+    def __init__(self):
+        self.directories = []
+
+    async def update_directory(self, server_name, directory, files, summary):
+        self.directories.append(directory)
+        if directory != '/tree':
+            raise OperationFailure("not primary")
+
+
+def test_index_write_failure_is_an_error(api, ftp_server, monkeypatch, within):
+    client, session_id = api
+    for name in ('a', 'b', 'c'):
+        ftp_server.write(f'tree/{name}/file.txt')
+    index = FailingIndex()
+    monkeypatch.setattr(server, 'metadata_index', index)
+
+    response = within(30, client.post, f'/api/ftp/index/{session_id}', json={'path': '/tree', 'parallel': 1})
+
+    assert response.status_code == 400
+    assert 'not primary' in response.json()['detail']
+    # The crawl stops at the first failed write instead of indexing the rest
+    assert len(index.directories) == 2
+
+
+class SearchIndex:
+    """Metadata index recording search queries, optionally timing out like a long regex would."""
+
+    def __init__(self, timeout: bool = False):
+        self.queries = []
+        self.timeout = timeout
+
+    async def search(self, server_name, root, query, limit):
+        self.queries.append(query)
+        if self.timeout:
+            raise ExecutionTimeout("operation exceeded time limit")
+        return []
+
+
+@pytest.mark.parametrize('params', [{'pattern': '[z-a]*'}, {'regex': '(unclosed'}, {'regex': 'a{2,1}'}])
+def test_malformed_search_patterns_are_400(api, monkeypatch, params):
+    client, session_id = api
+    index = SearchIndex()
+    monkeypatch.setattr(server, 'metadata_index', index)
+
+    response = client.get(f'/api/ftp/index/{session_id}/search', params=params)
+
+    assert response.status_code == 400
+    assert response.json()['detail'].startswith('Invalid pattern')
+    assert index.queries == []
+
+
+def test_search_patterns_reach_the_index_anchored_and_escaped(api, monkeypatch):
+    client, session_id = api
+    index = SearchIndex()
+    monkeypatch.setattr(server, 'metadata_index', index)
+
+    response = client.get(f'/api/ftp/index/{session_id}/search', params={'pattern': 'a+b*.txt', 'regex': 'x|y'})
+
+    assert response.status_code == 200, response.text
+    assert index.queries == [{'$and': [{'name': {'$regex': r'^a\+b.*\.txt$', '$options': ''}},
+                                       {'name': {'$regex': 'x|y', '$options': ''}}]}]
+
+
+def test_search_running_too_long_is_400(api, monkeypatch):
+    client, session_id = api
+    monkeypatch.setattr(server, 'metadata_index', SearchIndex(timeout=True))
+
+    response = client.get(f'/api/ftp/index/{session_id}/search', params={'regex': '(a+)+$'})
+
+    assert response.status_code == 400
+    assert 'took longer' in response.json()['detail']
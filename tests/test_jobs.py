@@ -0,0 +1,136 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    """A queue without storage, installed before the app starts so that its startup and shutdown run it."""
+    queue = server.TransferJobQueue(None, 2, 2, 0.1, 10)
+    monkeypatch.setattr(server, 'transfer_jobs', queue)
+    return queue
+
+
+@pytest.fixture
+def api(jobs, api):
+    return api
+
+
+def wait_for_job(client, session_id, job_id, seconds=10):
+    deadline = time.monotonic() + seconds
+    while True:
+        job = client.get(f'/api/ftp/jobs/{session_id}/{job_id}').json()
+        if job['status'] in server.TransferJobQueue.TERMINAL or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_jobs_are_only_visible_to_their_login(api, jobs, ftp_server, engine, monkeypatch):
+    client, session_id = api
+    ftp_server.write('big.bin', b'x' * 1024)
+    ftp_server.server.handler.authorizer.add_user('other', 'secret', ftp_server.root, perm='elradfmwMT')
+    # Without wake-ups the dispatcher never starts the job, so it stays queued
+    monkeypatch.setattr(jobs, '_wake_dispatcher', lambda: None)
+    response = client.post(f'/api/ftp/jobs/{session_id}', json={
+        'kind': 'copy', 'remote_path': 'big.bin', 'destination': 'copy.bin',
+    })
+    assert response.status_code == 200, response.text
+    job_id = response.json()['job_id']
+    response = client.post('/api/ftp/connect', json={
+        'host': '127.0.0.1', 'port': ftp_server.port, 'username': 'other', 'password': 'secret', 'engine': engine,
+    })
+    other = response.json()['session_id']
+
+    assert [job['job_id'] for job in client.get(f'/api/ftp/jobs/{session_id}').json()['jobs']] == [job_id]
+    assert client.get(f'/api/ftp/jobs/{other}').json()['jobs'] == []
+    assert client.get(f'/api/ftp/jobs/{other}/{job_id}').status_code == 404
+    assert client.get(f'/api/ftp/jobs/{other}/{job_id}/events').status_code == 404
+    assert client.delete(f'/api/ftp/jobs/{other}/{job_id}').status_code == 400
+    assert client.get(f'/api/ftp/jobs/{session_id}/{job_id}').json()['status'] == 'queued'
+    assert client.delete(f'/api/ftp/jobs/{session_id}/{job_id}').status_code == 200
+
+
+def test_job_submission_errors_are_400(api, tmp_path, monkeypatch):
+    client, session_id = api
+    monkeypatch.setattr(server, 'FTP_MIRROR_ROOT', str(tmp_path / 'mirror'))
+    os.makedirs(tmp_path / 'mirror')
+    (tmp_path / 'secret.txt').write_bytes(b'x')
+
+    response = client.post(f'/api/ftp/jobs/{session_id}', json={
+        'kind': 'upload', 'remote_path': 'x', 'local_path': '../secret.txt',
+    })
+    assert response.status_code == 400
+    assert 'outside the mirror root' in response.json()['detail']
+    response = client.post(f'/api/ftp/jobs/{session_id}', json={'kind': 'move', 'remote_path': 'x'})
+    assert response.status_code == 400
+
+
+def test_job_sessions_do_not_count_against_the_session_caps(api, ftp_server, monkeypatch):
+    client, session_id = api
+    ftp_server.write('big.bin', os.urandom(200 * 1024))
+    monkeypatch.setattr(server.ftp_manager, 'max_sessions_per_host', 1)
+    evicted = server.ftp_manager.evicted
+
+    response = client.post(f'/api/ftp/jobs/{session_id}', json={
+        'kind': 'copy', 'remote_path': 'big.bin', 'destination': 'copy.bin',
+    })
+    job = wait_for_job(client, session_id, response.json()['job_id'])
+
+    assert job['status'] == 'succeeded', job['message']
+    assert server.ftp_manager.evicted == evicted
+    assert client.get(f'/api/ftp/list/{session_id}').status_code == 200
+    with open(os.path.join(ftp_server.root, 'copy.bin'), 'rb') as f:
+        assert f.read() == open(os.path.join(ftp_server.root, 'big.bin'), 'rb').read()
+
+
+class SlowCollection:
+    """Stand-in job collection whose writes wait until ``release`` is set."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.documents = {}
+        self.writes = []
+
+    async def replace_one(self, query, document, upsert=False):
+        await self.release.wait()
+        self.writes.append((document['_id'], document['status']))
+        self.documents[document['_id']] = document
+
+
+def test_job_state_is_stored_in_the_background():
+    async def scenario():
+        collection = SlowCollection()
+        queue = server.TransferJobQueue(collection, 1, 1, 1, 10)
+        fields = {'kind': 'copy', 'host': 'h', 'port': 21, 'username': 'u', 'engine': 'ftplib',
+                  'remote_path': 'a', 'destination': 'b', 'priority': 0, 'max_attempts': 1}
+        first = await asyncio.wait_for(queue.submit(fields, 'secret'), 1)
+        second = await asyncio.wait_for(queue.submit(fields, 'secret'), 1)
+        await queue.cancel(first['job_id'])
+        assert collection.writes == []
+
+        collection.release.set()
+        await queue.stop()
+        return collection, first, second
+
+    collection, first, second = asyncio.run(scenario())
+
+    # States are written in order of change, each job ending on its latest state
+    assert collection.writes == [(first['job_id'], 'queued'), (second['job_id'], 'queued'),
+                                 (first['job_id'], 'cancelled')]
+    assert collection.documents[first['job_id']]['status'] == 'cancelled'
+
+
+def test_unsaved_job_states_do_not_hold_up_shutdown():
+    async def scenario():
+        collection = SlowCollection()
+        queue = server.TransferJobQueue(collection, 1, 1, 1, 10)
+        await queue.submit({'kind': 'copy', 'host': 'h', 'port': 21, 'username': 'u', 'engine': 'ftplib',
+                            'remote_path': 'a', 'destination': 'b', 'priority': 0, 'max_attempts': 1}, 'secret')
+        await asyncio.wait_for(queue.stop(flush_timeout=0.1), 1)
+        return collection
+
+    assert asyncio.run(scenario()).writes == []
@@ -0,0 +1,68 @@
+import server
+from server import FTPFileInfo, ListingCache
+
+KEY = ('ftp.example.com', 21, 'user')
+
+
+def entry(name, file_type='file', size=1):
+    return FTPFileInfo(name=name, type=file_type, size=size if file_type == 'file' else None)
+
+
+def test_get_returns_fresh_entries_and_drops_expired_ones(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(server.time, 'monotonic', lambda: now[0])
+    cache = ListingCache(ttl=30, max_entries=10)
+    files = [entry('a.txt')]
+    cache.put(KEY, '/data', files)
+
+    now[0] += 10
+    assert cache.get(KEY, '/data') == (files, 10)
+    assert cache.get(('other', 21, 'user'), '/data') is None
+    now[0] += 25
+    assert cache.get(KEY, '/data') is None
+    assert not cache.entries
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ListingCache(ttl=30, max_entries=2)
+    cache.put(KEY, '/a', [])
+    cache.put(KEY, '/b', [])
+    cache.get(KEY, '/a')
+    cache.put(KEY, '/c', [])
+
+    assert cache.get(KEY, '/b') is None
+    assert cache.get(KEY, '/a') is not None
+    assert cache.get(KEY, '/c') is not None
+
+
+def test_disabled_cache_stores_nothing():
+    for cache in (ListingCache(ttl=0, max_entries=10), ListingCache(ttl=30, max_entries=0)):
+        cache.put(KEY, '/a', [])
+        assert cache.get(KEY, '/a') is None
+
+
+def test_invalidate_tree_drops_path_and_descendants_only():
+    cache = ListingCache(ttl=30, max_entries=10)
+    for path in ('/data', '/data/sub', '/data/sub/deep', '/database', '/'):
+        cache.put(KEY, path, [])
+    cache.put(('other', 21, 'user'), '/data', [])
+
+    cache.invalidate_tree(KEY, '/data')
+
+    assert sorted(path for key, path in cache.entries if key == KEY) == ['/', '/database']
+    assert cache.get(('other', 21, 'user'), '/data') is not None
+
+
+def test_write_through_patches_parent_listing():
+    cache = ListingCache(ttl=30, max_entries=10)
+    cache.put(KEY, '/data', [entry('a.txt'), entry('b.txt')])
+
+    removed = cache.remove_entry(KEY, '/data/a.txt')
+    cache.add_entry(KEY, '/data/renamed.txt', removed)
+    cache.add_entry(KEY, '/data/b.txt', entry('b.txt', size=99))
+    cache.add_entry(KEY, '/uncached/c.txt', entry('c.txt'))
+
+    files, _ = cache.get(KEY, '/data')
+    assert sorted((info.name, info.size) for info in files) == [('b.txt', 99), ('renamed.txt', 1)]
+    assert cache.remove_entry(KEY, '/data/missing.txt') is None
+    assert cache.get(KEY, '/uncached') is None
@@ -0,0 +1,44 @@
+import base64
+import json
+
+import pytest
+
+from server import decode_listing_cursor, encode_listing_cursor
+
+
+@pytest.mark.parametrize('sort, descending, key', [
+    ('name', False, ('report.txt',)),
+    ('size', True, (1024, 'big.bin')),
+    ('modified', False, (1700000000.5, 'notes ünïcode.txt')),
+])
+def test_cursor_round_trip(sort, descending, key):
+    cursor = encode_listing_cursor(sort, descending, key)
+
+    assert '=' not in cursor
+    assert decode_listing_cursor(cursor, sort, descending) == key
+
+
+def test_cursor_from_another_ordering_is_rejected():
+    cursor = encode_listing_cursor('size', False, (1, 'a'))
+
+    with pytest.raises(ValueError, match='different sort order'):
+        decode_listing_cursor(cursor, 'size', True)
+    with pytest.raises(ValueError, match='different sort order'):
+        decode_listing_cursor(cursor, 'modified', False)
+
+
+def forged(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('cursor, sort', [
+    ('not base64 at all!', 'name'),
+    (forged({'sort': 'name'}), 'name'),
+    (forged(['name', False, 'a']), 'name'),
+    (forged(['name', False, [1]]), 'name'),
+    (forged(['name', False, ['a', 'b']]), 'name'),
+    (forged(['size', False, ['1', 'a']]), 'size'),
+])
+def test_malformed_cursor_is_rejected(cursor, sort):
+    with pytest.raises(ValueError):
+        decode_listing_cursor(cursor, sort, False)
@@ -0,0 +1,82 @@
+from server import format_ftp_timestamp, parse_list_lines, parse_mlsd_lines
+
+
+def entries(files):
+    return [(info.name, info.type, info.size, info.modified) for info in files]
+
+
+def test_unix_listing():
+    lines = [
+        'total 12',
+        'drwxr-xr-x   2 owner group      4096 Jan  5 09:30 .',
+        'drwxr-xr-x   3 owner group      4096 Jan  5 09:30 ..',
+        'drwxr-xr-x   2 owner group      4096 Mar 14  2023 photos',
+        '-rw-r--r--   1 owner group     12345 Jan  5 09:30 notes with spaces.txt',
+        'lrwxrwxrwx   1 owner group        11 Jan  5 09:30 latest -> notes.txt',
+        '-rw-r--r--+  1 owner       2048 2024-02-01 18:00 acl.bin',
+    ]
+
+    assert entries(parse_list_lines(lines)) == [
+        ('photos', 'directory', None, 'Mar 14 2023'),
+        ('notes with spaces.txt', 'file', 12345, 'Jan 5 09:30'),
+        ('latest', 'file', 11, 'Jan 5 09:30'),
+        ('acl.bin', 'file', 2048, '2024-02-01 18:00'),
+    ]
+
+
+def test_dos_listing():
+    lines = [
+        '01-15-24  10:30AM       <DIR>          Program Files',
+        '01-15-2024  22:05              1024 setup.exe',
+        '01-15-24  10:30AM       <DIR>            padded dir',
+        '01-15-24  10:31AM                  7  padded file.txt',
+        '01-15-24  10:32AM <DIR>  short',
+    ]
+
+    assert entries(parse_list_lines(lines)) == [
+        ('Program Files', 'directory', None, '01-15-24 10:30AM'),
+        ('setup.exe', 'file', 1024, '01-15-2024 22:05'),
+        ('  padded dir', 'directory', None, '01-15-24 10:30AM'),
+        (' padded file.txt', 'file', 7, '01-15-24 10:31AM'),
+        ('short', 'directory', None, '01-15-24 10:32AM'),
+    ]
+
+
+def test_eplf_listing():
+    lines = [
+        '+i8388621.29609,m824255902,/,\tdev',
+        '+i8388621.44468,m839956783,r,s10376,\tRFCEPLF',
+    ]
+
+    assert entries(parse_list_lines(lines)) == [
+        ('dev', 'directory', None, '1996-02-13T23:58:22Z'),
+        ('RFCEPLF', 'file', 10376, '1996-08-13T17:19:43Z'),
+    ]
+
+
+def test_unparseable_lines_are_skipped():
+    assert parse_list_lines(['', 'garbage', 'total 0']) == []
+
+
+def test_mlsd_listing():
+    lines = [
+        'type=cdir;modify=20240105093000; .',
+        'type=pdir;modify=20240105093000; ..',
+        'type=dir;modify=20230314120000;perm=flcdmpe; photos',
+        'type=file;size=12345;modify=20240105093000.123;perm=adfrw; notes with spaces.txt',
+        'type=OS.unix=symlink;sizd=11; link',
+        'type=file;size=1;no-separator',
+    ]
+
+    assert entries(parse_mlsd_lines(lines)) == [
+        ('photos', 'directory', None, '2023-03-14T12:00:00Z'),
+        ('notes with spaces.txt', 'file', 12345, '2024-01-05T09:30:00Z'),
+        ('link', 'file', 11, None),
+    ]
+
+
+def test_format_ftp_timestamp():
+    assert format_ftp_timestamp('20240105093000') == '2024-01-05T09:30:00Z'
+    assert format_ftp_timestamp('20240105093000.5') == '2024-01-05T09:30:00Z'
+    assert format_ftp_timestamp('yesterday') == 'yesterday'
+    assert format_ftp_timestamp(None) is None
@@ -0,0 +1,37 @@
+import os
+
+import server
+
+
+def test_scan_local_tree_skips_state_and_partial_files(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'keep.txt').write_bytes(b'abc')
+    (tmp_path / 'sub' / 'nested.bin').write_bytes(b'x' * 10)
+    (tmp_path / f'{server.MIRROR_STATE_PREFIX}0123456789abcdef.json').write_text('{}')
+    (tmp_path / 'sub' / f'big.iso.{server.MIRROR_STATE_PREFIX}part').write_bytes(b'partial')
+
+    files = server.scan_local_tree(str(tmp_path))
+
+    assert sorted(files) == ['keep.txt', 'sub/nested.bin']
+    assert files['keep.txt'][0] == 3
+
+
+def test_mirror_fails_when_a_remote_directory_cannot_be_listed(api, ftp_server, tmp_path, monkeypatch, within):
+    client, session_id = api
+    local_root = tmp_path / 'local'
+    (local_root / 'broken').mkdir(parents=True)
+    (local_root / 'broken' / 'only-here.txt').write_bytes(b'local copy')
+    ftp_server.write('remote/broken/remote.txt', b'remote copy')
+    ftp_server.write('remote/ok/file.txt', b'fine')
+    ftp_server.fail_listing.add('broken')
+    monkeypatch.setattr(server, 'FTP_MIRROR_ROOT', str(tmp_path))
+
+    response = within(30, client.post, f'/api/ftp/mirror/{session_id}', json={
+        'local_path': 'local', 'remote_path': '/remote', 'direction': 'download', 'delete': True, 'parallel': 1,
+    })
+
+    assert response.status_code == 400
+    assert 'could not be listed' in response.json()['detail']
+    # Nothing was planned from the incomplete scan
+    assert os.listdir(local_root / 'broken') == ['only-here.txt']
+    assert not (local_root / 'ok').exists()
@@ -0,0 +1,73 @@
+from server import plan_mirror
+
+
+def actions(plan):
+    return sorted((action, path) for action, path, _ in plan[0])
+
+
+def synced(local, remote):
+    """Mirror state recording that every path was last seen with these signatures on both sides."""
+    return {path: {'local': list(local[path]), 'remote': list(remote[path])} for path in local}
+
+
+def test_first_upload_skips_files_that_already_match():
+    local = {'same.txt': (10, 1000), 'new.txt': (5, 1000), 'differs.txt': (7, 1000)}
+    remote = {'same.txt': (10, 1001), 'differs.txt': (8, 1000), 'only-remote.txt': (1, 1000)}
+
+    plan = plan_mirror('upload', local, remote, {}, delete=False)
+
+    assert actions(plan) == [('upload', 'differs.txt'), ('upload', 'new.txt')]
+    assert sorted(plan[1]) == ['only-remote.txt', 'same.txt']
+    assert plan[2] == 0
+
+
+def test_one_way_mirrors_delete_only_when_asked():
+    local = {'kept.txt': (1, 1000)}
+    remote = {'kept.txt': (1, 1000), 'stale.txt': (2, 1000)}
+
+    assert actions(plan_mirror('upload', local, remote, {}, delete=True)) == [('delete_remote', 'stale.txt')]
+    assert actions(plan_mirror('download', remote, local, {}, delete=True)) == [('delete_local', 'stale.txt')]
+    assert actions(plan_mirror('download', remote, local, {}, delete=False)) == []
+
+
+def test_remote_times_refine_listing_times():
+    local = {'a.txt': (3, 5000)}
+    remote = {'a.txt': (3, 1000)}
+
+    assert actions(plan_mirror('download', local, remote, {}, delete=False)) == [('download', 'a.txt')]
+    plan = plan_mirror('download', local, remote, {}, delete=False, remote_times={'a.txt': 5000})
+    assert actions(plan) == []
+
+
+def test_unchanged_since_last_sync_is_left_alone_without_a_scan():
+    local = {'a.txt': (3, 1000)}
+    state = synced(local, {'a.txt': (3, None)})
+
+    plan = plan_mirror('upload', local, None, state, delete=False)
+
+    assert actions(plan) == []
+    assert plan[1] == {'a.txt': ((3, 1000), (3, None))}
+
+
+def test_two_way_copies_one_sided_changes():
+    before = {'up.txt': (1, 1000), 'down.txt': (1, 1000), 'gone.txt': (1, 1000)}
+    state = synced(before, before)
+    local = {'up.txt': (2, 2000), 'down.txt': (1, 1000), 'gone.txt': (1, 1000)}
+    remote = {'up.txt': (1, 1000), 'down.txt': (2, 2000)}
+
+    assert actions(plan_mirror('both', local, remote, state, delete=True)) == [
+        ('delete_local', 'gone.txt'), ('download', 'down.txt'), ('upload', 'up.txt'),
+    ]
+    assert ('upload', 'gone.txt') in actions(plan_mirror('both', local, remote, state, delete=False))
+
+
+def test_two_way_conflicts_go_to_the_newer_copy():
+    before = {'a.txt': (1, 1000), 'b.txt': (1, 1000)}
+    state = synced(before, before)
+    local = {'a.txt': (2, 3000), 'b.txt': (2, 2000)}
+    remote = {'a.txt': (3, 2000), 'b.txt': (3, 3000)}
+
+    plan = plan_mirror('both', local, remote, state, delete=False)
+
+    assert actions(plan) == [('download', 'b.txt'), ('upload', 'a.txt')]
+    assert plan[2] == 2
@@ -0,0 +1,51 @@
+import os
+
+
+def names(client, session_id, path=None):
+    response = client.get(f'/api/ftp/list/{session_id}', params={'path': path} if path else {})
+    assert response.status_code == 200, response.text
+    return sorted(info['name'] for info in response.json()['files'])
+
+
+def test_file_lifecycle(api, ftp_server):
+    client, session_id = api
+    data = os.urandom(300 * 1024)
+
+    response = client.post(f'/api/ftp/create-directory/{session_id}', json={'directory_name': 'docs'})
+    assert response.json()['status'] == 'success'
+    response = client.post(f'/api/ftp/change-directory/{session_id}', data={'path': 'docs'})
+    assert response.json()['status'] == 'success'
+    response = client.post(f'/api/ftp/upload/{session_id}', files={'file': ('report.bin', data)})
+    assert response.status_code == 200, response.text
+    assert names(client, session_id) == ['report.bin']
+
+    response = client.get(f'/api/ftp/download/{session_id}/report.bin')
+    assert response.status_code == 200
+    assert response.content == data
+    response = client.get(f'/api/ftp/download/{session_id}/report.bin', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.content == data[100:200]
+
+    response = client.put(f'/api/ftp/rename/{session_id}', json={'old_name': 'report.bin', 'new_name': 'final.bin'})
+    assert response.json()['status'] == 'success'
+    with open(os.path.join(ftp_server.root, 'docs', 'final.bin'), 'rb') as f:
+        assert f.read() == data
+    response = client.delete(f'/api/ftp/delete/{session_id}/final.bin')
+    assert response.json()['status'] == 'success'
+    assert names(client, session_id, '/docs') == []
+
+
+def test_unknown_session_is_rejected(api):
+    client, _ = api
+
+    assert client.get('/api/ftp/list/unknown').status_code == 400
+    assert client.get('/api/ftp/download/unknown/file.bin').status_code == 400
+
+
+def test_missing_file_download_is_an_error(api):
+    client, session_id = api
+
+    response = client.get(f'/api/ftp/download/{session_id}/missing.bin')
+
+    assert response.status_code == 400
+    assert '550' in response.json()['detail']
@@ -0,0 +1,52 @@
+import os
+
+
+def test_resumable_upload(api, ftp_server):
+    client, session_id = api
+    data = os.urandom(300 * 1024)
+    response = client.post(f'/api/ftp/uploads/{session_id}', json={'filename': 'movie.bin', 'size': len(data)})
+    assert response.status_code == 200, response.text
+    upload_id = response.json()['upload_id']
+    url = f'/api/ftp/uploads/{session_id}/{upload_id}'
+
+    response = client.put(url, params={'offset': 0}, content=data[:100 * 1024])
+    assert response.status_code == 200, response.text
+    assert response.json()['offset'] == 100 * 1024
+
+    # A repeated chunk and one that skips ahead are both refused with the offset to resume from
+    for offset in (0, 200 * 1024):
+        response = client.put(url, params={'offset': offset}, content=data[offset:offset + 100 * 1024])
+        assert response.status_code == 409
+        assert response.headers['Upload-Offset'] == str(100 * 1024)
+    response = client.post(f'{url}/complete')
+    assert response.status_code == 400
+    assert 'incomplete' in response.json()['detail']
+
+    for offset in (100 * 1024, 200 * 1024):
+        response = client.put(url, params={'offset': offset}, content=data[offset:offset + 100 * 1024])
+        assert response.status_code == 200, response.text
+    assert client.get(url).json()['offset'] == len(data)
+    response = client.post(f'{url}/complete')
+    assert response.status_code == 200, response.text
+
+    with open(os.path.join(ftp_server.root, 'movie.bin'), 'rb') as f:
+        assert f.read() == data
+    assert os.listdir(ftp_server.root) == ['movie.bin']
+    assert client.get(url).status_code == 404
+
+
+def test_chunk_past_the_declared_size_is_rejected(api, ftp_server):
+    client, session_id = api
+    response = client.post(f'/api/ftp/uploads/{session_id}', json={'filename': 'small.bin', 'size': 10})
+    upload_id = response.json()['upload_id']
+    url = f'/api/ftp/uploads/{session_id}/{upload_id}'
+
+    response = client.put(url, params={'offset': 0}, content=b'x' * 11)
+    assert response.status_code == 400
+    assert client.get(url).json()['offset'] == 0
+
+    response = client.put(url, params={'offset': 0}, content=b'x' * 10)
+    assert response.status_code == 200, response.text
+    assert client.post(f'{url}/complete').status_code == 200
+    with open(os.path.join(ftp_server.root, 'small.bin'), 'rb') as f:
+        assert f.read() == b'x' * 10